@@ -3,9 +3,10 @@ import os
 import json
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import click
 from flask import Flask
 from flask_cors import CORS
-from backend.extensions import db
+from backend.extensions import db, init_sqlite_pragmas
 
 basedir = os.path.join(os.path.dirname(os.path.dirname(__file__)))
 
@@ -16,43 +17,67 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 CORS(app)
 
 db.init_app(app)
+init_sqlite_pragmas(app)
 
 from backend.models import Vehicle, Maintenance, Mod, Cost, Note, VCDSFault, Guide, VehiclePhoto, FuelEntry, Reminder, Setting
 from backend.routes import routes
+from backend.migrations import run_migrations, current_version, pending_migrations, DEFAULT_BATCH_SIZE
+from backend.static_assets import StaticAssetCache, DEFAULT_MAX_CACHED_SIZE
+from backend.jobs import get_job_runner
+from backend.search import create_search_index, rebuild_search_index
 
 app.register_blueprint(routes, url_prefix='/api')
 
+frontend_assets = StaticAssetCache(
+    os.path.join(basedir, 'frontend'),
+    max_cached_size=app.config.setdefault('STATIC_MAX_CACHED_SIZE', DEFAULT_MAX_CACHED_SIZE),
+    max_age=app.config.setdefault('STATIC_MAX_AGE', 0)
+)
+
 @app.route('/')
 def index():
-    with open(os.path.join(basedir, 'frontend', 'index.html'), 'r') as f:
-        return f.read()
+    return frontend_assets.serve('index.html')
 
 @app.route('/css/<path:filename>')
 def serve_css(filename):
-    if '..' in filename or filename.startswith('/') or filename.startswith('\\'):
-        return 'Forbidden', 403
-    safe_path = os.path.join(basedir, 'frontend', 'css', filename)
-    if not os.path.normpath(safe_path).startswith(os.path.join(basedir, 'frontend', 'css')):
-        return 'Forbidden', 403
-    if not os.path.exists(safe_path):
-        return 'Not Found', 404
-    with open(safe_path, 'r') as f:
-        return f.read(), 200, {'Content-Type': 'text/css'}
+    return frontend_assets.serve('css', filename)
 
 @app.route('/js/<path:filename>')
 def serve_js(filename):
-    if '..' in filename or filename.startswith('/') or filename.startswith('\\'):
-        return 'Forbidden', 403
-    safe_path = os.path.join(basedir, 'frontend', 'js', filename)
-    if not os.path.normpath(safe_path).startswith(os.path.join(basedir, 'frontend', 'js')):
-        return 'Forbidden', 403
-    if not os.path.exists(safe_path):
-        return 'Not Found', 404
-    with open(safe_path, 'r') as f:
-        return f.read(), 200, {'Content-Type': 'application/javascript'}
+    return frontend_assets.serve('js', filename)
+
+@app.cli.command('migrate')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, help='Rows per backfill transaction.')
+@click.option('--target', type=int, default=None, help='Stop after this migration version.')
+@click.option('--status', is_flag=True, help='Show the current version and pending migrations only.')
+def migrate_command(batch_size, target, status):
+    """Apply pending schema migrations to the database."""
+    if status:
+        click.echo(f'Current schema version: {current_version(db.engine)}')
+        for version, name, _ in pending_migrations(db.engine):
+            click.echo(f'  pending {version:04d}_{name}')
+        return
+    applied = run_migrations(db.engine, batch_size=batch_size, target=target, log=click.echo)
+    click.echo(f'Applied {len(applied)} migration(s); schema version is {current_version(db.engine)}')
+
+@app.cli.command('search-rebuild')
+def search_rebuild_command():
+    """Refill the full-text search index from the searchable tables."""
+    with db.engine.begin() as conn:
+        create_search_index(conn)
+        counts = rebuild_search_index(conn)
+    for entity, count in counts.items():
+        click.echo(f'  {entity}: {count} indexed')
+    click.echo(f'Indexed {sum(counts.values())} record(s)')
 
 with app.app_context():
     db.create_all()
+    applied = run_migrations(db.engine)
+    if applied:
+        print(f"Applied schema migrations: {', '.join(str(v) for v in applied)}")
+    interrupted, requeued = get_job_runner().recover()
+    if interrupted or requeued:
+        print(f"Jobs: {interrupted} interrupted, {requeued} resubmitted")
     
     if not Vehicle.query.first():
         default_vehicle = Vehicle(
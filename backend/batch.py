@@ -0,0 +1,177 @@
+"""
+Multiplexed API requests.
+
+``POST /api/batch`` takes ``{"requests": [...], "transaction": false}``.
+Each sub-request looks like ``{"id", "method", "path", "headers", "body"}``,
+with ``path`` relative to the API root. Sub-requests are dispatched in
+order, each in a request context of its own nested in the batch request's
+app context. They share ``g`` and the database session, and only routes
+of the API blueprint can be reached.
+
+With ``"transaction": true`` every sub-request runs on one connection in a
+single transaction, each inside a savepoint of its own. The session joins
+with savepoints too, so a sub-request's ``commit()`` only releases one and
+its ``rollback()`` only undoes its own writes. The batch commits at the
+end if every sub-request succeeded. Otherwise it stops at the first error
+and rolls everything back. Jobs can't be started in such a batch: the
+worker would never see their uncommitted rows.
+"""
+from contextlib import contextmanager
+from urllib.parse import parse_qs
+
+from flask import current_app, request
+from sqlalchemy.orm import Session
+from werkzeug.test import EnvironBuilder
+
+from backend.extensions import db
+
+DEFAULT_MAX_BATCH_REQUESTS = 20
+BATCH_METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE'}
+FORWARDED_HEADERS = ('ETag', 'Location', 'Cache-Control')
+
+
+def parse_batch(data, max_requests=DEFAULT_MAX_BATCH_REQUESTS):
+    """Validate a batch body and return ``(sub-requests, transaction)``."""
+    if not isinstance(data, dict) or not isinstance(data.get('requests'), list):
+        raise ValueError('requests must be a list')
+    items = data['requests']
+    if not items:
+        raise ValueError('requests must not be empty')
+    if len(items) > max_requests:
+        raise ValueError(f'A batch can hold at most {max_requests} requests')
+
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f'Request {index} must be an object')
+        method = str(item.get('method', 'GET')).upper()
+        if method not in BATCH_METHODS:
+            raise ValueError(f'Request {index}: unsupported method {method}')
+        path = item.get('path')
+        if not isinstance(path, str) or not path.startswith('/'):
+            raise ValueError(f'Request {index}: path must start with /')
+        headers = item.get('headers') or {}
+        if not isinstance(headers, dict):
+            raise ValueError(f'Request {index}: headers must be an object')
+        parsed.append({
+            'id': item.get('id', index),
+            'method': method,
+            'path': path,
+            'headers': headers,
+            'body': item.get('body'),
+        })
+    return parsed, bool(data.get('transaction'))
+
+
+def _starts_job(item):
+    path, _, query_string = item['path'].partition('?')
+    flag = parse_qs(query_string).get('async', [''])[-1].lower()
+    return path == '/jobs' or path.startswith('/jobs/') or flag in ('1', 'true', 'yes')
+
+
+def _result(item, status, body, headers=None):
+    return {'id': item['id'], 'status': status, 'headers': headers or {}, 'body': body}
+
+
+def dispatch(item, prefix, blueprint, exclude=()):
+    """Run one sub-request through the app and return its result."""
+    app = current_app._get_current_object()
+    path, _, query_string = item['path'].partition('?')
+    # Bodies are read back into the batch response, which is compressed as a whole.
+    headers = {name: value for name, value in item['headers'].items() if name.lower() != 'accept-encoding'}
+    builder = EnvironBuilder(
+        path=prefix + path, query_string=query_string, method=item['method'],
+        headers=headers, json=item['body'], base_url=request.host_url
+    )
+    try:
+        with app.request_context(builder.get_environ()):
+            if request.routing_exception is None and (
+                request.blueprint != blueprint or request.endpoint in exclude
+            ):
+                return _result(item, 400, {'error': 'Path cannot be used in a batch'})
+            try:
+                response = app.full_dispatch_request()
+            except Exception:
+                current_app.logger.exception('Batch sub-request %s %s failed', item['method'], item['path'])
+                db.session.rollback()
+                return _result(item, 500, {'error': 'Internal server error'})
+            if 'attachment' in response.headers.get('Content-Disposition', ''):
+                # Exports stream files; reading them into the batch would defeat that.
+                response.close()
+                return _result(item, 400, {'error': 'Downloads cannot be batched'})
+            body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+            headers = {name: response.headers[name] for name in FORWARDED_HEADERS if name in response.headers}
+            return _result(item, response.status_code, body, headers)
+    finally:
+        builder.close()
+
+
+@contextmanager
+def single_transaction():
+    """Swap the app context's session for one inside an outer transaction.
+
+    Yields ``(connection, transaction, fail)``. ``fail`` marks the
+    transaction as failed; it is rolled back instead of committed when the
+    block ends.
+    """
+    connection = db.engine.connect()
+    transaction = connection.begin()
+    # pysqlite only opens a transaction before DML, and releasing a savepoint
+    # outside one would commit it. IMMEDIATE also takes the write lock up front.
+    connection.exec_driver_sql('BEGIN IMMEDIATE')
+    session = Session(
+        bind=connection, join_transaction_mode='create_savepoint', info={'outer_transaction': True}
+    )
+    registry = db.session.registry
+    previous = registry() if registry.has() else None
+    registry.set(session)
+    failed = []
+    try:
+        yield connection, transaction, lambda: failed.append(True)
+        if failed or not transaction.is_active:
+            if transaction.is_active:
+                transaction.rollback()
+        else:
+            session.commit()
+            transaction.commit()
+    except BaseException:
+        if transaction.is_active:
+            transaction.rollback()
+        raise
+    finally:
+        session.close()
+        connection.close()
+        if previous is not None:
+            registry.set(previous)
+        else:
+            registry.clear()
+
+
+def run_batch(items, transaction, prefix, blueprint, exclude=()):
+    """Dispatch ``items`` in order and return their results."""
+    if not transaction:
+        return [dispatch(item, prefix, blueprint, exclude) for item in items]
+
+    results = []
+    with single_transaction() as (connection, transaction, fail):
+        for item in items:
+            if results and results[-1]['status'] >= 400:
+                results.append(_result(item, 424, {'error': 'Skipped after an earlier request failed'}))
+                continue
+            if _starts_job(item):
+                results.append(_result(item, 400, {'error': 'Jobs cannot be started in a transaction'}))
+                continue
+            savepoint = connection.begin_nested()
+            result = dispatch(item, prefix, blueprint, exclude)
+            if not transaction.is_active:
+                result = _result(item, 500, {'error': 'The batch transaction was rolled back'})
+            elif result['status'] >= 400:
+                db.session.rollback()
+                savepoint.rollback()
+            else:
+                db.session.commit()
+                savepoint.commit()
+            results.append(result)
+        if any(result['status'] >= 400 for result in results):
+            fail()
+    return results
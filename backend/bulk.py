@@ -0,0 +1,345 @@
+"""
+Bulk create, update and delete for the history tables.
+
+Each entity is described by a :class:`BulkEntity`: its model, the fields
+a client may write, which of them are dates or JSON lists, the fields
+required on create, and create-time defaults. These mirror the
+single-record endpoints. A request carries an array of rows. All rows are
+validated before anything is written. Valid rows are then written in one
+transaction: new rows with multi-row ``INSERT ... RETURNING`` statements,
+updates with one executemany statement per distinct set of columns.
+
+The result has one entry per row: ``{"index": i, "id": ...}`` or
+``{"index": i, "error": ...}``. By default a batch with any invalid row
+writes nothing. With ``partial`` the valid rows are written anyway.
+
+These statements skip the ORM flush hooks, so the spend rollup and change
+versions of the touched vehicles are refreshed explicitly. Descriptions of
+VCDS faults written in bulk are added to the fault-code dictionary. A new
+VCDS fault that repeats an active fault, stored or earlier in the batch,
+is reported as an invalid row.
+"""
+from datetime import datetime
+import json
+
+from backend.extensions import db
+from backend.models import (
+    Vehicle, Maintenance, Mod, Cost, Note, VCDSFault, FuelEntry, Reminder, Receipt, ServiceDocument
+)
+from backend.rollups import rebuild_spend_rollup
+from backend.change_versions import bump_change_versions
+from backend.fault_codes import learn_fault_codes
+
+DEFAULT_MAX_BULK_ROWS = 1000
+# Rows per multi-row INSERT, well under SQLite's bound parameter limit.
+INSERT_CHUNK_SIZE = 500
+
+
+class BulkEntity:
+    """How one history table is written in bulk."""
+
+    def __init__(self, model, fields, required=('vehicle_id',), dates=(), json_lists=(), defaults=None,
+                 linked=()):
+        self.model = model
+        self.table = model.__table__
+        self.fields = tuple(fields)
+        self.required = tuple(required)
+        self.dates = set(dates)
+        self.json_lists = set(json_lists)
+        self.defaults = defaults or {}
+        # (model, column) pairs pointing at this table; unlinked on delete.
+        self.linked = tuple(linked)
+
+    @property
+    def tables(self):
+        return [self.table.name, *(model.__tablename__ for model, _ in self.linked)]
+
+
+BULK_ENTITIES = {
+    'maintenance': BulkEntity(
+        Maintenance,
+        ['vehicle_id', 'date', 'mileage', 'category', 'description', 'parts_used', 'labor_hours', 'cost',
+         'shop_name', 'notes'],
+        required=('vehicle_id', 'date'), dates=('date',), json_lists=('parts_used',),
+        linked=((Receipt, 'maintenance_id'), (ServiceDocument, 'maintenance_id'))
+    ),
+    'mods': BulkEntity(
+        Mod,
+        ['vehicle_id', 'date', 'mileage', 'category', 'description', 'parts', 'cost', 'status', 'notes'],
+        dates=('date',), json_lists=('parts',), defaults={'status': 'planned'}
+    ),
+    'costs': BulkEntity(
+        Cost, ['vehicle_id', 'date', 'category', 'amount', 'description'], dates=('date',)
+    ),
+    'notes': BulkEntity(
+        Note, ['vehicle_id', 'date', 'title', 'content', 'tags'], dates=('date',), json_lists=('tags',)
+    ),
+    'vcds': BulkEntity(
+        VCDSFault,
+        ['vehicle_id', 'address', 'component', 'fault_code', 'description', 'status', 'detected_date',
+         'cleared_date', 'notes'],
+        dates=('detected_date', 'cleared_date'), defaults={'status': 'active'}
+    ),
+    'fuel': BulkEntity(
+        FuelEntry,
+        ['vehicle_id', 'date', 'mileage', 'gallons', 'price_per_gallon', 'total_cost', 'station', 'notes'],
+        dates=('date',)
+    ),
+    'reminders': BulkEntity(
+        Reminder,
+        ['vehicle_id', 'type', 'interval_miles', 'interval_months', 'last_service_date', 'last_service_mileage',
+         'next_due_date', 'next_due_mileage', 'notes'],
+        required=('vehicle_id', 'type'), dates=('last_service_date', 'next_due_date')
+    ),
+    'receipts': BulkEntity(
+        Receipt,
+        ['vehicle_id', 'maintenance_id', 'date', 'vendor', 'amount', 'category', 'notes', 'filename'],
+        dates=('date',)
+    ),
+}
+
+
+def _to_date(value):
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _row_values(entity, row, creating):
+    """Return the column values for ``row``, raising ValueError when invalid."""
+    if not isinstance(row, dict):
+        raise ValueError('Row must be an object')
+    if creating:
+        missing = [f for f in entity.required if not row.get(f)]
+        if missing:
+            raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    values = {}
+    for field in entity.fields:
+        if field not in row:
+            if creating:
+                values[field] = entity.defaults.get(field)
+            continue
+        value = row[field]
+        if field in entity.dates:
+            try:
+                value = _to_date(value)
+            except ValueError:
+                raise ValueError(f'{field} must be a date (YYYY-MM-DD)')
+        elif field in entity.json_lists:
+            value = json.dumps(value) if value else None
+        elif field == 'vehicle_id':
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError('vehicle_id must be an integer')
+        values[field] = value
+    if not creating and not values:
+        raise ValueError('No fields to update')
+    return values
+
+
+def _row_ids(rows):
+    ids = []
+    for row in rows:
+        row_id = row.get('id') if isinstance(row, dict) else row
+        ids.append(row_id if isinstance(row_id, int) and not isinstance(row_id, bool) else None)
+    return ids
+
+
+def _existing_vehicles(vehicle_ids):
+    if not vehicle_ids:
+        return set()
+    return set(db.session.execute(db.select(Vehicle.id).where(Vehicle.id.in_(vehicle_ids))).scalars())
+
+
+def _existing_rows(entity, ids):
+    """Return ``{id: vehicle_id}`` for the rows of ``ids`` that exist."""
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    table = entity.table
+    return dict(db.session.execute(db.select(table.c.id, table.c.vehicle_id).where(table.c.id.in_(ids))).all())
+
+
+def _finish(entity, vehicle_ids, tables=None):
+    connection = db.session.connection()
+    rebuild_spend_rollup(connection, vehicle_ids)
+    bump_change_versions(connection, tables or [entity.table.name], vehicle_ids=vehicle_ids)
+    db.session.commit()
+
+
+def insert_returning_ids(table, rows):
+    """Insert ``rows`` and return their new ids in order.
+
+    Rows are written as multi-row ``INSERT ... VALUES ... RETURNING id``
+    statements of up to INSERT_CHUNK_SIZE rows, which all need the same
+    columns. One statement is atomic, so no other writer's rows can take ids
+    in between. SQLite numbers a statement's rows in ``VALUES`` order but
+    returns them in no promised order, so the ids are sorted. Raises
+    RuntimeError if a chunk doesn't return one id per row.
+    """
+    ids = []
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + INSERT_CHUNK_SIZE]
+        chunk_ids = sorted(db.session.execute(table.insert().values(chunk).returning(table.c.id)).scalars())
+        if len(chunk_ids) != len(chunk):
+            raise RuntimeError(f'Inserted {len(chunk)} rows into {table.name} but got {len(chunk_ids)} ids')
+        ids += chunk_ids
+    return ids
+
+
+def _executemany(statement, params_list):
+    """Run ``statement`` once per group of rows that set the same columns."""
+    groups = {}
+    for params in params_list:
+        groups.setdefault(tuple(sorted(params)), []).append(params)
+    for group in groups.values():
+        db.session.execute(statement, group)
+
+
+def _learn_updated_faults(fault_ids):
+    if not fault_ids:
+        return
+    table = VCDSFault.__table__
+    learn_fault_codes(db.session.connection(), [
+        dict(row._mapping) for row in db.session.execute(
+            db.select(table.c.address, table.c.fault_code, table.c.description).where(table.c.id.in_(fault_ids))
+        )
+    ])
+
+
+def _active_fault_key(values):
+    if values.get('status') != 'active' or values.get('address') is None or values.get('fault_code') is None:
+        return None
+    return values['vehicle_id'], values['address'], values['fault_code']
+
+
+def _active_fault_conflicts(valid, results):
+    """Mark rows that would add a second active fault; return the others."""
+    keys = {_active_fault_key(values) for _, values in valid} - {None}
+    if not keys:
+        return valid
+    table = VCDSFault.__table__
+    stored = set(db.session.execute(
+        db.select(table.c.vehicle_id, table.c.address, table.c.fault_code).where(
+            table.c.status == 'active', table.c.vehicle_id.in_({key[0] for key in keys}),
+            table.c.fault_code.in_({key[2] for key in keys})
+        )
+    ).all())
+    kept = []
+    for index, values in valid:
+        key = _active_fault_key(values)
+        if key in stored:
+            results[index]['error'] = 'This fault is already active for the vehicle'
+            continue
+        if key is not None:
+            stored.add(key)
+        kept.append((index, values))
+    return kept
+
+
+def bulk_create(entity, rows, partial=False):
+    results = []
+    valid = []
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, _row_values(entity, row, creating=True)))
+            results.append({'index': index})
+        except ValueError as e:
+            results.append({'index': index, 'error': str(e)})
+
+    vehicles = _existing_vehicles({values['vehicle_id'] for _, values in valid})
+    for index, values in valid:
+        if values['vehicle_id'] not in vehicles:
+            results[index]['error'] = 'Vehicle not found'
+    valid = [(index, values) for index, values in valid if values['vehicle_id'] in vehicles]
+    if entity.model is VCDSFault:
+        valid = _active_fault_conflicts(valid, results)
+
+    failed = len(rows) - len(valid)
+    if valid and (partial or not failed):
+        new_ids = insert_returning_ids(entity.table, [values for _, values in valid])
+        for (index, _), new_id in zip(valid, new_ids):
+            results[index]['id'] = new_id
+        if entity.model is VCDSFault:
+            learn_fault_codes(db.session.connection(), [values for _, values in valid])
+        _finish(entity, {values['vehicle_id'] for _, values in valid})
+        written = len(valid)
+    else:
+        written = 0
+    return {'results': results, 'written': written, 'failed': failed}
+
+
+def bulk_update(entity, rows, partial=False):
+    results = []
+    valid = []
+    existing = _existing_rows(entity, _row_ids(rows))
+    new_vehicles = set()
+    for index, (row, row_id) in enumerate(zip(rows, _row_ids(rows))):
+        try:
+            if row_id is None:
+                raise ValueError('id must be an integer')
+            if row_id not in existing:
+                raise ValueError('Record not found')
+            values = _row_values(entity, row, creating=False)
+            if 'vehicle_id' in values:
+                new_vehicles.add(values['vehicle_id'])
+            valid.append((index, row_id, values))
+            results.append({'index': index, 'id': row_id})
+        except ValueError as e:
+            results.append({'index': index, 'error': str(e)})
+
+    known = _existing_vehicles(new_vehicles)
+    for index, _, values in valid:
+        if 'vehicle_id' in values and values['vehicle_id'] not in known:
+            results[index] = {'index': index, 'error': 'Vehicle not found'}
+    valid = [item for item in valid if 'error' not in results[item[0]]]
+
+    failed = len(rows) - len(valid)
+    if valid and (partial or not failed):
+        table = entity.table
+        # The SET clause comes from each group's parameter keys.
+        statement = table.update().where(table.c.id == db.bindparam('_id'))
+        _executemany(statement, [{'_id': row_id, **values} for _, row_id, values in valid])
+        if entity.model is VCDSFault:
+            _learn_updated_faults([row_id for _, row_id, values in valid if 'description' in values])
+        vehicle_ids = {existing[row_id] for _, row_id, _ in valid}
+        vehicle_ids |= {values['vehicle_id'] for _, _, values in valid if 'vehicle_id' in values}
+        _finish(entity, vehicle_ids)
+        written = len(valid)
+    else:
+        for index, _, _ in valid:
+            results[index].pop('id', None)
+        written = 0
+    return {'results': results, 'written': written, 'failed': failed}
+
+
+def bulk_delete(entity, ids, partial=False):
+    existing = _existing_rows(entity, _row_ids(ids))
+    results = []
+    valid = []
+    for index, row_id in enumerate(_row_ids(ids)):
+        if row_id is None:
+            results.append({'index': index, 'error': 'id must be an integer'})
+        elif row_id not in existing:
+            results.append({'index': index, 'error': 'Record not found'})
+        else:
+            valid.append(row_id)
+            results.append({'index': index, 'id': row_id})
+
+    failed = len(ids) - len(valid)
+    if valid and (partial or not failed):
+        table = entity.table
+        for model, column in entity.linked:
+            linked = model.__table__
+            db.session.execute(
+                linked.update().where(linked.c[column].in_(valid)).values({column: None})
+            )
+        db.session.execute(table.delete().where(table.c.id.in_(valid)))
+        _finish(entity, {existing[row_id] for row_id in valid}, entity.tables)
+        written = len(set(valid))
+    else:
+        for result in results:
+            result.pop('id', None)
+        written = 0
+    return {'results': results, 'written': written, 'failed': failed}
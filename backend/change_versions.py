@@ -0,0 +1,160 @@
+"""
+Per-vehicle, per-table change counters for conditional GETs.
+
+A session ``after_flush`` hook bumps ``change_versions`` for every table
+and vehicle touched by an insert, update or delete, plus the table-wide
+row (``vehicle_id = 0``). GET handlers wrapped in :func:`conditional_get`
+derive a weak ETag from the matching counter and the request URL, and
+answer a matching ``If-None-Match`` with ``304`` before running their
+query.
+
+Bulk statements skip the ORM flush, so code that uses them must call
+:func:`bump_change_versions`.
+"""
+import hashlib
+from functools import wraps
+
+from flask import request, make_response
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from backend.extensions import db
+from backend.models import (
+    Vehicle, Maintenance, Mod, Cost, Note, VCDSFault, Guide, VehiclePhoto, FuelEntry,
+    Reminder, Setting, Receipt, ServiceDocument, VCDSScan, ChangeVersion
+)
+
+VEHICLE_TABLES = {
+    model.__tablename__ for model in (
+        Maintenance, Mod, Cost, Note, VCDSFault, Guide, VehiclePhoto, FuelEntry,
+        Reminder, Receipt, ServiceDocument, VCDSScan
+    )
+}
+TRACKED_TABLES = VEHICLE_TABLES | {Vehicle.__tablename__, Setting.__tablename__}
+
+
+def get_change_version(table, vehicle_id=0):
+    row = db.session.execute(
+        db.select(ChangeVersion.version).where(
+            ChangeVersion.table_name == table, ChangeVersion.vehicle_id == vehicle_id
+        )
+    ).first()
+    return row[0] if row else 0
+
+
+def _bump(connection, keys):
+    if not keys:
+        return
+    table = ChangeVersion.__table__
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['table_name', 'vehicle_id'],
+        set_={'version': table.c.version + 1}
+    )
+    connection.execute(stmt, [
+        {'table_name': name, 'vehicle_id': vehicle_id, 'version': 1}
+        for name, vehicle_id in sorted(keys)
+    ])
+
+
+def bump_change_versions(connection, tables=None, vehicle_ids=None):
+    """Bump the counters of ``tables`` (default: all tracked tables) after a bulk write.
+
+    With ``vehicle_ids`` only those vehicles' counters and the table-wide
+    ones move; otherwise every counter of the tables does.
+    """
+    tables = sorted(tables or TRACKED_TABLES)
+    if vehicle_ids is not None:
+        _bump(connection, {(name, int(v)) for name in tables for v in vehicle_ids} | {(name, 0) for name in tables})
+        return
+    connection.execute(
+        ChangeVersion.__table__.update()
+        .where(ChangeVersion.table_name.in_(tables), ChangeVersion.vehicle_id != 0)
+        .values(version=ChangeVersion.version + 1)
+    )
+    _bump(connection, {(name, 0) for name in tables})
+
+
+def _vehicle_ids(obj, pending=False):
+    """Return the current and previous vehicle ids of a record.
+
+    Empty when a stored record's vehicle was changed without the previous
+    one loaded; the caller then bumps every vehicle of the table.
+    """
+    history = obj._sa_instance_state.attrs['vehicle_id'].history
+    if not pending and history.added and not history.deleted and not history.unchanged:
+        return set()
+    ids = set()
+    for value in history.sum():
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            pass
+    return ids
+
+
+@event.listens_for(Session, 'after_flush')
+def update_change_versions(session, flush_context):
+    keys = set()
+    bump_all = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table not in TRACKED_TABLES:
+            continue
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        keys.add((table, 0))
+        if isinstance(obj, Vehicle):
+            keys.add((table, obj.id))
+            if obj in session.deleted:
+                # Child rows go with it through ON DELETE CASCADE, unseen by the session.
+                keys.update((name, vehicle_id) for name in VEHICLE_TABLES for vehicle_id in (0, obj.id))
+        elif table in VEHICLE_TABLES:
+            vehicle_ids = _vehicle_ids(obj, pending=obj in session.new)
+            if vehicle_ids:
+                keys.update((table, vehicle_id) for vehicle_id in vehicle_ids)
+            else:
+                bump_all.add(table)
+    if not keys and not bump_all:
+        return
+    connection = session.connection()
+    keys = {(name, vehicle_id) for name, vehicle_id in keys if name not in bump_all}
+    _bump(connection, keys)
+    if bump_all:
+        bump_change_versions(connection, bump_all)
+
+
+def _etag(table, vehicle_id):
+    version = get_change_version(table, vehicle_id)
+    url_hash = hashlib.sha1(request.full_path.encode('utf-8')).hexdigest()[:12]
+    return f'{table}-{vehicle_id}-{version}-{url_hash}'
+
+
+def conditional_get(table, vehicle_kwarg=None):
+    """Serve a GET view with a weak ETag from the change counter of ``table``.
+
+    The vehicle is taken from the ``vehicle_kwarg`` URL argument if given,
+    else from the ``vehicle_id`` query argument; without one the table-wide
+    counter is used.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            raw_id = kwargs.get(vehicle_kwarg) if vehicle_kwarg else request.args.get('vehicle_id')
+            try:
+                vehicle_id = int(raw_id) if raw_id is not None else 0
+            except (TypeError, ValueError):
+                vehicle_id = 0
+            etag = _etag(table, vehicle_id)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,115 @@
+"""
+Content-encoding helpers shared by static asset serving and API responses.
+
+gzip is always available. Brotli is used when the optional ``brotli``
+package is installed; without it clients are offered gzip only.
+
+:func:`compress_response` is the ``after_request`` hook for the API. It
+compresses buffered bodies of at least ``COMPRESS_MIN_SIZE`` bytes in one
+go and streamed bodies chunk by chunk, flushing after every chunk so the
+client keeps receiving data while a large export is produced.
+"""
+import gzip
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 5
+DEFAULT_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'text/csv', 'text/plain', 'text/html', 'text/css',
+}
+
+
+def available_encodings():
+    """Return the supported encodings in order of preference."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings, encodings=None):
+    """Pick the best encoding the client accepts from ``request.accept_encodings``."""
+    for encoding in encodings or available_encodings():
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress(data, encoding, level=None):
+    """Compress ``data`` in one go with ``encoding``."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=DEFAULT_BROTLI_QUALITY if level is None else level)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=DEFAULT_GZIP_LEVEL if level is None else level, mtime=0)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+
+def compress_stream(chunks, encoding, level=None):
+    """Yield ``chunks`` compressed with ``encoding``, flushing after each chunk."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=DEFAULT_BROTLI_QUALITY if level is None else level)
+        compress_chunk, flush, finish = compressor.process, compressor.flush, compressor.finish
+    elif encoding == 'gzip':
+        compressor = zlib.compressobj(DEFAULT_GZIP_LEVEL if level is None else level, zlib.DEFLATED, 31)
+        compress_chunk = compressor.compress
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+    else:
+        raise ValueError(f'Unsupported encoding: {encoding}')
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compress_chunk(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def _level_for(encoding):
+    if encoding == 'br':
+        return current_app.config.get('COMPRESS_BROTLI_QUALITY', DEFAULT_BROTLI_QUALITY)
+    return current_app.config.get('COMPRESS_LEVEL', DEFAULT_GZIP_LEVEL)
+
+
+def compress_response(response):
+    """Compress an API response when the client accepts it and it is worth it."""
+    if (
+        response.status_code < 200 or response.status_code in (204, 206, 304)
+        or response.direct_passthrough
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    level = _level_for(encoding)
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE):
+            return response
+        response.set_data(compress(data, encoding, level))
+
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
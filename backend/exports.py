@@ -0,0 +1,156 @@
+"""
+Streaming data exports.
+
+:func:`iter_vehicle_export_ndjson` streams one vehicle and all of its
+records as newline-delimited JSON, one ``{"type": ..., "record": ...}``
+object per line, read from the database in the same batched way.
+
+:func:`iter_export_csv` produces the full ``/settings/export`` CSV as a
+sequence of text chunks. Each table is read with a column-only SELECT
+executed with ``yield_per``, so rows are fetched from SQLite in batches and
+never turned into ORM objects. Rows are written into a small buffer that
+is handed out whenever it passes ``chunk_size`` characters. Memory stays
+flat however large the database is, and the first bytes are available as
+soon as the first table has been read.
+"""
+import csv
+import io
+import json
+from datetime import datetime, timezone
+
+from backend.extensions import db
+from backend.models import (
+    Vehicle, Maintenance, Mod, Cost, Note, VCDSFault, Guide, FuelEntry, Reminder,
+    Setting, Receipt, ServiceDocument
+)
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# (section title, model, columns) in export order
+CSV_EXPORT_SECTIONS = [
+    ('VEHICLES', Vehicle, ['id', 'name', 'reg', 'vin', 'year', 'make', 'model', 'engine', 'transmission', 'mileage']),
+    ('MAINTENANCE', Maintenance, ['id', 'vehicle_id', 'date', 'mileage', 'category', 'description', 'parts_used',
+                                  'labor_hours', 'cost', 'shop_name', 'notes']),
+    ('MODS', Mod, ['id', 'vehicle_id', 'date', 'mileage', 'category', 'description', 'parts', 'cost', 'status', 'notes']),
+    ('COSTS', Cost, ['id', 'vehicle_id', 'date', 'category', 'amount', 'description']),
+    ('NOTES', Note, ['id', 'vehicle_id', 'date', 'title', 'content', 'tags']),
+    ('GUIDES', Guide, ['id', 'vehicle_id', 'title', 'category', 'content', 'interval_miles', 'interval_months',
+                       'is_template']),
+    ('FUEL ENTRIES', FuelEntry, ['id', 'vehicle_id', 'date', 'mileage', 'gallons', 'price_per_gallon', 'total_cost',
+                                 'station', 'notes']),
+    ('VCDS FAULTS', VCDSFault, ['id', 'vehicle_id', 'address', 'component', 'fault_code', 'description', 'status',
+                                'detected_date', 'cleared_date', 'notes']),
+    ('REMINDERS', Reminder, ['id', 'vehicle_id', 'type', 'interval_miles', 'interval_months', 'last_service_date',
+                             'last_service_mileage', 'next_due_date', 'next_due_mileage', 'notes']),
+    ('SERVICE DOCUMENTS', ServiceDocument, ['id', 'vehicle_id', 'maintenance_id', 'title', 'description',
+                                            'document_type', 'filename', 'uploaded_at']),
+    ('RECEIPTS', Receipt, ['id', 'vehicle_id', 'maintenance_id', 'date', 'vendor', 'amount', 'category', 'notes',
+                           'filename', 'uploaded_at']),
+    ('SETTINGS', Setting, ['key', 'value', 'value_type', 'description']),
+]
+
+
+# Per-vehicle export: (record type, model, fields). Vehicle rows are
+# matched on vehicle_id; the vehicle itself is written first. Stored VCDS
+# scans are compressed blobs and are left out; their faults are exported.
+VEHICLE_EXPORT_SECTIONS = [
+    ('maintenance', Maintenance, ['id', 'date', 'mileage', 'category', 'description', 'cost', 'notes']),
+    ('mods', Mod, ['date', 'mileage', 'category', 'description', 'cost', 'status', 'notes']),
+    ('costs', Cost, ['date', 'category', 'amount', 'description']),
+    ('notes', Note, ['date', 'title', 'content', 'tags']),
+    ('vcds_faults', VCDSFault, ['address', 'fault_code', 'component', 'description', 'status', 'detected_date',
+                                'notes']),
+    ('fuel_entries', FuelEntry, ['date', 'mileage', 'gallons', 'price_per_gallon', 'total_cost']),
+    ('reminders', Reminder, ['type', 'interval_miles', 'interval_months', 'next_due_date', 'next_due_mileage']),
+    ('receipts', Receipt, ['maintenance_id', 'date', 'vendor', 'amount', 'category', 'notes', 'filename',
+                           'uploaded_at']),
+    ('documents', ServiceDocument, ['maintenance_id', 'title', 'description', 'document_type', 'filename',
+                                    'uploaded_at']),
+    ('guides', Guide, ['title', 'category', 'content', 'interval_miles', 'interval_months', 'is_template']),
+]
+VEHICLE_EXPORT_FIELDS = ['id', 'name', 'reg', 'vin', 'year', 'make', 'model', 'engine', 'transmission', 'mileage']
+
+
+def iter_rows(model, columns, batch_size=EXPORT_BATCH_SIZE, where=None):
+    """Yield tuples of ``columns`` for every row of ``model``, fetched in batches."""
+    statement = db.select(*[getattr(model, name) for name in columns]).order_by(model.id)
+    if where is not None:
+        statement = statement.where(where)
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield from partition
+
+
+def count_export_rows():
+    """Return the number of data rows :func:`iter_export_csv` will write."""
+    return sum(
+        db.session.execute(db.select(db.func.count()).select_from(model)).scalar()
+        for _, model, _ in CSV_EXPORT_SECTIONS
+    )
+
+
+def iter_export_csv(chunk_size=None, batch_size=EXPORT_BATCH_SIZE, progress=None):
+    """Yield the full data export as CSV text chunks.
+
+    ``progress(rows)`` is called with the number of data rows written so
+    far each time a chunk is handed out.
+    """
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    rows_written = 0
+
+    def drain():
+        if progress is not None:
+            progress(rows_written)
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(['MuttLogbook Export', datetime.now(timezone.utc).isoformat()])
+    writer.writerow([])
+    for index, (title, model, columns) in enumerate(CSV_EXPORT_SECTIONS):
+        writer.writerow([f'=== {title} ==='])
+        writer.writerow(columns)
+        for row in iter_rows(model, columns, batch_size):
+            writer.writerow(row)
+            rows_written += 1
+            if buffer.tell() >= chunk_size:
+                yield drain()
+        if index < len(CSV_EXPORT_SECTIONS) - 1:
+            writer.writerow([])
+    yield drain()
+
+
+def _record(fields, row):
+    return {
+        name: value.isoformat() if hasattr(value, 'isoformat') else value
+        for name, value in zip(fields, row)
+    }
+
+
+def iter_vehicle_records(vehicle_id, batch_size=EXPORT_BATCH_SIZE):
+    """Yield ``(record type, record dict)`` for a vehicle and everything it owns."""
+    for row in iter_rows(Vehicle, VEHICLE_EXPORT_FIELDS, batch_size, where=Vehicle.id == vehicle_id):
+        yield 'vehicle', _record(VEHICLE_EXPORT_FIELDS, row)
+    for record_type, model, fields in VEHICLE_EXPORT_SECTIONS:
+        for row in iter_rows(model, fields, batch_size, where=model.vehicle_id == vehicle_id):
+            yield record_type, _record(fields, row)
+
+
+def iter_vehicle_export_ndjson(vehicle_id, chunk_size=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a vehicle export as NDJSON text chunks."""
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    lines = []
+    size = 0
+    for record_type, record in iter_vehicle_records(vehicle_id, batch_size):
+        line = json.dumps({'type': record_type, 'record': record}, separators=(',', ':')) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield ''.join(lines)
+            lines, size = [], 0
+    if lines:
+        yield ''.join(lines)
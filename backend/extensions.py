@@ -1,3 +1,70 @@
+import os
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 
 db = SQLAlchemy()
+
+# PRAGMAs applied to every new SQLite connection, in this order. busy_timeout
+# goes first so switching journal_mode waits on a locked database instead of
+# failing straight away.
+SQLITE_PRAGMA_DEFAULTS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'foreign_keys': 'ON',
+    'mmap_size': 268435456,
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+}
+
+SQLITE_PRAGMA_CHOICES = {
+    'journal_mode': {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'},
+    'synchronous': {'OFF', 'NORMAL', 'FULL', 'EXTRA', '0', '1', '2', '3'},
+    'foreign_keys': {'ON', 'OFF', '1', '0'},
+    'temp_store': {'DEFAULT', 'FILE', 'MEMORY', '0', '1', '2'},
+}
+
+
+def sqlite_pragmas_from_env(environ=None):
+    """Build the SQLite PRAGMA settings, overridden by SQLITE_<NAME> env vars."""
+    environ = os.environ if environ is None else environ
+    pragmas = {}
+    for name, default in SQLITE_PRAGMA_DEFAULTS.items():
+        raw = environ.get(f'SQLITE_{name.upper()}')
+        if raw is None or raw.strip() == '':
+            pragmas[name] = default
+            continue
+        raw = raw.strip()
+        if name in SQLITE_PRAGMA_CHOICES:
+            value = raw.upper()
+            if value not in SQLITE_PRAGMA_CHOICES[name]:
+                raise ValueError(f"Invalid value for SQLITE_{name.upper()}: {raw}")
+            pragmas[name] = value
+        else:
+            try:
+                pragmas[name] = int(raw)
+            except ValueError:
+                raise ValueError(f"SQLITE_{name.upper()} must be an integer: {raw}")
+    return pragmas
+
+
+def init_sqlite_pragmas(app):
+    """Apply the configured PRAGMAs to each connection the app's engine opens.
+
+    Must run after ``db.init_app(app)`` and before the first connection is made,
+    since the hook only sees connections created after it is registered.
+    """
+    pragmas = app.config.setdefault('SQLITE_PRAGMAS', sqlite_pragmas_from_env())
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
@@ -0,0 +1,192 @@
+"""
+Offline VCDS fault-code dictionary.
+
+The ``fault_codes`` table maps a code to a description. It maps
+``(code, address)`` for descriptions that only hold for one module, and
+``(code, '')`` for descriptions that hold for any module. It is seeded from
+``backend/data/fault_codes.csv`` by :func:`seed_fault_codes`.
+:func:`learn_fault_codes` grows it from every imported fault that carries a
+description.
+
+Lookups go through :class:`FaultCodeCache`, an in-process LRU that also
+remembers misses. :func:`enrich_faults` fills the empty descriptions of a
+whole list of faults with one query for the codes not yet cached. As in the
+settings cache, other processes' writes are caught by a signature query run
+at most once per request.
+"""
+import csv
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app, has_app_context, has_request_context, request
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from backend.extensions import db
+from backend.models import FaultCode, VCDSFault, utc_now
+from backend.change_versions import bump_change_versions
+
+BUNDLED_FAULT_CODES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fault_codes.csv')
+DEFAULT_CACHE_SIZE = 4096
+# Codes per IN (...) lookup, well under SQLite's bound parameter limit.
+LOOKUP_CHUNK_SIZE = 500
+
+
+def fault_codes_signature():
+    row = db.session.execute(db.text('SELECT COUNT(*), MAX(updated_at) FROM fault_codes')).one()
+    return tuple(row)
+
+
+class FaultCodeCache:
+    """LRU of ``(code, address) -> description or None``, safe to share between threads."""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._signature = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._signature = None
+
+    def _check(self):
+        if has_request_context() and getattr(request, 'fault_codes_checked', False):
+            return
+        signature = fault_codes_signature()
+        with self._lock:
+            if signature != self._signature:
+                self._entries.clear()
+                self._signature = signature
+        if has_request_context():
+            request.fault_codes_checked = True
+
+    def _load(self, keys):
+        codes = sorted({code for code, _ in keys})
+        known = {}
+        for start in range(0, len(codes), LOOKUP_CHUNK_SIZE):
+            known.update(
+                ((code, address), description)
+                for code, address, description in db.session.execute(
+                    db.select(FaultCode.code, FaultCode.address, FaultCode.description)
+                    .where(FaultCode.code.in_(codes[start:start + LOOKUP_CHUNK_SIZE]))
+                )
+            )
+        return {key: known.get(key) or known.get((key[0], '')) for key in keys}
+
+    def describe_many(self, keys):
+        """Return ``{(code, address): description or None}`` for ``keys``."""
+        self._check()
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+                else:
+                    missing.append(key)
+        if missing:
+            loaded = self._load(missing)
+            found.update(loaded)
+            with self._lock:
+                self._entries.update(loaded)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return found
+
+    def describe(self, code, address=''):
+        key = (str(code), str(address or ''))
+        return self.describe_many([key])[key]
+
+
+def get_fault_code_cache():
+    cache = current_app.extensions.get('fault_code_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'fault_code_cache', FaultCodeCache(current_app.config.get('FAULT_CODE_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+        )
+    return cache
+
+
+def enrich_faults(faults):
+    """Fill in empty descriptions of ``faults`` (dicts) from the dictionary, in place.
+
+    Faults serialized without a ``description`` field are left alone.
+    """
+    missing = [fault for fault in faults if fault.get('fault_code') and fault.get('description', True) in (None, '')]
+    if not missing:
+        return faults
+    keys = {(str(fault['fault_code']), str(fault.get('address') or '')) for fault in missing}
+    descriptions = get_fault_code_cache().describe_many(keys)
+    for fault in missing:
+        description = descriptions.get((str(fault['fault_code']), str(fault.get('address') or '')))
+        if description:
+            fault['description'] = description
+    return faults
+
+
+def _upsert(connection, rows, source, overwrite):
+    """Insert ``rows`` into the dictionary, replacing differing descriptions if ``overwrite``."""
+    table = FaultCode.__table__
+    now = utc_now()
+    changed = 0
+    for start in range(0, len(rows), LOOKUP_CHUNK_SIZE):
+        statement = sqlite_insert(table).values([
+            {**row, 'source': source, 'updated_at': now} for row in rows[start:start + LOOKUP_CHUNK_SIZE]
+        ])
+        if overwrite:
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.code, table.c.address],
+                set_={'description': statement.excluded.description, 'source': source, 'updated_at': now},
+                where=table.c.description != statement.excluded.description,
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=[table.c.code, table.c.address])
+        changed += connection.execute(statement).rowcount
+    return changed
+
+
+def seed_fault_codes(connection, path=BUNDLED_FAULT_CODES):
+    """Load the bundled dictionary, refreshing bundled rows. Returns rows changed."""
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = [
+            {'code': row['code'].strip(), 'address': (row.get('address') or '').strip(),
+             'description': row['description'].strip()}
+            for row in csv.DictReader(f) if row.get('code') and row.get('description')
+        ]
+    table = FaultCode.__table__
+    imported = {
+        (code, address) for code, address in connection.execute(
+            db.select(table.c.code, table.c.address).where(table.c.source != 'bundled')
+        )
+    }
+    # Descriptions learned from real scans win over the bundled ones.
+    return _upsert(connection, [r for r in rows if (r['code'], r['address']) not in imported], 'bundled', True)
+
+
+def learn_fault_codes(connection, faults):
+    """Add the descriptions of imported ``faults`` to the dictionary.
+
+    Each description is stored for its own address, and for any module
+    unless a description for any module already exists. Returns the number
+    of dictionary rows changed.
+    """
+    specific = {}
+    for fault in faults:
+        code, description = fault.get('fault_code'), (fault.get('description') or '').strip()
+        if code and description:
+            specific[(str(code), str(fault.get('address') or ''))] = description
+    if not specific:
+        return 0
+    rows = [{'code': code, 'address': address, 'description': d} for (code, address), d in specific.items()]
+    generic = {row['code']: {**row, 'address': ''} for row in rows if row['address']}
+    changed = _upsert(connection, rows, 'import', True)
+    changed += _upsert(connection, list(generic.values()), 'import', False)
+    if changed:
+        # Enriched /vcds responses of every vehicle may now differ.
+        bump_change_versions(connection, [VCDSFault.__tablename__])
+        if has_app_context():
+            get_fault_code_cache().clear()
+    return changed
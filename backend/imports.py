@@ -0,0 +1,320 @@
+"""
+Bulk import of vehicle exports.
+
+:func:`import_vehicle_records` takes the ``(record type, record)`` pairs
+written by :mod:`backend.exports`. They can come from a JSON export
+document (:func:`iter_document_records`) or an NDJSON stream
+(:func:`iter_ndjson_records`). Records are buffered per section and
+written with one executemany ``INSERT`` per chunk of ``chunk_size`` rows.
+Each chunk is committed on its own, so no single write transaction grows
+with the size of the import. If anything fails, the partly imported
+vehicle is removed again.
+
+Dates in ISO format take a ``fromisoformat`` fast path. Maintenance ids
+from the export are mapped to the new ids, taken from ``INSERT ...
+RETURNING``, so receipts and documents stay linked. Bulk inserts skip the ORM flush hooks, so the spend rollup and
+change versions of the new vehicle are refreshed explicitly at the end.
+"""
+import json
+import time
+from datetime import date, datetime
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from backend.extensions import db
+from backend.models import Vehicle, Receipt, ServiceDocument, SpendRollup
+from backend.exports import VEHICLE_EXPORT_SECTIONS
+from backend.rollups import rebuild_spend_rollup
+from backend.change_versions import bump_change_versions
+from backend.bulk import insert_returning_ids
+from backend.fault_codes import learn_fault_codes
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_IMPORT_CHUNK_SIZE = 10000
+
+SECTION_MODELS = {record_type: model for record_type, model, _ in VEHICLE_EXPORT_SECTIONS}
+SKIP_COLUMNS = {'id', 'vehicle_id', 'test_key'}
+# Defaults the original one-by-one import applied.
+SECTION_DEFAULTS = {'mods': {'status': 'completed'}}
+VEHICLE_DEFAULTS = {'mileage': 0}
+# Sections whose maintenance_id refers to an exported maintenance id.
+LINKED_SECTIONS = ('receipts', 'documents')
+
+
+class ImportDataError(ValueError):
+    """Raised when import data is malformed or cannot be stored."""
+
+
+def parse_iso_date(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_iso_datetime(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _encode_structured(value):
+    return json.dumps(value) if isinstance(value, (list, dict)) else value
+
+
+def _column_converters(model):
+    """Return ``{column: converter}`` for the importable columns of a model."""
+    converters = {}
+    for column in model.__table__.columns:
+        if column.key in SKIP_COLUMNS:
+            continue
+        python_type = column.type.python_type
+        if python_type is datetime:
+            converters[column.key] = parse_iso_datetime
+        elif python_type is date:
+            converters[column.key] = parse_iso_date
+        else:
+            converters[column.key] = _encode_structured
+    return converters
+
+
+def _column_defaults(model):
+    """Return ``{column: default}``; callable defaults are called per row."""
+    return {
+        column.key: column.default.arg
+        for column in model.__table__.columns
+        if column.default is not None and (column.default.is_scalar or column.default.is_callable)
+    }
+
+
+VEHICLE_CONVERTERS = _column_converters(Vehicle)
+CONVERTERS = {record_type: _column_converters(model) for record_type, model in SECTION_MODELS.items()}
+DEFAULTS = {record_type: _column_defaults(model) for record_type, model in SECTION_MODELS.items()}
+
+
+def iter_document_records(data):
+    """Yield records from a JSON export document.
+
+    The vehicle may be nested under ``vehicle`` (as exported) or given as
+    top-level fields.
+    """
+    if not isinstance(data, dict):
+        raise ImportDataError('Import data must be a JSON object')
+    vehicle = data.get('vehicle') if isinstance(data.get('vehicle'), dict) else data
+    yield 'vehicle', vehicle
+    for record_type in SECTION_MODELS:
+        records = data.get(record_type) or []
+        if not isinstance(records, list):
+            raise ImportDataError(f'{record_type} must be a list')
+        for record in records:
+            yield record_type, record
+
+
+def count_document_records(data):
+    """Return how many records :func:`iter_document_records` will yield."""
+    return 1 + sum(len(data.get(record_type) or []) for record_type in SECTION_MODELS)
+
+
+def iter_ndjson_records(lines):
+    """Yield records from NDJSON lines of ``{"type": ..., "record": ...}`` objects."""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            raise ImportDataError(f'Line {number} is not valid JSON')
+        if not isinstance(item, dict) or 'type' not in item or 'record' not in item:
+            raise ImportDataError(f'Line {number} must be an object with type and record')
+        yield item['type'], item['record']
+
+
+class VehicleImporter:
+    """Insert one vehicle and its records in chunked bulk statements."""
+
+    def __init__(self, chunk_size=IMPORT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.vehicle_id = None
+        self.buffers = {record_type: [] for record_type in SECTION_MODELS}
+        self.maintenance_ids = {}
+        self.active_faults = set()
+        self.report = {record_type: {'count': 0, 'seconds': 0.0} for record_type in ('vehicle', *SECTION_MODELS)}
+        self.skipped = 0
+
+    def _timed(self, record_type, started):
+        self.report[record_type]['seconds'] += time.perf_counter() - started
+
+    def _insert_vehicle(self, record):
+        started = time.perf_counter()
+        if not isinstance(record, dict):
+            raise ImportDataError('vehicle must be an object')
+        row = {key: convert(record.get(key, VEHICLE_DEFAULTS.get(key))) for key, convert in VEHICLE_CONVERTERS.items()
+               if key in record or key in VEHICLE_DEFAULTS}
+        try:
+            result = db.session.execute(Vehicle.__table__.insert().values(**row))
+        except IntegrityError:
+            raise ImportDataError('A vehicle with this VIN or registration already exists')
+        self.vehicle_id = result.inserted_primary_key[0]
+        db.session.commit()
+        self.report['vehicle']['count'] = 1
+        self._timed('vehicle', started)
+
+    def _convert(self, record_type, record):
+        if not isinstance(record, dict):
+            raise ImportDataError(f'{record_type} records must be objects')
+        converters = CONVERTERS[record_type]
+        row = dict(SECTION_DEFAULTS.get(record_type, {}))
+        for key, value in record.items():
+            convert = converters.get(key)
+            if convert is not None:
+                row[key] = convert(value)
+        row['vehicle_id'] = self.vehicle_id
+        if record_type == 'maintenance':
+            row['_source_id'] = record.get('id')
+        return row
+
+    def _flush(self, record_type):
+        rows = self.buffers[record_type]
+        if not rows:
+            return
+        if record_type in LINKED_SECTIONS:
+            # The maintenance records a chunk points at must have their new ids.
+            self._flush('maintenance')
+            for row in rows:
+                if row.get('maintenance_id') is not None:
+                    row['maintenance_id'] = self.maintenance_ids.get(row['maintenance_id'])
+        started = time.perf_counter()
+        model = SECTION_MODELS[record_type]
+        table = model.__table__
+        keys = set().union(*rows) - {'_source_id'}
+        defaults = DEFAULTS[record_type]
+        source_ids = [row.pop('_source_id', None) for row in rows]
+        params = []
+        for row in rows:
+            for key in keys:
+                if key not in row:
+                    default = defaults.get(key)
+                    row[key] = default(None) if callable(default) else default
+            params.append(row)
+
+        if record_type == 'maintenance' and any(source_id is not None for source_id in source_ids):
+            try:
+                new_ids = insert_returning_ids(table, params)
+            except RuntimeError as e:
+                raise ImportDataError(str(e))
+            for source_id, new_id in zip(source_ids, new_ids):
+                if source_id is not None:
+                    self.maintenance_ids[source_id] = new_id
+        else:
+            db.session.execute(table.insert(), params)
+        if record_type == 'vcds_faults':
+            learn_fault_codes(db.session.connection(), params)
+        db.session.commit()
+
+        self.report[record_type]['count'] += len(rows)
+        self.buffers[record_type] = []
+        self._timed(record_type, started)
+
+    def _duplicate_fault(self, row):
+        """Whether ``row`` repeats an active fault already imported.
+
+        Only one active fault per address and code is allowed; older exports
+        may hold several. The first one is kept.
+        """
+        if row.get('status', 'active') != 'active' or row.get('address') is None or row.get('fault_code') is None:
+            return False
+        key = (row['address'], row['fault_code'])
+        if key in self.active_faults:
+            return True
+        self.active_faults.add(key)
+        return False
+
+    def add(self, record_type, record):
+        if self.vehicle_id is None:
+            if record_type != 'vehicle':
+                raise ImportDataError('The vehicle record must come first')
+            self._insert_vehicle(record)
+            return
+        if record_type not in self.buffers:
+            self.skipped += 1
+            return
+        started = time.perf_counter()
+        row = self._convert(record_type, record)
+        if record_type == 'vcds_faults' and self._duplicate_fault(row):
+            self.skipped += 1
+        else:
+            self.buffers[record_type].append(row)
+        self._timed(record_type, started)
+        if len(self.buffers[record_type]) >= self.chunk_size:
+            self._flush(record_type)
+
+    def _bump_versions(self):
+        bump_change_versions(
+            db.session.connection(), [Vehicle.__tablename__, *(m.__tablename__ for m in SECTION_MODELS.values())],
+            vehicle_ids=[self.vehicle_id]
+        )
+
+    def finish(self):
+        for record_type in SECTION_MODELS:
+            self._flush(record_type)
+        rebuild_spend_rollup(db.session.connection(), [self.vehicle_id])
+        self._bump_versions()
+        db.session.commit()
+
+    def discard(self):
+        """Remove everything imported so far after a failure."""
+        db.session.rollback()
+        if self.vehicle_id is None:
+            return
+        for model in (Receipt, ServiceDocument, *SECTION_MODELS.values(), SpendRollup):
+            db.session.execute(model.__table__.delete().where(model.__table__.c.vehicle_id == self.vehicle_id))
+        db.session.execute(Vehicle.__table__.delete().where(Vehicle.__table__.c.id == self.vehicle_id))
+        # Lists read while the chunks were committed held the removed rows.
+        self._bump_versions()
+        db.session.commit()
+
+
+def import_vehicle_records(records, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import a vehicle from ``(record type, record)`` pairs.
+
+    Returns ``(vehicle id, report)`` where the report holds per-section
+    counts and timings. Raises ImportDataError on bad data.
+    """
+    importer = VehicleImporter(chunk_size)
+    started = time.perf_counter()
+    try:
+        for record_type, record in records:
+            importer.add(record_type, record)
+        if importer.vehicle_id is None:
+            raise ImportDataError('No vehicle record found')
+        importer.finish()
+    except ImportDataError:
+        importer.discard()
+        raise
+    except SQLAlchemyError as e:
+        importer.discard()
+        raise ImportDataError(f'Could not store import data: {e.__class__.__name__}')
+    except BaseException:
+        importer.discard()
+        raise
+    report = {
+        'sections': {
+            name: {'count': entry['count'], 'seconds': round(entry['seconds'], 4)}
+            for name, entry in importer.report.items()
+        },
+        'skipped': importer.skipped,
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+    return importer.vehicle_id, report
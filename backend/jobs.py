@@ -0,0 +1,384 @@
+"""
+Background jobs for long imports, exports and purges.
+
+Jobs are rows in the ``jobs`` table, so their status survives a restart.
+Work runs on a bounded thread pool of ``JOBS_MAX_WORKERS`` threads, and at
+most ``JOBS_MAX_PENDING`` jobs can be queued or running at once. Each job
+kind is a handler registered with :func:`job_kind`. The handler receives a
+:class:`JobContext` and the job's params. It reports progress through
+:meth:`JobContext.progress`, which also stops the job with
+:class:`JobCancelled` once a cancel has been requested. Inputs and results
+live in a directory per job below ``JOBS_DIR``.
+
+A job row is only written once its input is in place, so a job is never
+``queued`` without its params. Each running job records the runner that
+owns it, and that runner refreshes ``heartbeat_at`` while it works. When a
+runner starts, it marks failed only the ``running`` jobs whose heartbeat is
+older than ``JOBS_STALE_AFTER`` seconds, so jobs of other live processes are
+left alone. Jobs still ``queued`` are submitted again, because their inputs
+are already on disk; whichever runner claims one first runs it. Job
+directories are removed ``JOBS_RETENTION`` seconds after the job finished.
+With ``JOBS_RUN_INLINE`` set, jobs run in the submitting thread, which keeps
+tests deterministic.
+"""
+import atexit
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+from backend.extensions import db
+from backend.models import Job, utc_now
+
+DEFAULT_JOBS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'jobs'
+)
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_MAX_PENDING = 20
+DEFAULT_HEARTBEAT_INTERVAL = 15
+DEFAULT_STALE_AFTER = 120
+DEFAULT_RETENTION = 7 * 24 * 3600
+PROGRESS_INTERVAL = 0.5
+# Retention sweeps from enqueue() run at most this often, in seconds.
+PURGE_INTERVAL = 3600
+STAGING_PREFIX = 'staging-'
+
+# kind -> (handler, prepare)
+JOB_KINDS = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job has been cancelled."""
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already queued or running."""
+
+
+def job_kind(name, prepare=None):
+    """Register ``handler(ctx, params)`` as the job kind ``name``.
+
+    ``prepare(request, workdir)`` runs in the submitting request. It
+    stores any input in ``workdir`` and returns the params dict, or raises
+    ValueError for a bad request. The directory is renamed once the job
+    has an id, so params should name files relative to it.
+    """
+    def decorator(handler):
+        JOB_KINDS[name] = (handler, prepare)
+        return handler
+    return decorator
+
+
+def _naive(value):
+    return value.replace(tzinfo=None) if value is not None else None
+
+
+def serialize_job(job):
+    progress = None
+    eta_seconds = None
+    if job.total:
+        progress = round(min(job.processed / job.total, 1.0), 4)
+        started, updated = _naive(job.started_at), _naive(job.updated_at)
+        if job.status == 'running' and job.processed and started and updated:
+            rate = (updated - started).total_seconds() / job.processed
+            eta_seconds = round(rate * max(job.total - job.processed, 0), 1)
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'processed': job.processed,
+        'total': job.total,
+        'progress': progress,
+        'eta_seconds': eta_seconds,
+        'message': job.message,
+        'result': json.loads(job.result) if job.result else None,
+        'result_url': f'/api/jobs/{job.id}/result' if job.result_path else None,
+        'error': job.error,
+        'cancel_requested': job.cancel_requested,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class JobContext:
+    """What a running handler sees of its job."""
+
+    def __init__(self, job_id, workdir):
+        self.job_id = job_id
+        self.workdir = workdir
+        self.result_path = None
+        self._last_report = 0.0
+
+    def progress(self, processed, total=None, message=None, force=False):
+        """Record progress, at most every ``PROGRESS_INTERVAL`` seconds.
+
+        Raises JobCancelled when a cancel has been requested.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_report < PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        reported_at = utc_now()
+        values = {'processed': processed, 'updated_at': reported_at, 'heartbeat_at': reported_at}
+        if total is not None:
+            values['total'] = total
+        if message is not None:
+            values['message'] = message
+        table = Job.__table__
+        with db.engine.begin() as conn:
+            cancel_requested = conn.execute(
+                table.update().where(table.c.id == self.job_id).values(**values)
+                .returning(table.c.cancel_requested)
+            ).scalar()
+        if cancel_requested:
+            raise JobCancelled()
+
+
+def run_job(job_id, workdir, owner=None):
+    """Run a queued job to completion in the current app context."""
+    table = Job.__table__
+    now = utc_now()
+    claimed = db.session.execute(
+        table.update().where(table.c.id == job_id, table.c.status == 'queued')
+        .values(status='running', owner=owner, started_at=now, updated_at=now, heartbeat_at=now)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return
+    job = db.session.get(Job, job_id)
+    handler, _ = JOB_KINDS[job.kind]
+
+    ctx = JobContext(job_id, workdir)
+    params = json.loads(job.params) if job.params else {}
+    try:
+        result = handler(ctx, params)
+    except JobCancelled:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.status = 'cancelled'
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.status = 'failed'
+        job.error = str(e) or e.__class__.__name__
+    else:
+        db.session.expire_all()
+        job = db.session.get(Job, job_id)
+        job.status = 'succeeded'
+        job.result = json.dumps(result) if result is not None else None
+        job.result_path = ctx.result_path
+        if job.total is not None:
+            job.processed = job.total
+    job.finished_at = job.updated_at = utc_now()
+    db.session.commit()
+
+
+class JobRunner:
+    """Run jobs on a bounded thread pool, or inline for tests."""
+
+    def __init__(self, app, jobs_dir, max_workers=DEFAULT_MAX_WORKERS, max_pending=DEFAULT_MAX_PENDING,
+                 inline=False, heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL, stale_after=DEFAULT_STALE_AFTER,
+                 retention=DEFAULT_RETENTION):
+        self.app = app
+        self.jobs_dir = jobs_dir
+        self.max_pending = max_pending
+        self.inline = inline
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.retention = retention
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._executor = None if inline else ThreadPoolExecutor(max_workers, thread_name_prefix='job')
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat_thread = None
+        self._last_purge = None
+
+    def workdir(self, job_id):
+        path = os.path.join(self.jobs_dir, str(job_id))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _heartbeat(self):
+        table = Job.__table__
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                with self.app.app_context(), db.engine.begin() as conn:
+                    conn.execute(
+                        table.update().where(table.c.owner == self.owner, table.c.status == 'running')
+                        .values(heartbeat_at=utc_now())
+                    )
+            except SQLAlchemyError:
+                # A busy database only delays this beat; the next one retries.
+                pass
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+                self._heartbeat_thread.start()
+
+    def _reserve(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull('Too many jobs are queued; try again later')
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _run(self, job_id):
+        try:
+            with self.app.app_context():
+                try:
+                    run_job(job_id, self.workdir(job_id), self.owner)
+                finally:
+                    db.session.remove()
+        finally:
+            self._release()
+
+    def submit(self, job_id, reserved=False):
+        if not reserved:
+            self._reserve()
+        if self.inline:
+            try:
+                run_job(job_id, self.workdir(job_id), self.owner)
+            finally:
+                self._release()
+            return
+        self._start_heartbeat()
+        self._executor.submit(self._run, job_id)
+
+    def enqueue(self, kind, request=None):
+        """Store the input of a new job of ``kind``, create its row and submit it."""
+        _, prepare = JOB_KINDS[kind]
+        self._reserve()
+        try:
+            staging = os.path.join(self.jobs_dir, f'{STAGING_PREFIX}{uuid.uuid4().hex}')
+            os.makedirs(staging)
+            try:
+                params = prepare(request, staging) if prepare else {}
+                job = Job(kind=kind, status='queued', params=json.dumps(params))
+                db.session.add(job)
+                db.session.flush()
+                # Only a rename happens while the insert holds the write lock.
+                workdir = os.path.join(self.jobs_dir, str(job.id))
+                shutil.rmtree(workdir, ignore_errors=True)
+                os.replace(staging, workdir)
+                db.session.commit()
+            except BaseException:
+                db.session.rollback()
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            # Load the row now, so the caller doesn't race a worker for it.
+            db.session.refresh(job)
+        except BaseException:
+            self._release()
+            raise
+        self.submit(job.id, reserved=True)
+        if self._last_purge is None or time.monotonic() - self._last_purge > PURGE_INTERVAL:
+            self.purge_expired()
+        return job
+
+    def recover(self):
+        """Fail stale running jobs, resubmit queued ones and purge old job files.
+
+        Returns ``(failed, resubmitted)``.
+        """
+        cutoff = _naive(utc_now() - timedelta(seconds=self.stale_after))
+        last_seen = db.func.coalesce(Job.heartbeat_at, Job.updated_at, Job.started_at)
+        interrupted = Job.query.filter(
+            Job.status == 'running', db.or_(last_seen.is_(None), last_seen < cutoff)
+        ).all()
+        for job in interrupted:
+            job.status = 'failed'
+            job.error = 'Interrupted by a restart'
+            job.finished_at = utc_now()
+        db.session.commit()
+        submitted = 0
+        for job_id in [job.id for job in Job.query.filter_by(status='queued').order_by(Job.id)]:
+            try:
+                self.submit(job_id)
+            except JobQueueFull:
+                break
+            submitted += 1
+        self.purge_expired()
+        return len(interrupted), submitted
+
+    def purge_expired(self):
+        """Remove the directories of jobs that finished more than ``retention`` seconds ago.
+
+        Also removes leftover staging directories and those of deleted
+        jobs. Returns the number of directories removed.
+        """
+        self._last_purge = time.monotonic()
+        try:
+            names = os.listdir(self.jobs_dir)
+        except FileNotFoundError:
+            return 0
+        cutoff = utc_now() - timedelta(seconds=self.retention)
+        ids = [int(name) for name in names if name.isdigit()]
+        finished = {
+            job_id: finished_at for job_id, finished_at in db.session.execute(
+                db.select(Job.id, Job.finished_at).where(Job.id.in_(ids))
+            )
+        } if ids else {}
+        expired = [
+            job_id for job_id in ids
+            if job_id not in finished or (finished[job_id] is not None and _naive(finished[job_id]) < _naive(cutoff))
+        ]
+        staging = [
+            name for name in names if name.startswith(STAGING_PREFIX)
+            and os.path.getmtime(os.path.join(self.jobs_dir, name)) < time.time() - self.retention
+        ]
+        for name in [str(job_id) for job_id in expired] + staging:
+            shutil.rmtree(os.path.join(self.jobs_dir, name), ignore_errors=True)
+        if expired:
+            Job.query.filter(Job.id.in_(expired)).update({'result_path': None}, synchronize_session=False)
+            db.session.commit()
+        return len(expired) + len(staging)
+
+    def shutdown(self, wait=True):
+        self._stopped.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+def get_job_runner():
+    runner = current_app.extensions.get('job_runner')
+    if runner is None:
+        runner = JobRunner(
+            current_app._get_current_object(),
+            current_app.config.get('JOBS_DIR', DEFAULT_JOBS_DIR),
+            max_workers=current_app.config.get('JOBS_MAX_WORKERS', DEFAULT_MAX_WORKERS),
+            max_pending=current_app.config.get('JOBS_MAX_PENDING', DEFAULT_MAX_PENDING),
+            inline=current_app.config.get('JOBS_RUN_INLINE', False),
+            heartbeat_interval=current_app.config.get('JOBS_HEARTBEAT_INTERVAL', DEFAULT_HEARTBEAT_INTERVAL),
+            stale_after=current_app.config.get('JOBS_STALE_AFTER', DEFAULT_STALE_AFTER),
+            retention=current_app.config.get('JOBS_RETENTION', DEFAULT_RETENTION),
+        )
+        runner = current_app.extensions.setdefault('job_runner', runner)
+        atexit.register(runner.shutdown, False)
+    return runner
+
+
+def cancel_job(job):
+    """Cancel a queued job now, or ask a running one to stop."""
+    if job.status == 'queued':
+        job.status = 'cancelled'
+        job.finished_at = job.updated_at = utc_now()
+    elif job.status == 'running':
+        job.cancel_requested = True
+    else:
+        raise ValueError(f'Job is already {job.status}')
+    db.session.commit()
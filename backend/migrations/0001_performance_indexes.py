@@ -0,0 +1,24 @@
+"""Per-vehicle composite, partial and covering indexes for the history tables."""
+
+INDEXES = [
+    ('ix_maintenance_vehicle_date', 'maintenance', ['vehicle_id', 'date', 'cost'], None),
+    ('ix_maintenance_vehicle_category_date', 'maintenance', ['vehicle_id', 'category', 'date'], None),
+    ('ix_mods_vehicle_date', 'mods', ['vehicle_id', 'date'], None),
+    ('ix_mods_vehicle_category_date', 'mods', ['vehicle_id', 'category', 'date'], None),
+    ('ix_mods_vehicle_date_unplanned', 'mods', ['vehicle_id', 'date', 'cost', 'status'], "status != 'planned'"),
+    ('ix_costs_vehicle_date', 'costs', ['vehicle_id', 'date', 'amount'], None),
+    ('ix_costs_vehicle_category_date', 'costs', ['vehicle_id', 'category', 'date'], None),
+    ('ix_notes_vehicle_date', 'notes', ['vehicle_id', 'date'], None),
+    ('ix_vcds_faults_vehicle_detected', 'vcds_faults', ['vehicle_id', 'detected_date'], None),
+    ('ix_vcds_faults_vehicle_active', 'vcds_faults', ['vehicle_id', 'status'], "status = 'active'"),
+    ('ix_fuel_entries_vehicle_date', 'fuel_entries', ['vehicle_id', 'date', 'total_cost'], None),
+    ('ix_reminders_vehicle', 'reminders', ['vehicle_id'], None),
+    ('ix_service_documents_vehicle_uploaded', 'service_documents', ['vehicle_id', 'uploaded_at'], None),
+    ('ix_receipts_vehicle_date', 'receipts', ['vehicle_id', 'date'], None),
+    ('ix_receipts_maintenance', 'receipts', ['maintenance_id'], None),
+]
+
+
+def upgrade(ctx):
+    for name, table, columns, where in INDEXES:
+        ctx.create_index(name, table, columns, where=where)
@@ -0,0 +1,24 @@
+"""Monthly spend rollup table, backfilled one vehicle per transaction."""
+from sqlalchemy import text
+
+from backend.rollups import rebuild_spend_rollup
+
+
+def upgrade(ctx):
+    ctx.execute(
+        'CREATE TABLE IF NOT EXISTS spend_rollup ('
+        'vehicle_id INTEGER NOT NULL REFERENCES vehicles (id) ON DELETE CASCADE, '
+        'year_month VARCHAR(7) NOT NULL, '
+        'source VARCHAR(20) NOT NULL, '
+        'category VARCHAR(50) NOT NULL, '
+        'total FLOAT NOT NULL, '
+        'record_count INTEGER NOT NULL, '
+        'PRIMARY KEY (vehicle_id, year_month, source, category)'
+        ') WITHOUT ROWID'
+    )
+    with ctx.engine.connect() as conn:
+        vehicle_ids = [row[0] for row in conn.execute(text('SELECT id FROM vehicles ORDER BY id'))]
+    for vehicle_id in vehicle_ids:
+        with ctx.engine.begin() as conn:
+            rebuild_spend_rollup(conn, [vehicle_id])
+    ctx.log(f'  rolled up spend for {len(vehicle_ids)} vehicles')
@@ -0,0 +1,17 @@
+"""Put ``id`` right after the sort column of the covering per-vehicle indexes.
+
+Keyset pages are ordered by ``date DESC, id DESC``. With the amount column
+between ``date`` and the implicit rowid, SQLite had to sort rows sharing a
+date; with ``id`` in second place the index delivers the full order.
+"""
+
+INDEXES = [
+    ('ix_maintenance_vehicle_date', 'maintenance', ['vehicle_id', 'date', 'id', 'cost']),
+    ('ix_costs_vehicle_date', 'costs', ['vehicle_id', 'date', 'id', 'amount']),
+    ('ix_fuel_entries_vehicle_date', 'fuel_entries', ['vehicle_id', 'date', 'id', 'total_cost']),
+]
+
+
+def upgrade(ctx):
+    for name, table, columns in INDEXES:
+        ctx.replace_index(name, table, columns)
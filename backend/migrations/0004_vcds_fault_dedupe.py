@@ -0,0 +1,26 @@
+"""Remove duplicate active VCDS faults and enforce one active row per fault.
+
+Repeated imports of the same scan used to add a new active row each time.
+For each ``(vehicle_id, address, fault_code)`` the first active row is kept.
+It holds the original detection date. The unique partial index that imports
+now upsert against is then built.
+"""
+
+
+def upgrade(ctx):
+    if not ctx.has_table('vcds_faults'):
+        return
+    deleted = ctx.execute(
+        "DELETE FROM vcds_faults WHERE status = 'active' "
+        "AND address IS NOT NULL AND fault_code IS NOT NULL "
+        "AND id NOT IN ("
+        "SELECT MIN(id) FROM vcds_faults WHERE status = 'active' "
+        "AND address IS NOT NULL AND fault_code IS NOT NULL "
+        "GROUP BY vehicle_id, address, fault_code)"
+    ).rowcount
+    if deleted:
+        ctx.log(f'  removed {deleted} duplicate active faults')
+    ctx.create_index(
+        'ix_vcds_faults_active_key', 'vcds_faults', ['vehicle_id', 'address', 'fault_code'],
+        where="status = 'active'", unique=True
+    )
@@ -0,0 +1,34 @@
+"""Fault-code dictionary, seeded from the bundled file and from existing faults."""
+from sqlalchemy import text
+
+from backend.fault_codes import seed_fault_codes, learn_fault_codes
+
+
+def upgrade(ctx):
+    ctx.execute(
+        'CREATE TABLE IF NOT EXISTS fault_codes ('
+        'id INTEGER NOT NULL PRIMARY KEY, '
+        'code VARCHAR(20) NOT NULL, '
+        "address VARCHAR(50) NOT NULL DEFAULT '', "
+        'description TEXT NOT NULL, '
+        "source VARCHAR(20) NOT NULL DEFAULT 'bundled', "
+        'updated_at DATETIME'
+        ')'
+    )
+    ctx.create_index('ix_fault_codes_code_address', 'fault_codes', ['code', 'address'], unique=True)
+    with ctx.engine.begin() as conn:
+        seeded = seed_fault_codes(conn)
+    ctx.log(f'  seeded {seeded} fault codes')
+
+    last_id = 0
+    while True:
+        with ctx.engine.begin() as conn:
+            faults = [dict(row._mapping) for row in conn.execute(text(
+                'SELECT id, address, fault_code, description FROM vcds_faults '
+                "WHERE id > :last_id AND fault_code IS NOT NULL AND description IS NOT NULL AND description != '' "
+                'ORDER BY id LIMIT :limit'
+            ), {'last_id': last_id, 'limit': ctx.batch_size})]
+            if not faults:
+                break
+            learn_fault_codes(conn, faults)
+        last_id = faults[-1]['id']
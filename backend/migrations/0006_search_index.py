@@ -0,0 +1,11 @@
+"""Full-text search index and its triggers, filled one source table per transaction."""
+from backend.search import SEARCH_SOURCES, create_search_index, rebuild_search_index
+
+
+def upgrade(ctx):
+    with ctx.engine.begin() as conn:
+        create_search_index(conn)
+    for entity in SEARCH_SOURCES:
+        with ctx.engine.begin() as conn:
+            counts = rebuild_search_index(conn, [entity])
+        ctx.log(f'  indexed {counts[entity]} {entity} records for search')
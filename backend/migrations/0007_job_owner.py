@@ -0,0 +1,6 @@
+"""Record which runner owns a running job and when it last reported in."""
+
+
+def upgrade(ctx):
+    ctx.add_column('jobs', 'owner', 'VARCHAR(100)')
+    ctx.add_column('jobs', 'heartbeat_at', 'DATETIME')
@@ -0,0 +1,176 @@
+"""
+Versioned schema migrations for the MuttLogbook SQLite database.
+
+``db.create_all()`` only creates missing tables; it never adds indexes or
+columns to a table that already exists. Migrations fill that gap. Each one is
+a module in this package named ``NNNN_description.py`` exposing
+``upgrade(ctx)``, where ``ctx`` is a :class:`MigrationContext`. Applied
+versions are recorded in the ``schema_version`` table.
+
+Every step a migration takes runs in its own short transaction, and
+backfills commit batch by batch, so writers only wait for the step in
+progress rather than the whole migration. Steps are written to be
+idempotent: a migration interrupted part way through is simply re-run.
+"""
+import importlib
+import pkgutil
+import re
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+DEFAULT_BATCH_SIZE = 5000
+
+MIGRATION_NAME_PATTERN = re.compile(r'^(\d{4})_(\w+)$')
+
+
+class MigrationContext:
+    """Helpers passed to each migration's ``upgrade()``."""
+
+    def __init__(self, engine, batch_size=DEFAULT_BATCH_SIZE, log=None):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+
+    def execute(self, sql, params=None):
+        """Run a single statement in its own transaction."""
+        with self.engine.begin() as conn:
+            return conn.execute(text(sql), params or {})
+
+    def has_table(self, table):
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': table}
+            ).first()
+        return row is not None
+
+    def has_column(self, table, column):
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(f'PRAGMA table_info("{table}")')).fetchall()
+        return any(row[1] == column for row in rows)
+
+    def has_index(self, name):
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"),
+                {'name': name}
+            ).first()
+        return row is not None
+
+    def index_columns(self, name):
+        """Return the column names of an index in order, or None if it does not exist."""
+        if not self.has_index(name):
+            return None
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(f'PRAGMA index_info("{name}")')).fetchall()
+        return [row[2] for row in sorted(rows)]
+
+    def replace_index(self, name, table, columns, where=None, unique=False):
+        """Rebuild an index whose columns differ from ``columns``."""
+        existing = self.index_columns(name)
+        if existing == list(columns):
+            return False
+        if existing is not None:
+            self.log(f'  dropping index {name}')
+            self.execute(f'DROP INDEX IF EXISTS "{name}"')
+        return self.create_index(name, table, columns, where=where, unique=unique)
+
+    def create_index(self, name, table, columns, where=None, unique=False):
+        """Create an index if it is missing, holding the write lock only for this build."""
+        if not self.has_table(table) or self.has_index(name):
+            return False
+        column_sql = ', '.join(f'"{c}"' for c in columns)
+        sql = f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{name}" ON "{table}" ({column_sql})'
+        if where:
+            sql += f' WHERE {where}'
+        self.log(f'  creating index {name} on {table}')
+        self.execute(sql)
+        return True
+
+    def add_column(self, table, column, ddl):
+        """Add a column if it is missing. ``ddl`` is the type and constraints, e.g. ``'TEXT'``."""
+        if not self.has_table(table) or self.has_column(table, column):
+            return False
+        self.log(f'  adding column {table}.{column}')
+        self.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {ddl}')
+        return True
+
+    def backfill(self, table, assignments, where=None, batch_size=None):
+        """Run ``UPDATE table SET assignments`` over rowid ranges, one commit per batch.
+
+        Returns the number of rows updated.
+        """
+        batch_size = batch_size or self.batch_size
+        with self.engine.connect() as conn:
+            max_rowid = conn.execute(text(f'SELECT MAX(rowid) FROM "{table}"')).scalar() or 0
+        condition = f' AND ({where})' if where else ''
+        updated = 0
+        for start in range(0, max_rowid, batch_size):
+            result = self.execute(
+                f'UPDATE "{table}" SET {assignments} WHERE rowid > :start AND rowid <= :end{condition}',
+                {'start': start, 'end': start + batch_size}
+            )
+            updated += result.rowcount
+        if updated:
+            self.log(f'  backfilled {updated} rows in {table}')
+        return updated
+
+
+def discover_migrations():
+    """Return ``[(version, name, module)]`` for every migration module, in order."""
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        match = MIGRATION_NAME_PATTERN.match(info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f'{__name__}.{info.name}')
+        migrations.append((int(match.group(1)), match.group(2), module))
+    migrations.sort(key=lambda m: m[0])
+    return migrations
+
+
+def ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_version ('
+            'version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at VARCHAR(40) NOT NULL)'
+        ))
+
+
+def applied_versions(engine):
+    ensure_version_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text('SELECT version FROM schema_version'))}
+
+
+def current_version(engine):
+    """Return the highest applied migration version, or 0 for a new database."""
+    return max(applied_versions(engine), default=0)
+
+
+def pending_migrations(engine):
+    applied = applied_versions(engine)
+    return [m for m in discover_migrations() if m[0] not in applied]
+
+
+def run_migrations(engine, batch_size=DEFAULT_BATCH_SIZE, target=None, log=None):
+    """Apply pending migrations up to ``target`` (all by default).
+
+    Returns the list of versions applied.
+    """
+    log = log or (lambda message: None)
+    ctx = MigrationContext(engine, batch_size=batch_size, log=log)
+    applied = []
+    for version, name, module in pending_migrations(engine):
+        if target is not None and version > target:
+            break
+        log(f'Applying migration {version:04d}_{name}')
+        module.upgrade(ctx)
+        with engine.begin() as conn:
+            conn.execute(
+                text('INSERT INTO schema_version (version, name, applied_at) VALUES (:version, :name, :applied_at)'),
+                {'version': version, 'name': name, 'applied_at': datetime.now(timezone.utc).isoformat()}
+            )
+        applied.append(version)
+    return applied
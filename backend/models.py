@@ -1,6 +1,8 @@
 from datetime import datetime, timezone
 import json
+from sqlalchemy import event
 from backend.extensions import db
+from backend.search import create_search_index, drop_search_index
 
 def utc_now():
     return datetime.now(timezone.utc)
@@ -31,9 +33,14 @@ class Vehicle(db.Model):
     fuel_entries = db.relationship('FuelEntry', backref='vehicle', lazy=True, cascade='all, delete-orphan')
     reminders = db.relationship('Reminder', backref='vehicle', lazy=True, cascade='all, delete-orphan')
     receipts = db.relationship('Receipt', backref='vehicle', lazy=True, cascade='all, delete-orphan')
+    vcds_scans = db.relationship('VCDSScan', backref='vehicle', lazy=True, cascade='all, delete-orphan')
 
 class Maintenance(db.Model):
     __tablename__ = 'maintenance'
+    __table_args__ = (
+        db.Index('ix_maintenance_vehicle_date', 'vehicle_id', 'date', 'id', 'cost'),
+        db.Index('ix_maintenance_vehicle_category_date', 'vehicle_id', 'category', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id', ondelete='CASCADE'), nullable=False)
@@ -51,6 +58,12 @@ class Maintenance(db.Model):
 
 class Mod(db.Model):
     __tablename__ = 'mods'
+    __table_args__ = (
+        db.Index('ix_mods_vehicle_date', 'vehicle_id', 'date'),
+        db.Index('ix_mods_vehicle_category_date', 'vehicle_id', 'category', 'date'),
+        db.Index('ix_mods_vehicle_date_unplanned', 'vehicle_id', 'date', 'cost', 'status',
+                 sqlite_where=db.text("status != 'planned'")),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id', ondelete='CASCADE'), nullable=False)
@@ -67,6 +80,10 @@ class Mod(db.Model):
 
 class Cost(db.Model):
     __tablename__ = 'costs'
+    __table_args__ = (
+        db.Index('ix_costs_vehicle_date', 'vehicle_id', 'date', 'id', 'amount'),
+        db.Index('ix_costs_vehicle_category_date', 'vehicle_id', 'category', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id', ondelete='CASCADE'), nullable=False)
@@ -79,6 +96,9 @@ class Cost(db.Model):
 
 class Note(db.Model):
     __tablename__ = 'notes'
+    __table_args__ = (
+        db.Index('ix_notes_vehicle_date', 'vehicle_id', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id', ondelete='CASCADE'), nullable=False)
@@ -91,6 +111,14 @@ class Note(db.Model):
 
 class VCDSFault(db.Model):
     __tablename__ = 'vcds_faults'
+    __table_args__ = (
+        db.Index('ix_vcds_faults_vehicle_detected', 'vehicle_id', 'detected_date'),
+        db.Index('ix_vcds_faults_vehicle_active', 'vehicle_id', 'status',
+                 sqlite_where=db.text("status = 'active'")),
+        # One active row per fault; imports upsert against this.
+        db.Index('ix_vcds_faults_active_key', 'vehicle_id', 'address', 'fault_code', unique=True,
+                 sqlite_where=db.text("status = 'active'")),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id', ondelete='CASCADE'), nullable=False)
@@ -130,6 +158,9 @@ class VehiclePhoto(db.Model):
 
 class FuelEntry(db.Model):
     __tablename__ = 'fuel_entries'
+    __table_args__ = (
+        db.Index('ix_fuel_entries_vehicle_date', 'vehicle_id', 'date', 'id', 'total_cost'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id', ondelete='CASCADE'), nullable=False)
@@ -145,6 +176,9 @@ class FuelEntry(db.Model):
 
 class Reminder(db.Model):
     __tablename__ = 'reminders'
+    __table_args__ = (
+        db.Index('ix_reminders_vehicle', 'vehicle_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id', ondelete='CASCADE'), nullable=False)
@@ -173,6 +207,9 @@ class Setting(db.Model):
 
 class ServiceDocument(db.Model):
     __tablename__ = 'service_documents'
+    __table_args__ = (
+        db.Index('ix_service_documents_vehicle_uploaded', 'vehicle_id', 'uploaded_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id', ondelete='CASCADE'), nullable=False)
@@ -187,6 +224,10 @@ class ServiceDocument(db.Model):
 
 class Receipt(db.Model):
     __tablename__ = 'receipts'
+    __table_args__ = (
+        db.Index('ix_receipts_vehicle_date', 'vehicle_id', 'date'),
+        db.Index('ix_receipts_maintenance', 'maintenance_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id', ondelete='CASCADE'), nullable=False)
     maintenance_id = db.Column(db.Integer, db.ForeignKey('maintenance.id', ondelete='SET NULL'), nullable=True)
@@ -198,3 +239,106 @@ class Receipt(db.Model):
     filename = db.Column(db.String(255))
     test_key = db.Column(db.String(50), nullable=True, index=True)
     uploaded_at = db.Column(db.DateTime, default=utc_now)
+
+
+class SpendRollup(db.Model):
+    """Monthly spend per vehicle, source and category, maintained by backend.rollups."""
+    __tablename__ = 'spend_rollup'
+    __table_args__ = {'sqlite_with_rowid': False}
+    
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id', ondelete='CASCADE'), primary_key=True)
+    year_month = db.Column(db.String(7), primary_key=True)
+    source = db.Column(db.String(20), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Float, nullable=False, default=0)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ChangeVersion(db.Model):
+    """Write counter per table and vehicle, maintained by backend.change_versions.
+
+    ``vehicle_id = 0`` counts every write to the table.
+    """
+    __tablename__ = 'change_versions'
+    __table_args__ = {'sqlite_with_rowid': False}
+    
+    table_name = db.Column(db.String(50), primary_key=True)
+    vehicle_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Job(db.Model):
+    """A background job and its progress, run by backend.jobs."""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    params = db.Column(db.Text)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    message = db.Column(db.String(255))
+    result = db.Column(db.Text)
+    result_path = db.Column(db.String(500))
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    owner = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=utc_now)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+
+class FaultCode(db.Model):
+    """Offline fault-code dictionary, maintained by backend.fault_codes.
+
+    ``address = ''`` is the description for any module.
+    """
+    __tablename__ = 'fault_codes'
+    __table_args__ = (
+        db.Index('ix_fault_codes_code_address', 'code', 'address', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(20), nullable=False)
+    address = db.Column(db.String(50), nullable=False, default='')
+    description = db.Column(db.Text, nullable=False)
+    source = db.Column(db.String(20), nullable=False, default='bundled')
+    updated_at = db.Column(db.DateTime, default=utc_now)
+
+
+class VCDSScan(db.Model):
+    """A raw VCDS scan, stored zlib-compressed by backend.vcds_scans.
+
+    ``modules`` holds the parsed result as JSON, ``{address: {"module",
+    "status", "faults": {code: description}}}``, so scans can be compared
+    without decompressing and parsing them again.
+    """
+    __tablename__ = 'vcds_scans'
+    __table_args__ = (
+        db.Index('ix_vcds_scans_vehicle_hash', 'vehicle_id', 'content_hash', unique=True),
+        db.Index('ix_vcds_scans_vehicle_created', 'vehicle_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id', ondelete='CASCADE'), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)
+    raw = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    raw_size = db.Column(db.Integer, nullable=False)
+    compressed_size = db.Column(db.Integer, nullable=False)
+    modules = db.Column(db.Text, nullable=False)
+    fault_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=utc_now)
+
+
+# search_index is an FTS5 table rather than a model, so it and its triggers
+# are created and dropped alongside the tables.
+@event.listens_for(db.metadata, 'after_create')
+def create_search_schema(target, connection, **kw):
+    create_search_index(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def drop_search_schema(target, connection, **kw):
+    drop_search_index(connection)
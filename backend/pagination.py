@@ -0,0 +1,113 @@
+"""
+Keyset pagination for list endpoints.
+
+A page is requested with ``limit`` and, for every page after the first, the
+``cursor`` returned as ``next_cursor`` by the previous page. The cursor is
+an opaque token holding the ``(sort value, id)`` of the last row served, so
+the next page starts with an indexed range condition instead of an OFFSET
+scan over everything already returned.
+
+Dated resources are ordered newest first (``sort DESC, id DESC``); SQLite
+sorts NULL dates after every real date in that order. Resources without a
+sort column are ordered by ``id`` ascending.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, (date, datetime)):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort_column=None):
+    """Return ``(sort value, id)`` from a cursor, raising ValueError if malformed.
+
+    Without ``sort_column`` the sort value may be a number, such as a
+    search score, and is returned as is.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        row_id = int(row_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError('Invalid cursor')
+    if sort_value is not None and sort_column is None:
+        if isinstance(sort_value, bool) or not isinstance(sort_value, (int, float)):
+            raise ValueError('Invalid cursor')
+    elif sort_value is not None:
+        if not isinstance(sort_value, str):
+            raise ValueError('Invalid cursor')
+        python_type = sort_column.type.python_type
+        try:
+            if python_type is datetime:
+                sort_value = datetime.fromisoformat(sort_value)
+            elif python_type is date:
+                sort_value = date.fromisoformat(sort_value)
+        except ValueError:
+            raise ValueError('Invalid cursor')
+    return sort_value, row_id
+
+
+def page_args(args):
+    """Return ``(limit, cursor)`` if the request asks for a page, else None.
+
+    Raises ValueError for a bad ``limit``.
+    """
+    if 'limit' not in args and 'cursor' not in args:
+        return None
+    limit = args.get('limit', DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return limit, args.get('cursor') or None
+
+
+def keyset_query(query, id_column, cursor=None, sort_column=None):
+    """Return ``query`` in keyset order, starting after ``cursor``.
+
+    Any ordering already on ``query`` is replaced.
+    """
+    query = query.order_by(None)
+    if sort_column is None:
+        query = query.order_by(id_column.asc())
+    else:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, sort_column)
+        if sort_column is None:
+            query = query.filter(id_column > row_id)
+        elif sort_value is None:
+            query = query.filter(sort_column.is_(None), id_column < row_id)
+        else:
+            query = query.filter(or_(
+                sort_column < sort_value,
+                and_(sort_column == sort_value, id_column < row_id),
+                sort_column.is_(None)
+            ))
+    return query
+
+
+def paginate_query(query, id_column, limit, cursor=None, sort_column=None):
+    """Return ``(rows, next_cursor)`` for one page of ``query``."""
+    query = keyset_query(query, id_column, cursor, sort_column)
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        sort_value = getattr(last, sort_column.key) if sort_column is not None else None
+        next_cursor = encode_cursor(sort_value, getattr(last, id_column.key))
+    return rows, next_cursor
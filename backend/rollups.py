@@ -0,0 +1,256 @@
+"""
+Incrementally maintained monthly spend rollup.
+
+``spend_rollup`` holds one row per (vehicle_id, year_month, source, category)
+with the summed amount and the number of records behind it. A session
+``after_flush`` hook turns every insert, update and delete of a spend record
+into deltas against that table, so ``/dashboard`` and ``/analytics`` read a
+few dozen pre-aggregated rows instead of the full history.
+
+Records without a date are kept under ``year_month = ''`` and uncategorised
+records under ``category = ''``. Fuel entries are filed under category
+``'fuel'``. Mods only count once their status is no longer ``'planned'``.
+
+Bulk statements (``Query.delete()``, ``insert()`` with a list of rows) skip
+the ORM flush, so code that uses them must call :func:`rebuild_spend_rollup`
+for the vehicles it touched.
+"""
+from sqlalchemy import event, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from backend.extensions import db
+from backend.models import Vehicle, Maintenance, Mod, Cost, FuelEntry, SpendRollup
+
+# model -> (source name, amount attribute)
+SPEND_SOURCES = {
+    Maintenance: ('maintenance', 'cost'),
+    Mod: ('mods', 'cost'),
+    Cost: ('costs', 'amount'),
+    FuelEntry: ('fuel', 'total_cost'),
+}
+
+REBUILD_SELECTS = [
+    "SELECT vehicle_id, COALESCE(strftime('%Y-%m', date), ''), 'maintenance', COALESCE(category, ''), "
+    "SUM(cost), COUNT(*) FROM maintenance WHERE cost IS NOT NULL{vehicle_filter} GROUP BY 1, 2, 4",
+    "SELECT vehicle_id, COALESCE(strftime('%Y-%m', date), ''), 'mods', COALESCE(category, ''), "
+    "SUM(cost), COUNT(*) FROM mods WHERE cost IS NOT NULL AND status != 'planned'{vehicle_filter} GROUP BY 1, 2, 4",
+    "SELECT vehicle_id, COALESCE(strftime('%Y-%m', date), ''), 'costs', COALESCE(category, ''), "
+    "SUM(amount), COUNT(*) FROM costs WHERE amount IS NOT NULL{vehicle_filter} GROUP BY 1, 2, 4",
+    "SELECT vehicle_id, COALESCE(strftime('%Y-%m', date), ''), 'fuel', 'fuel', "
+    "SUM(total_cost), COUNT(*) FROM fuel_entries WHERE total_cost IS NOT NULL{vehicle_filter} GROUP BY 1, 2",
+]
+
+_UNKNOWN = object()
+
+
+def spend_totals(vehicle_id):
+    """Return ``{source: total}`` across all months for a vehicle."""
+    rows = db.session.query(
+        SpendRollup.source, db.func.sum(SpendRollup.total)
+    ).filter(SpendRollup.vehicle_id == vehicle_id).group_by(SpendRollup.source).all()
+    return {source: total or 0 for source, total in rows}
+
+
+def spend_buckets(vehicle_id, sources, category=None):
+    """Return dated ``(source, year_month, category, total)`` rows for a vehicle."""
+    if not sources:
+        return []
+    query = db.session.query(
+        SpendRollup.source, SpendRollup.year_month, SpendRollup.category, SpendRollup.total
+    ).filter(
+        SpendRollup.vehicle_id == vehicle_id,
+        SpendRollup.source.in_(sources),
+        SpendRollup.year_month != ''
+    )
+    if category:
+        query = query.filter(SpendRollup.category == category)
+    return query.all()
+
+
+def spend_buckets_between(vehicle_id, sources, start=None, end=None, category=None):
+    """Return dated ``(source, year_month, category, total)`` rows for a date range.
+
+    Month boundaries in the range are arbitrary, so this groups the base
+    tables directly in one UNION ALL query rather than reading the rollup.
+    """
+    selects = []
+    for model, (source, amount_attr) in SPEND_SOURCES.items():
+        if source not in sources:
+            continue
+        if source == 'fuel' and category and category != 'fuel':
+            continue
+        amount = getattr(model, amount_attr)
+        month = db.func.strftime('%Y-%m', model.date)
+        if source == 'fuel':
+            group_category = db.literal('fuel')
+        else:
+            group_category = db.func.coalesce(model.category, '')
+        conditions = [model.vehicle_id == vehicle_id, model.date.isnot(None), amount.isnot(None)]
+        if source == 'mods':
+            conditions.append(model.status != 'planned')
+        if start:
+            conditions.append(model.date >= start)
+        if end:
+            conditions.append(model.date <= end)
+        if category and source != 'fuel':
+            conditions.append(model.category == category)
+        selects.append(
+            db.select(
+                db.literal(source).label('source'), month.label('year_month'),
+                group_category.label('category'), db.func.sum(amount).label('total')
+            ).where(*conditions).group_by(month, group_category)
+        )
+    if not selects:
+        return []
+    return db.session.execute(db.union_all(*selects)).all()
+
+
+def rebuild_spend_rollup(connection, vehicle_ids=None):
+    """Recompute rollup rows from the base tables for some or all vehicles."""
+    if vehicle_ids is not None:
+        vehicle_ids = sorted({int(v) for v in vehicle_ids if v is not None})
+        if not vehicle_ids:
+            return
+        id_list = ', '.join(str(v) for v in vehicle_ids)
+        connection.execute(text(f'DELETE FROM spend_rollup WHERE vehicle_id IN ({id_list})'))
+        vehicle_filter = f' AND vehicle_id IN ({id_list})'
+    else:
+        connection.execute(text('DELETE FROM spend_rollup'))
+        vehicle_filter = ''
+    for select in REBUILD_SELECTS:
+        connection.execute(text(
+            'INSERT INTO spend_rollup (vehicle_id, year_month, source, category, total, record_count) '
+            + select.format(vehicle_filter=vehicle_filter)
+        ))
+
+
+def _year_month(value):
+    return value.strftime('%Y-%m') if value else ''
+
+
+def _contribution(source, amount, vehicle_id, record_date, category, status):
+    """Return ``(key, amount)`` for a record's share of the rollup, or None."""
+    if amount is None or vehicle_id is None:
+        return None
+    if source == 'mods' and (status is None or status == 'planned'):
+        return None
+    try:
+        vehicle_id = int(vehicle_id)
+    except (TypeError, ValueError):
+        return None
+    category = 'fuel' if source == 'fuel' else (category or '')
+    return (vehicle_id, _year_month(record_date), source, category), amount
+
+
+def _current_contribution(obj, source, amount_attr):
+    return _contribution(
+        source, getattr(obj, amount_attr), obj.vehicle_id, obj.date,
+        getattr(obj, 'category', None), getattr(obj, 'status', None)
+    )
+
+
+def _previous_value(state, attr):
+    history = state.attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    if history.added:
+        # Changed without the old value ever being loaded.
+        return _UNKNOWN
+    return state.dict.get(attr, _UNKNOWN)
+
+
+def _previous_contribution(obj, source, amount_attr):
+    state = obj._sa_instance_state
+    attrs = [amount_attr, 'vehicle_id', 'date', 'category', 'status']
+    values = {attr: _previous_value(state, attr) for attr in attrs if attr in state.attrs}
+    if any(value is _UNKNOWN for value in values.values()):
+        return _UNKNOWN
+    return _contribution(
+        source, values[amount_attr], values['vehicle_id'], values['date'],
+        values.get('category'), values.get('status')
+    )
+
+
+@event.listens_for(Session, 'after_flush')
+def update_spend_rollup(session, flush_context):
+    deltas = {}
+    rebuild_vehicles = set()
+    rebuild_all = False
+    deleted_vehicles = {obj.id for obj in session.deleted if isinstance(obj, Vehicle)}
+
+    def add(contribution, sign):
+        if contribution is None:
+            return
+        key, amount = contribution
+        total, count = deltas.get(key, (0, 0))
+        deltas[key] = (total + sign * amount, count + sign)
+
+    for obj in session.new:
+        spec = SPEND_SOURCES.get(type(obj))
+        if spec:
+            add(_current_contribution(obj, *spec), 1)
+
+    for obj in session.dirty:
+        spec = SPEND_SOURCES.get(type(obj))
+        if not spec or not session.is_modified(obj, include_collections=False):
+            continue
+        previous = _previous_contribution(obj, *spec)
+        if previous is _UNKNOWN:
+            rebuild_vehicles.add(obj.vehicle_id)
+            continue
+        add(previous, -1)
+        add(_current_contribution(obj, *spec), 1)
+
+    for obj in session.deleted:
+        spec = SPEND_SOURCES.get(type(obj))
+        if not spec:
+            continue
+        previous = _previous_contribution(obj, *spec)
+        if previous is _UNKNOWN:
+            # The row counted toward its old vehicle; only if that is unknown
+            # too can it be anywhere.
+            old_vehicle = _previous_value(obj._sa_instance_state, 'vehicle_id')
+            if old_vehicle is _UNKNOWN:
+                rebuild_all = True
+            else:
+                rebuild_vehicles.update(v for v in (old_vehicle, obj.vehicle_id) if v is not None)
+            continue
+        add(previous, -1)
+
+    if not deltas and not rebuild_vehicles and not rebuild_all and not deleted_vehicles:
+        return
+
+    connection = session.connection()
+    rows = [
+        {'vehicle_id': key[0], 'year_month': key[1], 'source': key[2], 'category': key[3],
+         'total': total, 'record_count': count}
+        for key, (total, count) in deltas.items()
+        if key[0] not in deleted_vehicles and key[0] not in rebuild_vehicles and (total or count)
+    ]
+    if rows and not rebuild_all:
+        table = SpendRollup.__table__
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['vehicle_id', 'year_month', 'source', 'category'],
+            set_={
+                'total': table.c.total + stmt.excluded.total,
+                'record_count': table.c.record_count + stmt.excluded.record_count,
+            }
+        )
+        connection.execute(stmt, rows)
+        touched = sorted({row['vehicle_id'] for row in rows})
+        connection.execute(
+            table.delete().where(table.c.vehicle_id.in_(touched), table.c.record_count <= 0)
+        )
+
+    if rebuild_all:
+        rebuild_spend_rollup(connection)
+    elif rebuild_vehicles:
+        rebuild_spend_rollup(connection, rebuild_vehicles)
+
+    if deleted_vehicles:
+        table = SpendRollup.__table__
+        connection.execute(table.delete().where(table.c.vehicle_id.in_(sorted(deleted_vehicles))))
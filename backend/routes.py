@@ -1,16 +1,41 @@
-from flask import Blueprint, request, jsonify, send_from_directory, send_file, current_app
-from backend.extensions import db
-from backend.models import Vehicle, Maintenance, Mod, Cost, Note, VCDSFault, Guide, VehiclePhoto, FuelEntry, Reminder, Setting, Receipt, ServiceDocument
+from flask import Blueprint, request, jsonify, send_from_directory, send_file, current_app, Response, stream_with_context
+from backend.extensions import db, SQLITE_PRAGMA_DEFAULTS
+from backend.models import Vehicle, Maintenance, Mod, Cost, Note, VCDSFault, Guide, VehiclePhoto, FuelEntry, Reminder, Setting, Receipt, ServiceDocument, Job, VCDSScan
+from backend.rollups import spend_totals, spend_buckets, spend_buckets_between, rebuild_spend_rollup
+from backend.settings_cache import get_settings_cache, invalidate_settings_cache
+from backend.settings_backup import get_settings_backup_writer
+from backend.pagination import page_args, paginate_query
+from backend.change_versions import conditional_get, bump_change_versions
+from backend.compression import compress_response
+from backend.imports import (
+    IMPORT_CHUNK_SIZE, MAX_IMPORT_CHUNK_SIZE, import_vehicle_records, iter_document_records, iter_ndjson_records,
+    count_document_records
+)
+from backend.jobs import (
+    JOB_KINDS, JobQueueFull, job_kind, get_job_runner, serialize_job, cancel_job
+)
+from backend.bulk import BULK_ENTITIES, DEFAULT_MAX_BULK_ROWS, bulk_create, bulk_update, bulk_delete
+from backend.batch import DEFAULT_MAX_BATCH_REQUESTS, parse_batch, run_batch
+from backend.vcds import (
+    VCDSParser, no_faults_payload, iter_upload_lines, iter_faults_json, iter_faults_ndjson, import_vcds_faults
+)
+from backend.fault_codes import enrich_faults, learn_fault_codes
+from backend.vcds_scans import store_scan, serialize_scan, iter_scan_text, diff_scans, SCAN_FIELDS
+from backend.search import SEARCH_SOURCES, DEFAULT_SEARCH_PAGE_SIZE, search_records
+from backend.exports import (
+    iter_export_csv, count_export_rows, iter_vehicle_export_ndjson, iter_vehicle_records, VEHICLE_EXPORT_SECTIONS
+)
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timezone, timedelta
 from dateutil.relativedelta import relativedelta
 import json
 import os
+import shutil
 import uuid
-import csv
-import io
 from datetime import datetime
 
 routes = Blueprint('routes', __name__)
+routes.after_request(compress_response)
 
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads')
 UPLOAD_FOLDER = os.path.normpath(UPLOAD_FOLDER)
@@ -30,9 +55,9 @@ def secure_filename_with_ext(filename):
     return f"{uuid.uuid4().hex}.{ext}" if ext else f"{uuid.uuid4().hex}"
 
 def get_setting_value(key, default=False):
-    setting = Setting.query.filter_by(key=key).first()
-    if setting and setting.value:
-        return setting.value.lower() == 'true'
+    value = get_settings_cache().raw(key)
+    if value:
+        return value.lower() == 'true'
     return default
 
 def validate_filename(filename):
@@ -57,14 +82,16 @@ SERVICE_INTERVALS = {
     'fuel_filter': {'miles': 30000, 'months': 24}
 }
 
+MAX_FLEET_TIMELINE_VEHICLES = 500
+
 def get_service_intervals():
-    setting = Setting.query.filter_by(key='service_intervals').first()
-    if setting and setting.value:
-        try:
-            return json.loads(setting.value)
-        except (json.JSONDecodeError, TypeError):
-            pass
-    return SERVICE_INTERVALS
+    try:
+        intervals = get_settings_cache().get('service_intervals')
+        if isinstance(intervals, str):
+            intervals = json.loads(intervals)
+    except (ValueError, TypeError):
+        intervals = None
+    return intervals or SERVICE_INTERVALS
 
 
 def calculate_service_status(next_due_date, next_due_mileage, current_mileage):
@@ -83,8 +110,41 @@ def calculate_service_status(next_due_date, next_due_mileage, current_mileage):
     return 'ok'
 
 
-def calculate_maintenance_timeline(vehicle_id, current_mileage):
-    service_intervals = get_service_intervals()
+def get_last_services(vehicle_ids, service_types):
+    """Return the latest maintenance record per (vehicle, service type) in one query.
+    
+    Maps ``(vehicle_id, service_type)`` to ``(date, mileage)``.
+    """
+    vehicle_ids = list(vehicle_ids)
+    service_types = list(service_types)
+    if not vehicle_ids or not service_types:
+        return {}
+    ranked = db.select(
+        Maintenance.vehicle_id, Maintenance.category, Maintenance.date, Maintenance.mileage,
+        db.func.row_number().over(
+            partition_by=(Maintenance.vehicle_id, Maintenance.category),
+            order_by=(Maintenance.date.desc(), Maintenance.id.desc())
+        ).label('rank')
+    ).where(
+        Maintenance.vehicle_id.in_(vehicle_ids),
+        Maintenance.category.in_(service_types)
+    ).subquery()
+    rows = db.session.execute(
+        db.select(ranked.c.vehicle_id, ranked.c.category, ranked.c.date, ranked.c.mileage)
+        .where(ranked.c.rank == 1)
+    )
+    return {(row.vehicle_id, row.category): (row.date, row.mileage) for row in rows}
+
+
+def calculate_maintenance_timeline(vehicle_id, current_mileage, service_intervals=None, last_services=None):
+    if service_intervals is None:
+        service_intervals = get_service_intervals()
+    if last_services is None:
+        last_services = get_last_services([vehicle_id], service_intervals.keys())
+    vehicle_services = {
+        service_type: last for (owner_id, service_type), last in last_services.items()
+        if str(owner_id) == str(vehicle_id)
+    }
     timeline = []
     today = datetime.now(timezone.utc).date()
     
@@ -92,13 +152,10 @@ def calculate_maintenance_timeline(vehicle_id, current_mileage):
         interval_months = intervals.get('months', 0)
         interval_miles = intervals.get('miles', 0)
         
-        rec = Maintenance.query.filter_by(
-            vehicle_id=vehicle_id, 
-            category=service_type
-        ).order_by(Maintenance.date.desc()).first()
+        last_date, last_mileage = vehicle_services.get(service_type, (None, None))
         
-        last_service_date = rec.date if rec and rec.date else None
-        last_service_mileage = rec.mileage if rec and rec.mileage else None
+        last_service_date = last_date or None
+        last_service_mileage = last_mileage or None
         
         next_due_date = None
         if last_service_date and interval_months:
@@ -147,6 +204,14 @@ def validate_required(data, required_fields):
         return f"Missing required fields: {', '.join(missing)}"
     return None
 
+def missing_parent(data):
+    """Return a 404 if ``data`` names a vehicle or maintenance record that doesn't exist."""
+    if data.get('vehicle_id') is not None and not db.session.get(Vehicle, data['vehicle_id']):
+        return jsonify({'error': 'Vehicle not found'}), 404
+    if data.get('maintenance_id') is not None and not db.session.get(Maintenance, data['maintenance_id']):
+        return jsonify({'error': 'Maintenance record not found'}), 404
+    return None
+
 def validate_positive_integer(value, field_name):
     if value is None:
         return None
@@ -180,17 +245,79 @@ def validate_id(value, field_name='ID'):
     except (ValueError, TypeError):
         return f"{field_name} must be a valid integer"
 
+VEHICLE_FIELDS = ('id', 'name', 'reg', 'vin', 'year', 'make', 'model', 'engine', 'transmission', 'mileage')
+MAINTENANCE_FIELDS = (
+    'id', 'vehicle_id', 'date', 'mileage', 'category', 'description',
+    'parts_used', 'labor_hours', 'cost', 'shop_name', 'notes'
+)
+MOD_FIELDS = ('id', 'vehicle_id', 'date', 'mileage', 'category', 'description', 'parts', 'cost', 'status', 'notes')
+COST_FIELDS = ('id', 'vehicle_id', 'date', 'category', 'amount', 'description')
+NOTE_FIELDS = ('id', 'vehicle_id', 'date', 'title', 'content', 'tags')
+VCDS_FAULT_FIELDS = (
+    'id', 'vehicle_id', 'address', 'component', 'fault_code', 'description', 'status',
+    'detected_date', 'cleared_date', 'notes'
+)
+FUEL_ENTRY_FIELDS = (
+    'id', 'vehicle_id', 'date', 'mileage', 'gallons', 'price_per_gallon', 'total_cost', 'station', 'notes'
+)
+RECEIPT_FIELDS = (
+    'id', 'vehicle_id', 'maintenance_id', 'date', 'vendor', 'amount', 'category', 'notes',
+    'filename', 'uploaded_at'
+)
+DOCUMENT_FIELDS = (
+    'id', 'vehicle_id', 'maintenance_id', 'title', 'description', 'document_type', 'filename', 'uploaded_at'
+)
+
+def serialize_fields(row, fields):
+    """Serialize the named attributes of an ORM object or result row, dates as ISO strings."""
+    result = {}
+    for name in fields:
+        value = getattr(row, name)
+        result[name] = value.isoformat() if hasattr(value, 'isoformat') else value
+    return result
+
 def serialize_vehicle(v):
-    return {
-        'id': v.id, 'name': v.name, 'reg': v.reg, 'vin': v.vin, 'year': v.year,
-        'make': v.make, 'model': v.model, 'engine': v.engine, 
-        'transmission': v.transmission, 'mileage': v.mileage
-    }
+    return serialize_fields(v, VEHICLE_FIELDS)
+
+def parse_fields(fields_arg, allowed):
+    """Parse a ``fields=a,b`` argument into a tuple, raising ValueError for unknown names."""
+    fields = tuple(dict.fromkeys(f.strip() for f in fields_arg.split(',') if f.strip()))
+    if not fields:
+        raise ValueError('fields must name at least one field')
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+def list_response(query, model, fields, sort_column=None, enrich=None):
+    """Serialize a list query, or one keyset page of it when limit/cursor is given.
+    
+    Paged responses are ``{'items': [...], 'next_cursor': ...}``. With
+    ``fields=`` only the named columns are selected, so unrequested text
+    columns are never read and no ORM objects are built. ``enrich`` is
+    called with the serialized items of the response.
+    """
+    enrich = enrich or (lambda items: items)
+    try:
+        if request.args.get('fields') is not None:
+            fields = parse_fields(request.args['fields'], fields)
+            selected = dict.fromkeys(fields)
+            selected['id'] = None
+            if sort_column is not None:
+                selected[sort_column.key] = None
+            query = query.with_entities(*[getattr(model, name) for name in selected])
+        page = page_args(request.args)
+        if page is None:
+            return jsonify(enrich([serialize_fields(row, fields) for row in query.all()]))
+        rows, next_cursor = paginate_query(query, model.id, *page, sort_column=sort_column)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'items': enrich([serialize_fields(row, fields) for row in rows]), 'next_cursor': next_cursor})
 
 @routes.route('/vehicles', methods=['GET'])
+@conditional_get('vehicles')
 def get_vehicles():
-    vehicles = Vehicle.query.all()
-    return jsonify([serialize_vehicle(v) for v in vehicles])
+    return list_response(Vehicle.query, Vehicle, VEHICLE_FIELDS)
 
 @routes.route('/vehicles', methods=['POST'])
 def add_vehicle():
@@ -218,6 +345,7 @@ def add_vehicle():
     return jsonify({'id': vehicle.id}), 201
 
 @routes.route('/vehicles/<int:id>', methods=['GET'])
+@conditional_get('vehicles', vehicle_kwarg='id')
 def get_vehicle(id):
     vehicle = db.session.get(Vehicle, id)
     if not vehicle:
@@ -259,92 +387,64 @@ def delete_vehicle(id):
 
 @routes.route('/vehicles/<int:id>/export', methods=['GET'])
 def export_vehicle(id):
+    """Export a vehicle and its records as one JSON document, or as NDJSON with ``format=ndjson``."""
     vehicle = db.session.get(Vehicle, id)
     if not vehicle:
         return jsonify({'error': 'Vehicle not found'}), 404
     
-    maintenance = Maintenance.query.filter_by(vehicle_id=id).all()
-    mods = Mod.query.filter_by(vehicle_id=id).all()
-    costs = Cost.query.filter_by(vehicle_id=id).all()
-    notes = Note.query.filter_by(vehicle_id=id).all()
-    faults = VCDSFault.query.filter_by(vehicle_id=id).all()
-    fuel_entries = FuelEntry.query.filter_by(vehicle_id=id).all()
-    reminders = Reminder.query.filter_by(vehicle_id=id).all()
+    export_format = request.args.get('format', 'json')
+    if export_format == 'ndjson':
+        return Response(
+            stream_with_context(iter_vehicle_export_ndjson(id)),
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': f'attachment; filename=vehicle_{id}_export.ndjson'}
+        )
+    if export_format != 'json':
+        return jsonify({'error': 'format must be json or ndjson'}), 400
     
-    return jsonify({
-        'vehicle': serialize_vehicle(vehicle),
-        'maintenance': [{'date': m.date.isoformat() if m.date else None, 'mileage': m.mileage, 'category': m.category, 'description': m.description, 'cost': m.cost, 'notes': m.notes} for m in maintenance],
-        'mods': [{'date': m.date.isoformat() if m.date else None, 'mileage': m.mileage, 'category': m.category, 'description': m.description, 'cost': m.cost, 'status': m.status, 'notes': m.notes} for m in mods],
-        'costs': [{'date': c.date.isoformat() if c.date else None, 'category': c.category, 'amount': c.amount, 'description': c.description} for c in costs],
-        'notes': [{'date': n.date.isoformat() if n.date else None, 'title': n.title, 'content': n.content, 'tags': n.tags} for n in notes],
-        'vcds_faults': [{'address': f.address, 'fault_code': f.fault_code, 'component': f.component, 'status': f.status, 'detected_date': f.detected_date.isoformat() if f.detected_date else None, 'notes': f.notes} for f in faults],
-        'fuel_entries': [{'date': f.date.isoformat() if f.date else None, 'mileage': f.mileage, 'gallons': f.gallons, 'price_per_gallon': f.price_per_gallon, 'total_cost': f.total_cost} for f in fuel_entries],
-        'reminders': [{'type': r.type, 'interval_miles': r.interval_miles, 'interval_months': r.interval_months, 'next_due_date': r.next_due_date.isoformat() if r.next_due_date else None, 'next_due_mileage': r.next_due_mileage} for r in reminders]
-    })
+    result = {section: [] for section, _, _ in VEHICLE_EXPORT_SECTIONS}
+    for record_type, record in iter_vehicle_records(id):
+        if record_type == 'vehicle':
+            result['vehicle'] = record
+        else:
+            result[record_type].append(record)
+    return jsonify(result)
+
+def import_chunk_size():
+    chunk_size = request.args.get('chunk_size', current_app.config.get('IMPORT_CHUNK_SIZE', IMPORT_CHUNK_SIZE))
+    try:
+        chunk_size = int(chunk_size)
+    except (TypeError, ValueError):
+        raise ValueError('chunk_size must be an integer')
+    if not 1 <= chunk_size <= MAX_IMPORT_CHUNK_SIZE:
+        raise ValueError(f'chunk_size must be between 1 and {MAX_IMPORT_CHUNK_SIZE}')
+    return chunk_size
 
 @routes.route('/vehicles/import', methods=['POST'])
 def import_vehicle():
-    data = request.json or {}
-    error = validate_required(data, [])
-    if error:
-        return jsonify({'error': error}), 400
-    
-    vehicle = Vehicle(
-        name=data.get('name'), reg=data.get('reg'), vin=data.get('vin'), year=data.get('year'),
-        make=data.get('make'), model=data.get('model'),
-        engine=data.get('engine'), transmission=data.get('transmission'),
-        mileage=data.get('mileage', 0)
-    )
-    db.session.add(vehicle)
-    db.session.commit()
-    vehicle_id = vehicle.id
-    
-    for m in data.get('maintenance', []):
-        rec = Maintenance(
-            vehicle_id=vehicle_id, date=parse_date(m.get('date')),
-            mileage=m.get('mileage'), category=m.get('category'), description=m.get('description'),
-            cost=m.get('cost'), notes=m.get('notes')
-        )
-        db.session.add(rec)
-    
-    for m in data.get('mods', []):
-        mod = Mod(
-            vehicle_id=vehicle_id, date=parse_date(m.get('date')),
-            mileage=m.get('mileage'), category=m.get('category'), description=m.get('description'),
-            cost=m.get('cost'), status=m.get('status', 'completed'), notes=m.get('notes')
-        )
-        db.session.add(mod)
-    
-    for c in data.get('costs', []):
-        cost = Cost(
-            vehicle_id=vehicle_id, date=parse_date(c.get('date')),
-            category=c.get('category'), amount=c.get('amount'), description=c.get('description')
-        )
-        db.session.add(cost)
-    
-    for n in data.get('notes', []):
-        note = Note(
-            vehicle_id=vehicle_id, date=parse_date(n.get('date')),
-            title=n.get('title'), content=n.get('content'), tags=n.get('tags')
-        )
-        db.session.add(note)
-    
-    db.session.commit()
-    return jsonify({'id': vehicle_id}), 201
+    if wants_async():
+        return enqueue_job_response('import')
+    try:
+        chunk_size = import_chunk_size()
+        if request.mimetype == 'application/x-ndjson':
+            records = iter_ndjson_records(request.stream)
+        else:
+            records = iter_document_records(request.get_json(silent=True) or {})
+        vehicle_id, report = import_vehicle_records(records, chunk_size)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'id': vehicle_id, 'imported': report}), 201
 
 @routes.route('/maintenance', methods=['GET'])
+@conditional_get('maintenance')
 def get_maintenance():
     vehicle_id = request.args.get('vehicle_id')
     query = Maintenance.query
     if vehicle_id:
         query = query.filter_by(vehicle_id=vehicle_id)
-    records = query.order_by(Maintenance.date.desc()).all()
-    return jsonify([{
-        'id': m.id, 'vehicle_id': m.vehicle_id, 'date': m.date.isoformat() if m.date else None,
-        'mileage': m.mileage, 'category': m.category, 'description': m.description,
-        'parts_used': m.parts_used, 'labor_hours': m.labor_hours, 'cost': m.cost,
-        'shop_name': m.shop_name, 'notes': m.notes
-    } for m in records])
+    return list_response(
+        query.order_by(Maintenance.date.desc()), Maintenance, MAINTENANCE_FIELDS, sort_column=Maintenance.date
+    )
 
 @routes.route('/maintenance', methods=['POST'])
 def add_maintenance():
@@ -352,6 +452,9 @@ def add_maintenance():
     error = validate_required(data, ['vehicle_id', 'date'])
     if error:
         return jsonify({'error': error}), 400
+    missing = missing_parent(data)
+    if missing:
+        return missing
     
     record = Maintenance(
         vehicle_id=data.get('vehicle_id'), date=parse_date(data.get('date')),
@@ -394,6 +497,10 @@ def delete_maintenance(id):
 
 @routes.route('/maintenance/timeline', methods=['GET'])
 def get_maintenance_timeline():
+    vehicle_ids_arg = request.args.get('vehicle_ids')
+    if vehicle_ids_arg:
+        return get_fleet_timeline(vehicle_ids_arg)
+    
     vehicle_id = request.args.get('vehicle_id')
     if not vehicle_id:
         return jsonify({'error': 'vehicle_id required'}), 400
@@ -413,18 +520,44 @@ def get_maintenance_timeline():
     return jsonify(timeline)
 
 
+def get_fleet_timeline(vehicle_ids_arg):
+    """Timelines for several vehicles, sharing one last-service query."""
+    try:
+        vehicle_ids = sorted({int(v) for v in vehicle_ids_arg.split(',') if v.strip()})
+    except ValueError:
+        return jsonify({'error': 'Invalid vehicle_ids'}), 400
+    if not vehicle_ids:
+        return jsonify({'error': 'vehicle_ids required'}), 400
+    if len(vehicle_ids) > MAX_FLEET_TIMELINE_VEHICLES:
+        return jsonify({'error': f'At most {MAX_FLEET_TIMELINE_VEHICLES} vehicle_ids per request'}), 400
+    
+    vehicles = Vehicle.query.filter(Vehicle.id.in_(vehicle_ids)).all()
+    service_intervals = get_service_intervals()
+    last_services = get_last_services([v.id for v in vehicles], service_intervals.keys())
+    
+    timelines = {}
+    for vehicle in vehicles:
+        timelines[str(vehicle.id)] = calculate_maintenance_timeline(
+            vehicle.id, vehicle.mileage or 0, service_intervals, last_services
+        )
+    found = {v.id for v in vehicles}
+    
+    return jsonify({
+        'timelines': timelines,
+        'not_found': [v for v in vehicle_ids if v not in found]
+    })
+
+
 @routes.route('/mods', methods=['GET'])
+@conditional_get('mods')
 def get_mods():
     vehicle_id = request.args.get('vehicle_id')
     query = Mod.query
     if vehicle_id:
         query = query.filter_by(vehicle_id=vehicle_id)
-    mods = query.order_by(Mod.date.desc()).all()
-    return jsonify([{
-        'id': m.id, 'vehicle_id': m.vehicle_id, 'date': m.date.isoformat() if m.date else None,
-        'mileage': m.mileage, 'category': m.category, 'description': m.description,
-        'parts': m.parts, 'cost': m.cost, 'status': m.status, 'notes': m.notes
-    } for m in mods])
+    return list_response(
+        query.order_by(Mod.date.desc()), Mod, MOD_FIELDS, sort_column=Mod.date
+    )
 
 @routes.route('/mods', methods=['POST'])
 def add_mod():
@@ -432,6 +565,9 @@ def add_mod():
     error = validate_required(data, ['vehicle_id'])
     if error:
         return jsonify({'error': error}), 400
+    missing = missing_parent(data)
+    if missing:
+        return missing
     
     mod = Mod(
         vehicle_id=data.get('vehicle_id'), date=parse_date(data.get('date')),
@@ -471,16 +607,15 @@ def delete_mod(id):
     return jsonify({'success': True})
 
 @routes.route('/costs', methods=['GET'])
+@conditional_get('costs')
 def get_costs():
     vehicle_id = request.args.get('vehicle_id')
     query = Cost.query
     if vehicle_id:
         query = query.filter_by(vehicle_id=vehicle_id)
-    costs = query.order_by(Cost.date.desc()).all()
-    return jsonify([{
-        'id': c.id, 'vehicle_id': c.vehicle_id, 'date': c.date.isoformat() if c.date else None,
-        'category': c.category, 'amount': c.amount, 'description': c.description
-    } for c in costs])
+    return list_response(
+        query.order_by(Cost.date.desc()), Cost, COST_FIELDS, sort_column=Cost.date
+    )
 
 @routes.route('/costs', methods=['POST'])
 def add_cost():
@@ -488,6 +623,9 @@ def add_cost():
     error = validate_required(data, ['vehicle_id'])
     if error:
         return jsonify({'error': error}), 400
+    missing = missing_parent(data)
+    if missing:
+        return missing
     
     cost = Cost(
         vehicle_id=data.get('vehicle_id'), date=parse_date(data.get('date')),
@@ -511,16 +649,15 @@ def cost_summary():
     return jsonify(summary)
 
 @routes.route('/notes', methods=['GET'])
+@conditional_get('notes')
 def get_notes():
     vehicle_id = request.args.get('vehicle_id')
     query = Note.query
     if vehicle_id:
         query = query.filter_by(vehicle_id=vehicle_id)
-    notes = query.order_by(Note.date.desc()).all()
-    return jsonify([{
-        'id': n.id, 'vehicle_id': n.vehicle_id, 'date': n.date.isoformat() if n.date else None,
-        'title': n.title, 'content': n.content, 'tags': n.tags
-    } for n in notes])
+    return list_response(
+        query.order_by(Note.date.desc()), Note, NOTE_FIELDS, sort_column=Note.date
+    )
 
 @routes.route('/notes', methods=['POST'])
 def add_note():
@@ -528,6 +665,9 @@ def add_note():
     error = validate_required(data, ['vehicle_id'])
     if error:
         return jsonify({'error': error}), 400
+    missing = missing_parent(data)
+    if missing:
+        return missing
     
     note = Note(
         vehicle_id=data.get('vehicle_id'), date=parse_date(data.get('date')),
@@ -548,18 +688,16 @@ def delete_note(id):
     return jsonify({'success': True})
 
 @routes.route('/vcds', methods=['GET'])
+@conditional_get('vcds_faults')
 def get_vcds_faults():
     vehicle_id = request.args.get('vehicle_id')
     query = VCDSFault.query
     if vehicle_id:
         query = query.filter_by(vehicle_id=vehicle_id)
-    faults = query.order_by(VCDSFault.detected_date.desc()).all()
-    return jsonify([{
-        'id': f.id, 'vehicle_id': f.vehicle_id, 'address': f.address, 'component': f.component,
-        'fault_code': f.fault_code, 'description': f.description, 'status': f.status,
-        'detected_date': f.detected_date.isoformat() if f.detected_date else None,
-        'cleared_date': f.cleared_date.isoformat() if f.cleared_date else None, 'notes': f.notes
-    } for f in faults])
+    return list_response(
+        query.order_by(VCDSFault.detected_date.desc()), VCDSFault, VCDS_FAULT_FIELDS,
+        sort_column=VCDSFault.detected_date, enrich=enrich_faults
+    )
 
 @routes.route('/vcds', methods=['POST'])
 def add_vcds_fault():
@@ -567,6 +705,9 @@ def add_vcds_fault():
     error = validate_required(data, ['vehicle_id'])
     if error:
         return jsonify({'error': error}), 400
+    missing = missing_parent(data)
+    if missing:
+        return missing
     
     fault = VCDSFault(
         vehicle_id=data.get('vehicle_id'), address=data.get('address'), component=data.get('component'),
@@ -576,6 +717,12 @@ def add_vcds_fault():
         notes=data.get('notes')
     )
     db.session.add(fault)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return active_fault_conflict(fault)
+    learn_fault_codes(db.session.connection(), [data])
     db.session.commit()
     return jsonify({'id': fault.id}), 201
 
@@ -591,188 +738,183 @@ def update_vcds_fault(id):
             setattr(fault, key, data[key])
     if 'cleared_date' in data:
         fault.cleared_date = parse_date(data['cleared_date'])
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return active_fault_conflict(fault)
+    if {'address', 'fault_code', 'description'} & data.keys():
+        learn_fault_codes(db.session.connection(), [
+            {'address': fault.address, 'fault_code': fault.fault_code, 'description': fault.description}
+        ])
     db.session.commit()
     return jsonify({'success': True})
 
+def active_fault_conflict(fault):
+    """409 for a write that would make a second active row for the same fault."""
+    existing = VCDSFault.query.filter_by(
+        vehicle_id=fault.vehicle_id, address=fault.address, fault_code=fault.fault_code, status='active'
+    ).first()
+    return jsonify({
+        'error': 'This fault is already active for the vehicle',
+        'id': existing.id if existing else None
+    }), 409
+
 @routes.route('/vcds/import', methods=['POST'])
 def import_vcds():
-    vehicle_id = request.json.get('vehicle_id')
-    faults_data = request.json.get('faults', [])
+    data = request.json or {}
+    vehicle_id = data.get('vehicle_id')
+    faults_data = data.get('faults', [])
     if not vehicle_id:
         return jsonify({'error': 'vehicle_id required'}), 400
+    if not isinstance(faults_data, list):
+        return jsonify({'error': 'faults must be a list'}), 400
+    if not db.session.get(Vehicle, vehicle_id):
+        return jsonify({'error': 'Vehicle not found'}), 404
     
-    imported = 0
-    for f in faults_data:
-        fault = VCDSFault(
-            vehicle_id=vehicle_id, address=f.get('address'), component=f.get('component'),
-            fault_code=f.get('fault_code'), description=f.get('description'),
-            status='active', detected_date=datetime.now(timezone.utc).date()
-        )
-        db.session.add(fault)
-        imported += 1
-    db.session.commit()
-    return jsonify({'imported': imported})
+    result = import_vcds_faults(vehicle_id, faults_data, clear_missing=bool(data.get('clear_missing')))
+    return jsonify({'imported': result['inserted'] + result['updated'], **result})
 
 @routes.route('/vcds/parse', methods=['POST'])
 def parse_vcds():
-    import re
+    if request.mimetype == 'multipart/form-data':
+        return parse_vcds_upload()
     
     content = request.json.get('content', '')
-    faults = []
-    
-    address_pattern = re.compile(r'^Address\s+(\d+):\s*(.+)$', re.MULTILINE | re.IGNORECASE)
-    fault_code_pattern = re.compile(r'^(\d{5})\s*-\s*(.+?)$', re.MULTILINE)
-    description_pattern = re.compile(r'^\s*(\d+)\s*-\s*(.+)$', re.MULTILINE)
-    no_fault_pattern = re.compile(r'No fault code found', re.IGNORECASE)
-    cannot_reach_pattern = re.compile(r'Cannot be reached', re.IGNORECASE)
+    parser = VCDSParser()
+    faults = enrich_faults(list(parser.parse(content)))
     
-    blocks = re.split(r'(?=^Address\s+\d+:)', content, flags=re.MULTILINE)
+    if len(faults) == 0 and parser.has_content:
+        return jsonify(no_faults_payload())
     
-    has_address_block = False
-    for block in blocks:
-        block = block.strip()
-        if not block:
-            continue
-        if address_pattern.match(block):
-            has_address_block = True
-            break
+    return jsonify(faults)
+
+def parse_vcds_upload():
+    """Stream a scan file through the parser without buffering the upload."""
+    output_format = request.args.get('format', 'json')
+    if output_format not in ('json', 'ndjson'):
+        return jsonify({'error': 'format must be json or ndjson'}), 400
+    boundary = request.mimetype_params.get('boundary')
+    if not boundary:
+        return jsonify({'error': 'Multipart boundary missing'}), 400
+    try:
+        lines = iter_upload_lines(request.stream, boundary)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if not has_address_block:
-        simple_address_pattern = re.compile(r'^(\d+)\s+(.+)$', re.MULTILINE)
-        simple_fault_pattern = re.compile(r'^(\d{5})\s+(.+)$', re.MULTILINE)
-        
-        lines = content.strip().split('\n')
-        address = ''
-        module = ''
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            addr_match = simple_address_pattern.match(line)
-            if addr_match and not simple_fault_pattern.match(line):
-                address = addr_match.group(1)
-                module = addr_match.group(2).strip()
-                continue
-            
-            fault_match = simple_fault_pattern.match(line)
-            if fault_match and address:
-                fault_code = fault_match.group(1)
-                faults.append({
-                    'address': address,
-                    'module': module,
-                    'fault_code': fault_code,
-                    'description': fault_match.group(2).strip(),
-                    'status': 'Fault',
-                    'confidence': 'high' if len(fault_code) == 5 else 'medium'
-                })
-        
-        if len(faults) == 0 and content.strip():
-            return jsonify({
-                'error': True,
-                'message': 'No faults could be parsed from the input',
-                'suggestions': [
-                    'Ensure each fault code is on its own line',
-                    'Format: "ADDRESS Module Name" followed by "CODE Description"',
-                    'Example: "08 Auto HVAC" then "00819 High Pressure Sensor"',
-                    'Use 5-digit fault codes (e.g., 00819, 03582)'
-                ]
-            })
-        
-        return jsonify(faults)
+    if output_format == 'ndjson':
+        return Response(
+            stream_with_context(iter_faults_ndjson(lines, enrich_faults)), mimetype='application/x-ndjson'
+        )
+    return Response(stream_with_context(iter_faults_json(lines, enrich_faults)), mimetype='application/json')
+
+@routes.route('/vcds/scans', methods=['POST'])
+def add_vcds_scan():
+    """Store a raw scan (JSON ``content`` or a multipart ``file``), optionally importing its faults."""
+    if request.mimetype == 'multipart/form-data':
+        data = request.args
+        boundary = request.mimetype_params.get('boundary')
+        if not boundary:
+            return jsonify({'error': 'Multipart boundary missing'}), 400
+        try:
+            source = iter_upload_lines(request.stream, boundary)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        data = request.get_json(silent=True) or {}
+        source = data.get('content')
+        if not isinstance(source, str):
+            return jsonify({'error': 'content required'}), 400
     
-    for block in blocks:
-        block = block.strip()
-        if not block:
-            continue
-        
-        addr_match = address_pattern.match(block)
-        if not addr_match:
-            continue
-        
-        address = addr_match.group(1)
-        module_name = re.sub(r'\s+Labels?[:\.].*$', '', addr_match.group(2)).strip()
-        
-        block_lines = block.split('\n')
-        body = '\n'.join(block_lines[1:]).strip()
-        
-        if cannot_reach_pattern.search(body):
-            faults.append({
-                'address': address,
-                'module': module_name,
-                'fault_code': '',
-                'description': '',
-                'status': 'Unreachable'
-            })
-        elif no_fault_pattern.search(body):
-            faults.append({
-                'address': address,
-                'module': module_name,
-                'fault_code': '',
-                'description': '',
-                'status': 'OK'
-            })
-        else:
-            fault_matches = fault_code_pattern.findall(body)
-            if fault_matches:
-                for fault_code, fault_desc in fault_matches:
-                    desc_lines = []
-                    for line in body.split('\n'):
-                        if fault_code in line:
-                            continue
-                        if fault_desc.lower() in line.lower():
-                            parts = line.strip().split(None, 1)
-                            if len(parts) > 1:
-                                desc_lines.append(parts[1])
-                    
-                    description = fault_desc
-                    if not desc_lines:
-                        desc_match = description_pattern.search(body)
-                        if desc_match:
-                            description = desc_match.group(2).strip()
-                    
-                    faults.append({
-                        'address': address,
-                        'module': module_name,
-                        'fault_code': fault_code,
-                        'description': description,
-                        'status': 'Fault',
-                        'confidence': 'high' if len(fault_code) == 5 else 'medium'
-                    })
-            else:
-                faults.append({
-                    'address': address,
-                    'module': module_name,
-                    'fault_code': '',
-                    'description': '',
-                    'status': 'Unknown'
-                })
-    
-    if len(faults) == 0 and content.strip():
-        import re
-        lines = content.strip().split('\n')
-        has_numbers = bool(re.search(r'\d{4,}', content))
-        has_addresses = bool(re.search(r'\b\d{2}\b', content))
-        
-        return jsonify({
-            'error': True,
-            'message': 'No faults could be parsed from the input',
-            'suggestions': [
-                'Ensure each fault code is on its own line',
-                'Format: "ADDRESS Module Name" followed by "CODE Description"',
-                'Example: "08 Auto HVAC" then "00819 High Pressure Sensor"',
-                'Or use "Address XX: Module" format'
-            ],
-            'debug': {
-                'has_5_digit_codes': has_numbers,
-                'has_addresses': has_addresses,
-                'line_count': len(lines),
-                'sample_lines': lines[:5]
-            }
-        })
+    try:
+        vehicle_id = int(data.get('vehicle_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'vehicle_id required'}), 400
+    if not db.session.get(Vehicle, vehicle_id):
+        return jsonify({'error': 'Vehicle not found'}), 404
     
-    return jsonify(faults)
+    try:
+        scan, faults, created = store_scan(vehicle_id, source)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result = {**serialize_scan(scan), 'duplicate': not created}
+    if str(data.get('import', '')).lower() in ('1', 'true', 'yes'):
+        result['imported'] = import_vcds_faults(vehicle_id, faults, clear_missing=True)
+    return jsonify(result), 201 if created else 200
+
+@routes.route('/vcds/scans', methods=['GET'])
+@conditional_get('vcds_scans')
+def get_vcds_scans():
+    vehicle_id = request.args.get('vehicle_id')
+    query = VCDSScan.query
+    if vehicle_id is not None:
+        try:
+            vehicle_id = int(vehicle_id)
+        except ValueError:
+            return jsonify({'error': 'Invalid vehicle_id'}), 400
+        query = query.filter_by(vehicle_id=vehicle_id)
+    return list_response(
+        query.order_by(VCDSScan.created_at.desc(), VCDSScan.id.desc()), VCDSScan, SCAN_FIELDS,
+        sort_column=VCDSScan.created_at
+    )
+
+@routes.route('/vcds/scans/<int:id>', methods=['GET'])
+def get_vcds_scan(id):
+    scan = db.session.get(VCDSScan, id)
+    if not scan:
+        return jsonify({'error': 'Scan not found'}), 404
+    return jsonify(serialize_scan(scan, include_modules=True))
+
+@routes.route('/vcds/scans/<int:id>/raw', methods=['GET'])
+def get_vcds_scan_raw(id):
+    scan = db.session.get(VCDSScan, id)
+    if not scan:
+        return jsonify({'error': 'Scan not found'}), 404
+    return Response(iter_scan_text(scan.raw), mimetype='text/plain')
+
+@routes.route('/vcds/scans/<int:id>', methods=['DELETE'])
+def delete_vcds_scan(id):
+    scan = db.session.get(VCDSScan, id)
+    if not scan:
+        return jsonify({'error': 'Scan not found'}), 404
+    db.session.delete(scan)
+    db.session.commit()
+    return jsonify({'success': True})
+
+@routes.route('/vcds/scans/<int:a>/diff/<int:b>', methods=['GET'])
+def diff_vcds_scans(a, b):
+    """What changed between two scans of the same vehicle, per module."""
+    old, new = db.session.get(VCDSScan, a), db.session.get(VCDSScan, b)
+    if not old or not new:
+        return jsonify({'error': 'Scan not found'}), 404
+    if old.vehicle_id != new.vehicle_id:
+        return jsonify({'error': 'Scans belong to different vehicles'}), 400
+    return jsonify(diff_scans(old, new))
+
+@routes.route('/search', methods=['GET'])
+def search():
+    """Ranked full-text search across notes, maintenance, mods, guides and documents."""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    vehicle_id = request.args.get('vehicle_id')
+    if vehicle_id is not None:
+        try:
+            vehicle_id = int(vehicle_id)
+        except ValueError:
+            return jsonify({'error': 'Invalid vehicle_id'}), 400
+    entities = None
+    if request.args.get('type'):
+        entities = [name.strip() for name in request.args['type'].split(',') if name.strip()]
+        unknown = [name for name in entities if name not in SEARCH_SOURCES]
+        if unknown:
+            return jsonify({'error': f"Unknown type: {', '.join(unknown)}"}), 400
+    try:
+        limit, cursor = page_args(request.args) or (DEFAULT_SEARCH_PAGE_SIZE, None)
+        items, next_cursor = search_records(query, vehicle_id, entities, limit, cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'items': items, 'next_cursor': next_cursor})
 
 @routes.route('/dashboard', methods=['GET'])
 def dashboard():
@@ -785,22 +927,11 @@ def dashboard():
     include_costs = get_setting_value('total_spend_include_costs', True)
     include_fuel = get_setting_value('total_spend_include_fuel', False)
     
-    total_maintenance = 0
-    total_mods = 0
-    total_costs = 0
-    total_fuel = 0
-    
-    if include_maintenance:
-        total_maintenance = db.session.query(db.func.sum(Maintenance.cost)).filter(Maintenance.vehicle_id == vehicle_id).scalar() or 0
-    if include_mods:
-        total_mods = db.session.query(db.func.sum(Mod.cost)).filter(
-            Mod.vehicle_id == vehicle_id,
-            Mod.status != 'planned'
-        ).scalar() or 0
-    if include_costs:
-        total_costs = db.session.query(db.func.sum(Cost.amount)).filter(Cost.vehicle_id == vehicle_id).scalar() or 0
-    if include_fuel:
-        total_fuel = db.session.query(db.func.sum(FuelEntry.cost)).filter(FuelEntry.vehicle_id == vehicle_id).scalar() or 0
+    totals = spend_totals(vehicle_id)
+    total_maintenance = totals.get('maintenance', 0) if include_maintenance else 0
+    total_mods = totals.get('mods', 0) if include_mods else 0
+    total_costs = totals.get('costs', 0) if include_costs else 0
+    total_fuel = totals.get('fuel', 0) if include_fuel else 0
     
     recent_maintenance = Maintenance.query.filter_by(vehicle_id=vehicle_id).order_by(Maintenance.date.desc()).limit(5).all()
     active_faults = VCDSFault.query.filter_by(vehicle_id=vehicle_id, status='active').count()
@@ -832,95 +963,45 @@ def analytics():
     include_costs = get_setting_value('total_spend_include_costs', True)
     include_fuel = get_setting_value('total_spend_include_fuel', False)
     
-    maintenance = Maintenance.query.filter_by(vehicle_id=vehicle_id)
-    mods = Mod.query.filter_by(vehicle_id=vehicle_id).filter(Mod.status != 'planned')
-    costs = Cost.query.filter_by(vehicle_id=vehicle_id)
-    fuel_entries = FuelEntry.query.filter_by(vehicle_id=vehicle_id)
-    
-    if start_date:
-        start = parse_date(start_date)
-        if start:
-            maintenance = maintenance.filter(Maintenance.date >= start)
-            mods = mods.filter(Mod.date >= start)
-            costs = costs.filter(Cost.date >= start)
-            fuel_entries = fuel_entries.filter(FuelEntry.date >= start)
-    
-    if end_date:
-        end = parse_date(end_date)
-        if end:
-            maintenance = maintenance.filter(Maintenance.date <= end)
-            mods = mods.filter(Mod.date <= end)
-            costs = costs.filter(Cost.date <= end)
-            fuel_entries = fuel_entries.filter(FuelEntry.date <= end)
-    
-    maintenance = maintenance.order_by(Maintenance.date).all()
-    mods = mods.order_by(Mod.date).all()
-    costs = costs.order_by(Cost.date).all()
-    fuel_entries = fuel_entries.order_by(FuelEntry.date).all()
-    
     monthly_spending = {}
     category_spending = {}
     yearly_spending = {}
     
-    if include_maintenance:
-        for m in maintenance:
-            if category and m.category != category:
-                continue
-            if m.date and m.cost:
-                key = m.date.strftime('%Y-%m')
-                monthly_spending[key] = monthly_spending.get(key, 0) + m.cost
-                year = m.date.strftime('%Y')
-                yearly_spending[year] = yearly_spending.get(year, 0) + m.cost
-                cat = m.category or 'other'
-                category_spending[cat] = category_spending.get(cat, 0) + m.cost
-    
-    if include_costs:
-        for c in costs:
-            if category and c.category != category:
-                continue
-            if c.date and c.amount:
-                key = c.date.strftime('%Y-%m')
-                monthly_spending[key] = monthly_spending.get(key, 0) + c.amount
-                year = c.date.strftime('%Y')
-                yearly_spending[year] = yearly_spending.get(year, 0) + c.amount
-                cat = c.category or 'other'
-                category_spending[cat] = category_spending.get(cat, 0) + c.amount
-    
-    if include_mods:
-        for mod in mods:
-            if category and mod.category != category:
-                continue
-            if mod.date and mod.cost:
-                key = mod.date.strftime('%Y-%m')
-                monthly_spending[key] = monthly_spending.get(key, 0) + mod.cost
-                year = mod.date.strftime('%Y')
-                yearly_spending[year] = yearly_spending.get(year, 0) + mod.cost
-    
-    if include_fuel:
-        for f in fuel_entries:
-            if category and category != 'fuel':
-                continue
-            if f.date and f.cost:
-                key = f.date.strftime('%Y-%m')
-                monthly_spending[key] = monthly_spending.get(key, 0) + f.cost
-                year = f.date.strftime('%Y')
-                yearly_spending[year] = yearly_spending.get(year, 0) + f.cost
-                cat = 'fuel'
-                category_spending[cat] = category_spending.get(cat, 0) + f.cost
+    start = parse_date(start_date) if start_date else None
+    end = parse_date(end_date) if end_date else None
+    
+    sources = [source for source, included in (
+        ('maintenance', include_maintenance), ('costs', include_costs),
+        ('mods', include_mods), ('fuel', include_fuel)
+    ) if included]
+    if start or end:
+        buckets = spend_buckets_between(vehicle_id, sources, start, end, category)
+    else:
+        buckets = spend_buckets(vehicle_id, sources, category)
+    
+    for source, month, cat, amount in buckets:
+        if not amount:
+            continue
+        monthly_spending[month] = monthly_spending.get(month, 0) + amount
+        year = month[:4]
+        yearly_spending[year] = yearly_spending.get(year, 0) + amount
+        if source != 'mods':
+            cat = cat or 'other'
+            category_spending[cat] = category_spending.get(cat, 0) + amount
     
     total_spent = sum(monthly_spending.values())
     
-    last_service = {}
     service_intervals = get_service_intervals()
-    for cat in service_intervals:
-        rec = Maintenance.query.filter_by(vehicle_id=vehicle_id, category=cat).order_by(Maintenance.date.desc()).first()
-        if rec and rec.mileage:
-            last_service[cat] = {'date': rec.date.isoformat() if rec.date else None, 'mileage': rec.mileage}
+    last_services = get_last_services([vehicle_id], service_intervals.keys())
+    last_service = {}
+    for (_, cat), (last_date, last_mileage) in last_services.items():
+        if last_mileage:
+            last_service[cat] = {'date': last_date.isoformat() if last_date else None, 'mileage': last_mileage}
     
     vehicle = db.session.get(Vehicle, vehicle_id)
     current_mileage = vehicle.mileage if vehicle else 0
     
-    timeline = calculate_maintenance_timeline(vehicle_id, current_mileage)
+    timeline = calculate_maintenance_timeline(vehicle_id, current_mileage, service_intervals, last_services)
     
     return jsonify({
         'monthly_spending': monthly_spending,
@@ -957,6 +1038,9 @@ def add_guide():
     error = validate_required(data, ['title'])
     if error:
         return jsonify({'error': error}), 400
+    missing = missing_parent(data)
+    if missing:
+        return missing
     
     guide = Guide(
         vehicle_id=data.get('vehicle_id'), title=data.get('title'), category=data.get('category'),
@@ -974,6 +1058,9 @@ def update_guide(id):
         return jsonify({'error': 'Guide not found'}), 404
     
     data = request.json or {}
+    missing = missing_parent(data)
+    if missing:
+        return missing
     for key in ['vehicle_id', 'title', 'category', 'content', 'interval_miles', 'interval_months', 'is_template']:
         if key in data:
             setattr(guide, key, data[key])
@@ -1032,6 +1119,9 @@ def add_vehicle_photo():
     error = validate_required(data, ['vehicle_id', 'filename'])
     if error:
         return jsonify({'error': error}), 400
+    missing = missing_parent(data)
+    if missing:
+        return missing
     
     photo = VehiclePhoto(
         vehicle_id=data.get('vehicle_id'), filename=data.get('filename'),
@@ -1044,17 +1134,15 @@ def add_vehicle_photo():
     return jsonify({'id': photo.id}), 201
 
 @routes.route('/fuel', methods=['GET'])
+@conditional_get('fuel_entries')
 def get_fuel_entries():
     vehicle_id = request.args.get('vehicle_id')
     query = FuelEntry.query
     if vehicle_id:
         query = query.filter_by(vehicle_id=vehicle_id)
-    entries = query.order_by(FuelEntry.date.desc()).all()
-    return jsonify([{
-        'id': f.id, 'vehicle_id': f.vehicle_id, 'date': f.date.isoformat() if f.date else None,
-        'mileage': f.mileage, 'gallons': f.gallons, 'price_per_gallon': f.price_per_gallon,
-        'total_cost': f.total_cost, 'station': f.station, 'notes': f.notes
-    } for f in entries])
+    return list_response(
+        query.order_by(FuelEntry.date.desc()), FuelEntry, FUEL_ENTRY_FIELDS, sort_column=FuelEntry.date
+    )
 
 @routes.route('/fuel', methods=['POST'])
 def add_fuel_entry():
@@ -1062,6 +1150,9 @@ def add_fuel_entry():
     error = validate_required(data, ['vehicle_id'])
     if error:
         return jsonify({'error': error}), 400
+    missing = missing_parent(data)
+    if missing:
+        return missing
     
     entry = FuelEntry(
         vehicle_id=data.get('vehicle_id'), date=parse_date(data.get('date')),
@@ -1120,6 +1211,9 @@ def add_reminder():
     error = validate_required(data, ['vehicle_id', 'type'])
     if error:
         return jsonify({'error': error}), 400
+    missing = missing_parent(data)
+    if missing:
+        return missing
     
     reminder = Reminder(
         vehicle_id=data.get('vehicle_id'), type=data.get('type'),
@@ -1159,6 +1253,7 @@ def delete_reminder(id):
     return jsonify({'success': True})
 
 @routes.route('/receipts', methods=['GET'])
+@conditional_get('receipts')
 def get_receipts():
     vehicle_id = request.args.get('vehicle_id')
     maintenance_id = request.args.get('maintenance_id')
@@ -1167,13 +1262,9 @@ def get_receipts():
         query = query.filter_by(vehicle_id=vehicle_id)
     if maintenance_id:
         query = query.filter_by(maintenance_id=maintenance_id)
-    receipts = query.order_by(Receipt.date.desc()).all()
-    return jsonify([{
-        'id': r.id, 'vehicle_id': r.vehicle_id, 'maintenance_id': r.maintenance_id,
-        'date': r.date.isoformat() if r.date else None, 'vendor': r.vendor,
-        'amount': r.amount, 'category': r.category, 'notes': r.notes,
-        'filename': r.filename, 'uploaded_at': r.uploaded_at.isoformat() if r.uploaded_at else None
-    } for r in receipts])
+    return list_response(
+        query.order_by(Receipt.date.desc()), Receipt, RECEIPT_FIELDS, sort_column=Receipt.date
+    )
 
 @routes.route('/receipts', methods=['POST'])
 def add_receipt():
@@ -1181,6 +1272,9 @@ def add_receipt():
     error = validate_required(data, ['vehicle_id'])
     if error:
         return jsonify({'error': error}), 400
+    missing = missing_parent(data)
+    if missing:
+        return missing
     
     receipt = Receipt(
         vehicle_id=data.get('vehicle_id'), maintenance_id=data.get('maintenance_id'),
@@ -1199,6 +1293,9 @@ def update_receipt(id):
         return jsonify({'error': 'Receipt not found'}), 404
     
     data = request.json or {}
+    missing = missing_parent(data)
+    if missing:
+        return missing
     for key in ['vehicle_id', 'maintenance_id', 'vendor', 'amount', 'category', 'notes', 'filename']:
         if key in data:
             setattr(receipt, key, data[key])
@@ -1258,17 +1355,16 @@ def delete_upload(filename):
 
 # Service Document Routes
 @routes.route('/documents', methods=['GET'])
+@conditional_get('service_documents')
 def get_documents():
     vehicle_id = request.args.get('vehicle_id')
     query = ServiceDocument.query
     if vehicle_id:
         query = query.filter_by(vehicle_id=vehicle_id)
-    documents = query.order_by(ServiceDocument.uploaded_at.desc()).all()
-    return jsonify([{
-        'id': d.id, 'vehicle_id': d.vehicle_id, 'maintenance_id': d.maintenance_id,
-        'title': d.title, 'description': d.description, 'document_type': d.document_type,
-        'filename': d.filename, 'uploaded_at': d.uploaded_at.isoformat() if d.uploaded_at else None
-    } for d in documents])
+    return list_response(
+        query.order_by(ServiceDocument.uploaded_at.desc()), ServiceDocument, DOCUMENT_FIELDS,
+        sort_column=ServiceDocument.uploaded_at
+    )
 
 @routes.route('/documents', methods=['POST'])
 def upload_document():
@@ -1351,6 +1447,24 @@ def delete_document(id):
     db.session.commit()
     return jsonify({'success': True})
 
+# Admin Routes
+@routes.route('/admin/sqlite', methods=['GET'])
+def get_sqlite_settings():
+    """Report the configured SQLite PRAGMAs and the values in effect."""
+    if db.engine.dialect.name != 'sqlite':
+        return jsonify({'error': 'Database is not SQLite'}), 400
+    
+    configured = current_app.config.get('SQLITE_PRAGMAS', {})
+    effective = {}
+    for name in SQLITE_PRAGMA_DEFAULTS:
+        effective[name] = db.session.execute(db.text(f'PRAGMA {name}')).scalar()
+    
+    return jsonify({
+        'configured': configured,
+        'effective': effective,
+        'sqlite_version': db.session.execute(db.text('SELECT sqlite_version()')).scalar()
+    })
+
 # Auth Routes
 @routes.route('/auth/verify-pin', methods=['POST'])
 def verify_pin():
@@ -1396,24 +1510,15 @@ def set_pin():
         db.session.add(setting)
     
     db.session.commit()
+    invalidate_settings_cache()
     return jsonify({'success': True})
 
 # Settings Routes
 @routes.route('/settings', methods=['GET'])
+@conditional_get('settings')
 def get_settings():
     try:
-        settings = Setting.query.all()
-        result = {}
-        for s in settings:
-            if s.value_type == 'json':
-                result[s.key] = json.loads(s.value) if s.value else None
-            elif s.value_type == 'number':
-                result[s.key] = float(s.value) if s.value else None
-            elif s.value_type == 'boolean':
-                result[s.key] = s.value.lower() == 'true' if s.value else False
-            else:
-                result[s.key] = s.value
-        return jsonify(result)
+        return jsonify(get_settings_cache().all())
     except Exception as e:
         current_app.logger.error(f'Error loading settings: {e}')
         return jsonify({'error': 'Failed to load settings'}), 500
@@ -1450,6 +1555,7 @@ def update_setting():
         db.session.add(setting)
     
     db.session.commit()
+    invalidate_settings_cache()
     
     # Backup settings to JSON file
     backup_settings_to_file()
@@ -1481,6 +1587,7 @@ def update_setting_by_key(key):
             setting.value_type = value_type
     
     db.session.commit()
+    invalidate_settings_cache()
     backup_settings_to_file()
     return jsonify({'success': True})
 
@@ -1491,171 +1598,53 @@ def delete_setting(key):
         return jsonify({'error': 'Setting not found'}), 404
     db.session.delete(setting)
     db.session.commit()
+    invalidate_settings_cache()
     backup_settings_to_file()
     return jsonify({'success': True})
 
 @routes.route('/settings/export', methods=['GET'])
 def export_all_data():
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow(['MuttLogbook Export', datetime.now(timezone.utc).isoformat()])
-    writer.writerow([])
-    
-    # Vehicles
-    writer.writerow(['=== VEHICLES ==='])
-    writer.writerow(['id', 'name', 'reg', 'vin', 'year', 'make', 'model', 'engine', 'transmission', 'mileage'])
-    vehicles = Vehicle.query.all()
-    for v in vehicles:
-        writer.writerow([v.id, v.name, v.reg, v.vin, v.year, v.make, v.model, v.engine, v.transmission, v.mileage])
-    writer.writerow([])
-    
-    # Maintenance
-    writer.writerow(['=== MAINTENANCE ==='])
-    writer.writerow(['id', 'vehicle_id', 'date', 'mileage', 'category', 'description', 'parts_used', 'labor_hours', 'cost', 'shop_name', 'notes'])
-    maintenance = Maintenance.query.all()
-    for m in maintenance:
-        writer.writerow([m.id, m.vehicle_id, m.date, m.mileage, m.category, m.description, m.parts_used, m.labor_hours, m.cost, m.shop_name, m.notes])
-    writer.writerow([])
-    
-    # Mods
-    writer.writerow(['=== MODS ==='])
-    writer.writerow(['id', 'vehicle_id', 'date', 'mileage', 'category', 'description', 'parts', 'cost', 'status', 'notes'])
-    mods = Mod.query.all()
-    for m in mods:
-        writer.writerow([m.id, m.vehicle_id, m.date, m.mileage, m.category, m.description, m.parts, m.cost, m.status, m.notes])
-    writer.writerow([])
-    
-    # Costs
-    writer.writerow(['=== COSTS ==='])
-    writer.writerow(['id', 'vehicle_id', 'date', 'category', 'amount', 'description'])
-    costs = Cost.query.all()
-    for c in costs:
-        writer.writerow([c.id, c.vehicle_id, c.date, c.category, c.amount, c.description])
-    writer.writerow([])
-    
-    # Notes
-    writer.writerow(['=== NOTES ==='])
-    writer.writerow(['id', 'vehicle_id', 'date', 'title', 'content', 'tags'])
-    notes = Note.query.all()
-    for n in notes:
-        writer.writerow([n.id, n.vehicle_id, n.date, n.title, n.content, n.tags])
-    writer.writerow([])
-    
-    # Guides
-    writer.writerow(['=== GUIDES ==='])
-    writer.writerow(['id', 'vehicle_id', 'title', 'category', 'content', 'interval_miles', 'interval_months', 'is_template'])
-    guides = Guide.query.all()
-    for g in guides:
-        writer.writerow([g.id, g.vehicle_id, g.title, g.category, g.content, g.interval_miles, g.interval_months, g.is_template])
-    writer.writerow([])
-    
-    # Fuel Entries
-    writer.writerow(['=== FUEL ENTRIES ==='])
-    writer.writerow(['id', 'vehicle_id', 'date', 'mileage', 'gallons', 'price_per_gallon', 'total_cost', 'station', 'notes'])
-    fuel_entries = FuelEntry.query.all()
-    for f in fuel_entries:
-        writer.writerow([f.id, f.vehicle_id, f.date, f.mileage, f.gallons, f.price_per_gallon, f.total_cost, f.station, f.notes])
-    writer.writerow([])
-    
-    # VCDS Faults
-    writer.writerow(['=== VCDS FAULTS ==='])
-    writer.writerow(['id', 'vehicle_id', 'address', 'component', 'fault_code', 'description', 'status', 'detected_date', 'cleared_date', 'notes'])
-    faults = VCDSFault.query.all()
-    for f in faults:
-        writer.writerow([f.id, f.vehicle_id, f.address, f.component, f.fault_code, f.description, f.status, f.detected_date, f.cleared_date, f.notes])
-    writer.writerow([])
-    
-    # Reminders
-    writer.writerow(['=== REMINDERS ==='])
-    writer.writerow(['id', 'vehicle_id', 'type', 'interval_miles', 'interval_months', 'last_service_date', 'last_service_mileage', 'next_due_date', 'next_due_mileage', 'notes'])
-    reminders = Reminder.query.all()
-    for r in reminders:
-        writer.writerow([r.id, r.vehicle_id, r.type, r.interval_miles, r.interval_months, r.last_service_date, r.last_service_mileage, r.next_due_date, r.next_due_mileage, r.notes])
-    writer.writerow([])
-    
-    # Service Documents
-    writer.writerow(['=== SERVICE DOCUMENTS ==='])
-    writer.writerow(['id', 'vehicle_id', 'maintenance_id', 'title', 'description', 'document_type', 'filename', 'uploaded_at'])
-    service_docs = ServiceDocument.query.all()
-    for sd in service_docs:
-        writer.writerow([sd.id, sd.vehicle_id, sd.maintenance_id, sd.title, sd.description, sd.document_type, sd.filename, sd.uploaded_at])
-    writer.writerow([])
-    
-    # Receipts
-    writer.writerow(['=== RECEIPTS ==='])
-    writer.writerow(['id', 'vehicle_id', 'maintenance_id', 'date', 'vendor', 'amount', 'category', 'notes', 'filename', 'uploaded_at'])
-    receipts = Receipt.query.all()
-    for r in receipts:
-        writer.writerow([r.id, r.vehicle_id, r.maintenance_id, r.date, r.vendor, r.amount, r.category, r.notes, r.filename, r.uploaded_at])
-    writer.writerow([])
-    
-    # Settings
-    writer.writerow(['=== SETTINGS ==='])
-    writer.writerow(['key', 'value', 'value_type', 'description'])
-    settings = Setting.query.all()
-    for s in settings:
-        writer.writerow([s.key, s.value, s.value_type, s.description])
-    
-    output.seek(0)
-    return send_file(
-        io.BytesIO(output.getvalue().encode('utf-8')),
+    """Stream every table as one CSV file, written as rows are read."""
+    if wants_async():
+        return enqueue_job_response('export_csv')
+    return Response(
+        stream_with_context(iter_export_csv()),
         mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'muttlogbook_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        headers={'Content-Disposition': f'attachment; filename={export_filename()}'}
     )
 
+def export_filename():
+    return f'muttlogbook_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+
 @routes.route('/settings/backup', methods=['GET'])
 def backup_settings():
-    settings = Setting.query.all()
-    result = {}
-    for s in settings:
-        if s.value_type == 'json':
-            result[s.key] = json.loads(s.value) if s.value else None
-        elif s.value_type == 'number':
-            result[s.key] = float(s.value) if s.value else None
-        elif s.value_type == 'boolean':
-            result[s.key] = s.value.lower() == 'true' if s.value else False
-        else:
-            result[s.key] = s.value
-    
     backup = {
         'version': '1.1.0',
         'exported_at': datetime.now(timezone.utc).isoformat(),
-        'settings': result
+        'settings': get_settings_cache().all()
     }
     
     return jsonify(backup)
 
 def backup_settings_to_file():
+    """Queue the current settings for the background backup writer."""
     try:
-        settings = Setting.query.all()
-        result = {}
-        for s in settings:
-            if s.value_type == 'json':
-                result[s.key] = json.loads(s.value) if s.value else None
-            elif s.value_type == 'number':
-                result[s.key] = float(s.value) if s.value else None
-            elif s.value_type == 'boolean':
-                result[s.key] = s.value.lower() == 'true' if s.value else False
-            else:
-                result[s.key] = s.value
-        
         backup = {
             'version': '1.1.0',
             'exported_at': datetime.now(timezone.utc).isoformat(),
-            'settings': result
+            'settings': get_settings_cache().all()
         }
-        
-        backup_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'settings.json')
-        os.makedirs(os.path.dirname(backup_path), exist_ok=True)
-        
-        with open(backup_path, 'w') as f:
-            json.dump(backup, f, indent=2)
+        get_settings_backup_writer().schedule(backup)
     except Exception as e:
         print(f"Failed to backup settings: {e}")
 
 
+@routes.route('/settings/backup/status', methods=['GET'])
+def backup_settings_status():
+    """Report when the settings backup file was last written."""
+    return jsonify(get_settings_backup_writer().status())
+
+
 @routes.route('/settings/test-mode', methods=['PUT'])
 def update_test_mode():
     """Enable or disable test mode and manage test keys."""
@@ -1676,6 +1665,7 @@ def update_test_mode():
             )
             db.session.add(setting)
         db.session.commit()
+        invalidate_settings_cache()
     
     if include_data is not None:
         setting = Setting.query.filter_by(key='include_test_data').first()
@@ -1690,6 +1680,7 @@ def update_test_mode():
             )
             db.session.add(setting)
         db.session.commit()
+        invalidate_settings_cache()
     
     backup_settings_to_file()
     return jsonify({'success': True})
@@ -1701,8 +1692,7 @@ def get_test_mode():
     enabled = get_setting_value('test_mode_enabled', False)
     include_data = get_setting_value('include_test_data', False)
     
-    test_key_setting = Setting.query.filter_by(key='test_key').first()
-    test_key = test_key_setting.value if test_key_setting else None
+    test_key = get_settings_cache().raw('test_key')
     
     return jsonify({
         'enabled': enabled,
@@ -1730,6 +1720,7 @@ def generate_test_key():
         db.session.add(setting)
     
     db.session.commit()
+    invalidate_settings_cache()
     backup_settings_to_file()
     return jsonify({'test_key': new_key})
 
@@ -1756,9 +1747,8 @@ def get_test_data_count():
     return jsonify(counts)
 
 
-@routes.route('/settings/test-data', methods=['DELETE'])
-def clear_test_data():
-    """Delete all records marked as test data."""
+def purge_test_data():
+    """Delete all records marked as test data and return the counts."""
     from backend.models import Vehicle, Maintenance, Mod, Cost, Note, VCDSFault, FuelEntry, Reminder, Receipt, ServiceDocument
     
     deleted = {
@@ -1775,6 +1765,183 @@ def clear_test_data():
     }
     deleted['total'] = sum(deleted.values())
     
+    rebuild_spend_rollup(db.session.connection())
+    bump_change_versions(db.session.connection())
     db.session.commit()
-    
-    return jsonify({'deleted': deleted})
+    return deleted
+
+
+@routes.route('/settings/test-data', methods=['DELETE'])
+def clear_test_data():
+    """Delete all records marked as test data."""
+    if wants_async():
+        return enqueue_job_response('purge_test_data')
+    return jsonify({'deleted': purge_test_data()})
+
+
+# Background jobs
+
+def prepare_import_job(req, workdir):
+    chunk_size = import_chunk_size()
+    if req.mimetype == 'application/x-ndjson':
+        with open(os.path.join(workdir, 'input.ndjson'), 'wb') as f:
+            shutil.copyfileobj(req.stream, f)
+        return {'file': 'input.ndjson', 'format': 'ndjson', 'chunk_size': chunk_size}
+    data = req.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ValueError('Import data must be a JSON object')
+    with open(os.path.join(workdir, 'input.json'), 'w') as f:
+        json.dump(data, f)
+    return {'file': 'input.json', 'format': 'json', 'chunk_size': chunk_size}
+
+@job_kind('import', prepare=prepare_import_job)
+def run_import_job(ctx, params):
+    # Jobs queued before inputs were named relative to the job directory have 'path'.
+    path = params.get('path') or os.path.join(ctx.workdir, params['file'])
+    if params['format'] == 'ndjson':
+        with open(path, 'rb') as f:
+            total = sum(1 for line in f if line.strip())
+        source = open(path, 'rb')
+        records = iter_ndjson_records(source)
+    else:
+        source = None
+        with open(path) as f:
+            data = json.load(f)
+        total = count_document_records(data)
+        records = iter_document_records(data)
+    ctx.progress(0, total, force=True)
+
+    def counted():
+        for count, item in enumerate(records, 1):
+            ctx.progress(count)
+            yield item
+
+    try:
+        vehicle_id, report = import_vehicle_records(counted(), params['chunk_size'])
+    finally:
+        if source is not None:
+            source.close()
+    return {'vehicle_id': vehicle_id, 'imported': report, 'location': f'/api/vehicles/{vehicle_id}'}
+
+@job_kind('export_csv')
+def run_export_job(ctx, params):
+    total = count_export_rows()
+    ctx.progress(0, total, force=True)
+    path = os.path.join(ctx.workdir, 'export.csv')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for chunk in iter_export_csv(progress=ctx.progress):
+            f.write(chunk)
+    ctx.result_path = path
+    return {'filename': export_filename(), 'rows': total}
+
+@job_kind('purge_test_data')
+def run_purge_job(ctx, params):
+    return {'deleted': purge_test_data()}
+
+def wants_async():
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+def enqueue_job_response(kind):
+    try:
+        job = get_job_runner().enqueue(kind, request)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    response = jsonify(serialize_job(job))
+    response.status_code = 202
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response
+
+@routes.route('/jobs', methods=['GET'])
+def list_jobs():
+    query = Job.query
+    status = request.args.get('status')
+    if status:
+        query = query.filter_by(status=status)
+    jobs = query.order_by(Job.id.desc()).limit(50).all()
+    return jsonify([serialize_job(job) for job in jobs])
+
+@routes.route('/jobs/<kind>', methods=['POST'])
+def create_job(kind):
+    if kind not in JOB_KINDS:
+        return jsonify({'error': f'Unknown job kind: {kind}'}), 404
+    return enqueue_job_response(kind)
+
+@routes.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(serialize_job(job))
+
+@routes.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job_route(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    try:
+        cancel_job(job)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(serialize_job(job))
+
+@routes.route('/jobs/<int:job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status != 'succeeded' or not job.result_path or not os.path.exists(job.result_path):
+        return jsonify({'error': 'Job has no result file'}), 404
+    result = json.loads(job.result) if job.result else {}
+    return send_file(
+        job.result_path, as_attachment=True,
+        download_name=result.get('filename') or os.path.basename(job.result_path)
+    )
+
+@routes.route('/batch', methods=['POST'])
+def batch():
+    """Run several API requests in one round trip."""
+    try:
+        items, transaction = parse_batch(
+            request.get_json(silent=True),
+            current_app.config.get('BATCH_MAX_REQUESTS', DEFAULT_MAX_BATCH_REQUESTS)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    prefix = request.path[:-len('/batch')]
+    results = run_batch(items, transaction, prefix, routes.name, exclude={request.endpoint})
+    return jsonify({'responses': results})
+
+@routes.route('/<entity>/bulk', methods=['POST', 'PATCH', 'DELETE'])
+def bulk_write(entity):
+    """Create, update or delete many records of one kind in one transaction."""
+    spec = BULK_ENTITIES.get(entity)
+    if spec is None:
+        return jsonify({'error': f'Bulk writes are not supported for {entity}'}), 404
+    data = request.get_json(silent=True)
+    key = 'ids' if request.method == 'DELETE' else 'records'
+    rows = data.get(key) if isinstance(data, dict) else data
+    if not isinstance(rows, list) or not rows:
+        return jsonify({'error': f'{key} must be a non-empty list'}), 400
+    max_rows = current_app.config.get('BULK_MAX_ROWS', DEFAULT_MAX_BULK_ROWS)
+    if len(rows) > max_rows:
+        return jsonify({'error': f'At most {max_rows} rows per request'}), 400
+    partial = request.args.get('partial', '').lower() in ('1', 'true', 'yes')
+
+    try:
+        if request.method == 'POST':
+            result = bulk_create(spec, rows, partial)
+            status = 201
+        elif request.method == 'PATCH':
+            result = bulk_update(spec, rows, partial)
+            status = 200
+        else:
+            result = bulk_delete(spec, rows, partial)
+            status = 200
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Rows conflict with existing records'}), 409
+    if result['failed'] and not result['written']:
+        status = 400
+    return jsonify(result), status
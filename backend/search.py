@@ -0,0 +1,182 @@
+"""
+Full-text search over notes, maintenance, mods, guides and documents.
+
+``search_index`` is an FTS5 table with one row per searchable record. Its
+rowid is ``id * SEARCH_ID_STRIDE + code``, where ``code`` identifies the
+source table, so a record's row is found without scanning the index.
+SQLite triggers on each source table keep it current. Unlike the session
+hooks in ``rollups`` and ``change_versions``, they also see bulk
+statements and ``ON DELETE CASCADE``.
+
+The table and its triggers are created with the rest of the schema by
+``create_all``. Existing databases get them from migration 0006.
+``flask search-rebuild`` refills the index from the source tables.
+
+:func:`search_records` ranks matches with BM25, with titles weighted above
+body text, and pages through them by ``(score, rowid)``. Highlighting is
+computed only for the page being served.
+"""
+import re
+from html import escape
+
+from sqlalchemy import bindparam, text
+
+from backend.extensions import db
+from backend.pagination import encode_cursor, decode_cursor
+
+SEARCH_ID_STRIDE = 8
+TITLE_WEIGHT = 5.0
+SNIPPET_TOKENS = 16
+DEFAULT_SEARCH_PAGE_SIZE = 20
+
+# entity -> (rowid code, table, title column, body columns)
+SEARCH_SOURCES = {
+    'note': (1, 'notes', 'title', ('content', 'tags')),
+    'maintenance': (2, 'maintenance', 'category', ('description', 'notes')),
+    'mod': (3, 'mods', 'category', ('description', 'notes')),
+    'guide': (4, 'guides', 'title', ('content',)),
+    'document': (5, 'service_documents', 'title', ('description',)),
+}
+
+QUERY_TOKEN = re.compile(r'"([^"]*)"|(\w+)(\*?)')
+WORD = re.compile(r'\w+')
+
+# Highlight markers that can't occur in stored text, swapped for <mark>
+# after the text around them has been escaped.
+MARK_OPEN, MARK_CLOSE = '\x02', '\x03'
+
+
+def _row_values(entity, prefix):
+    code, _, title, body = SEARCH_SOURCES[entity]
+    body_sql = " || ' ' || ".join(f"COALESCE({prefix}.{column}, '')" for column in body)
+    return f"{prefix}.id * {SEARCH_ID_STRIDE} + {code}, '{entity}', {prefix}.vehicle_id, {prefix}.{title}, TRIM({body_sql})"
+
+
+def search_index_ddl():
+    """Return the statements creating ``search_index`` and its triggers."""
+    statements = [
+        'CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5('
+        "entity UNINDEXED, vehicle_id UNINDEXED, title, body, tokenize = 'porter unicode61 remove_diacritics 2')"
+    ]
+    insert = 'INSERT INTO search_index (rowid, entity, vehicle_id, title, body) VALUES ({values});'
+    for entity, (code, table, title, body) in SEARCH_SOURCES.items():
+        delete = f'DELETE FROM search_index WHERE rowid = old.id * {SEARCH_ID_STRIDE} + {code};'
+        columns = ', '.join(('id', 'vehicle_id', title) + body)
+        statements += [
+            f'CREATE TRIGGER IF NOT EXISTS search_{table}_insert AFTER INSERT ON {table} BEGIN '
+            f'{insert.format(values=_row_values(entity, "new"))} END',
+            f'CREATE TRIGGER IF NOT EXISTS search_{table}_update AFTER UPDATE OF {columns} ON {table} BEGIN '
+            f'{delete} {insert.format(values=_row_values(entity, "new"))} END',
+            f'CREATE TRIGGER IF NOT EXISTS search_{table}_delete AFTER DELETE ON {table} BEGIN {delete} END',
+        ]
+    return statements
+
+
+def create_search_index(connection):
+    for statement in search_index_ddl():
+        connection.execute(text(statement))
+
+
+def drop_search_index(connection):
+    for table in [source[1] for source in SEARCH_SOURCES.values()]:
+        for action in ('insert', 'update', 'delete'):
+            connection.execute(text(f'DROP TRIGGER IF EXISTS search_{table}_{action}'))
+    connection.execute(text('DROP TABLE IF EXISTS search_index'))
+
+
+def rebuild_search_index(connection, entities=None):
+    """Refill the index from the source tables. Returns ``{entity: rows indexed}``."""
+    counts = {}
+    for entity in entities or SEARCH_SOURCES:
+        code, table = SEARCH_SOURCES[entity][:2]
+        connection.execute(text(f'DELETE FROM search_index WHERE rowid % {SEARCH_ID_STRIDE} = {code}'))
+        counts[entity] = connection.execute(text(
+            f'INSERT INTO search_index (rowid, entity, vehicle_id, title, body) '
+            f'SELECT {_row_values(entity, table)} FROM {table}'
+        )).rowcount
+    connection.execute(text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+    return counts
+
+
+def match_expression(query):
+    """Turn user input into an FTS5 query: every word must match.
+
+    ``"quoted words"`` match as a phrase and a trailing ``*`` as a prefix.
+    Anything else FTS5 would treat as syntax is dropped.
+    """
+    terms = []
+    for phrase, word, star in QUERY_TOKEN.findall(query):
+        if word:
+            terms.append(f'"{word}"{star}')
+        elif WORD.search(phrase):
+            terms.append('"' + ' '.join(WORD.findall(phrase)) + '"')
+    return ' '.join(terms)
+
+
+def _highlighted(value):
+    return escape(value or '').replace(MARK_OPEN, '<mark>').replace(MARK_CLOSE, '</mark>')
+
+
+def search_records(query, vehicle_id=None, entities=None, limit=DEFAULT_SEARCH_PAGE_SIZE, cursor=None):
+    """Return ``(items, next_cursor)`` for one page of matches, best first.
+
+    With ``vehicle_id`` only that vehicle's records, and guides shared by
+    all vehicles, are searched. ``title`` and ``snippet`` are HTML-escaped
+    with the matched terms wrapped in ``<mark>``. Raises ValueError for a
+    query without words or a bad cursor.
+    """
+    match = match_expression(query)
+    if not match:
+        raise ValueError('q must contain a word to search for')
+    params = {'match': match, 'limit': limit + 1}
+    conditions = ''
+    if vehicle_id is not None:
+        conditions += " AND (vehicle_id = :vehicle_id OR (entity = 'guide' AND vehicle_id IS NULL))"
+        params['vehicle_id'] = vehicle_id
+    if entities:
+        conditions += ' AND entity IN :entities'
+        params['entities'] = list(entities)
+    after = ''
+    if cursor:
+        params['score'], params['rowid'] = decode_cursor(cursor)
+        if params['score'] is None:
+            raise ValueError('Invalid cursor')
+        after = 'WHERE score > :score OR (score = :score AND rowid > :rowid)'
+
+    statement = text(
+        'SELECT rowid, entity, vehicle_id, score FROM ('
+        f'SELECT rowid, entity, vehicle_id, bm25(search_index, 0, 0, {TITLE_WEIGHT}, 1.0) AS score '
+        f'FROM search_index WHERE search_index MATCH :match{conditions}'
+        f') {after} ORDER BY score, rowid LIMIT :limit'
+    )
+    if entities:
+        statement = statement.bindparams(bindparam('entities', expanding=True))
+    rows = db.session.execute(statement, params).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].score, rows[-1].rowid)
+    if not rows:
+        return [], None
+
+    marks = {
+        rowid: (title, snippet) for rowid, title, snippet in db.session.execute(
+            text(
+                f"SELECT rowid, highlight(search_index, 2, char(2), char(3)), "
+                f"snippet(search_index, 3, char(2), char(3), '…', {SNIPPET_TOKENS}) "
+                'FROM search_index WHERE search_index MATCH :match AND rowid IN :rowids'
+            ).bindparams(bindparam('rowids', expanding=True)),
+            {'match': match, 'rowids': [row.rowid for row in rows]}
+        )
+    }
+    items = []
+    for row in rows:
+        title, snippet = marks.get(row.rowid, ('', ''))
+        items.append({
+            'entity': row.entity,
+            'id': row.rowid // SEARCH_ID_STRIDE,
+            'vehicle_id': row.vehicle_id,
+            'title': _highlighted(title),
+            'snippet': _highlighted(snippet),
+        })
+    return items, next_cursor
@@ -0,0 +1,136 @@
+"""
+Debounced background writer for the settings backup file.
+
+Settings writers hand the writer a ready-made snapshot instead of writing
+``instance/settings.json`` inside the request. Snapshots arriving within
+``SETTINGS_BACKUP_DELAY`` seconds of each other are coalesced: only the
+latest is written once the delay passes. Each write goes to a temporary
+file in the same directory which is then renamed over the backup, so
+readers never see a truncated file.
+
+Live writers are flushed once at interpreter exit. ``shutdown`` cancels a
+writer's timer and drops it from that list when its app goes away.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import weakref
+from datetime import datetime, timezone
+
+from flask import current_app
+
+DEFAULT_BACKUP_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'settings.json'
+)
+DEFAULT_BACKUP_DELAY = 2.0
+
+_writers = weakref.WeakSet()
+
+
+def flush_all_writers():
+    """Write every live writer's pending snapshot."""
+    for writer in list(_writers):
+        writer.flush()
+
+
+atexit.register(flush_all_writers)
+
+
+def write_json_atomic(path, payload):
+    """Write ``payload`` as JSON to ``path`` via a temp file and rename."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.settings-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(payload, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class SettingsBackupWriter:
+    """Coalesce settings snapshots and write the latest one off the request thread."""
+
+    def __init__(self, path, delay=DEFAULT_BACKUP_DELAY):
+        self.path = path
+        self.delay = delay
+        self.last_flushed_at = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = None
+        self._timer = None
+
+    @property
+    def pending(self):
+        return self._pending is not None
+
+    def schedule(self, snapshot):
+        """Queue ``snapshot`` to be written after the debounce delay."""
+        with self._lock:
+            self._pending = snapshot
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write the pending snapshot now. Returns True if anything was written."""
+        with self._write_lock:
+            with self._lock:
+                snapshot, self._pending = self._pending, None
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if snapshot is None:
+                return False
+            try:
+                write_json_atomic(self.path, snapshot)
+            except OSError as e:
+                self.last_error = str(e)
+                print(f"Failed to backup settings: {e}")
+                return False
+            self.last_error = None
+            self.last_flushed_at = datetime.now(timezone.utc)
+            return True
+
+    def shutdown(self, flush=True):
+        """Stop the writer: cancel its timer, optionally writing what is pending."""
+        _writers.discard(self)
+        if flush:
+            self.flush()
+            return
+        with self._lock:
+            self._pending = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def status(self):
+        return {
+            'path': self.path,
+            'pending': self.pending,
+            'last_flushed_at': self.last_flushed_at.isoformat() if self.last_flushed_at else None,
+            'last_error': self.last_error,
+        }
+
+
+def get_settings_backup_writer():
+    writer = current_app.extensions.get('settings_backup')
+    if writer is None:
+        writer = SettingsBackupWriter(
+            current_app.config.get('SETTINGS_BACKUP_PATH', DEFAULT_BACKUP_PATH),
+            current_app.config.get('SETTINGS_BACKUP_DELAY', DEFAULT_BACKUP_DELAY),
+        )
+        writer = current_app.extensions.setdefault('settings_backup', writer)
+        _writers.add(writer)
+    return writer
@@ -0,0 +1,120 @@
+"""
+In-process cache of the ``settings`` table.
+
+Settings are read several times per request (spend flags, service
+intervals) but change rarely. The cache keeps every row with its value
+decoded according to ``value_type`` and a version counter that moves on
+every reload or invalidation.
+
+Writers in this process call :func:`invalidate_settings_cache` after
+committing. Other worker processes are caught by a cheap signature query
+(row count, highest id and latest ``updated_at``), run at most once per
+request; if it differs from the signature the cache was loaded with, the
+cache reloads.
+
+Inside a transactional batch (``session.info['outer_transaction']``) the
+settings are read straight from the session and the cache is left alone,
+so values the batch may still roll back never reach other requests.
+"""
+import json
+import threading
+
+from flask import current_app, has_request_context, request
+
+from backend.extensions import db
+from backend.models import Setting
+
+_INVALID = object()
+
+
+def decode_setting(value, value_type):
+    """Decode a stored setting value according to its ``value_type``."""
+    if value_type == 'json':
+        return json.loads(value) if value else None
+    if value_type == 'number':
+        return float(value) if value else None
+    if value_type == 'boolean':
+        return value.lower() == 'true' if value else False
+    return value
+
+
+def settings_signature():
+    row = db.session.execute(
+        db.text('SELECT COUNT(*), MAX(id), MAX(updated_at) FROM settings')
+    ).one()
+    return tuple(row)
+
+
+class SettingsCache:
+    """Decoded settings for one application, safe to share between threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = None
+        self._signature = None
+        self.version = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+            self._signature = None
+            self.version += 1
+
+    @staticmethod
+    def _read():
+        entries = {}
+        for setting in Setting.query.all():
+            try:
+                decoded = decode_setting(setting.value, setting.value_type)
+            except (ValueError, TypeError, AttributeError):
+                decoded = _INVALID
+            entries[setting.key] = (setting.value, setting.value_type, decoded)
+        return entries
+
+    def _load(self):
+        signature = settings_signature()
+        entries = self._read()
+        with self._lock:
+            self._entries = entries
+            self._signature = signature
+            self.version += 1
+        return entries
+
+    def entries(self):
+        """Return ``{key: (raw value, value_type, decoded value)}``."""
+        if db.session.info.get('outer_transaction'):
+            return self._read()
+        entries = self._entries
+        if entries is None:
+            entries = self._load()
+        elif not (has_request_context() and getattr(request, 'settings_cache_checked', False)):
+            if settings_signature() != self._signature:
+                entries = self._load()
+        if has_request_context():
+            request.settings_cache_checked = True
+        return entries
+
+    def raw(self, key):
+        entry = self.entries().get(key)
+        return entry[0] if entry else None
+
+    def get(self, key, default=None):
+        """Return the decoded value, raising ValueError if it cannot be decoded."""
+        entry = self.entries().get(key)
+        if entry is None:
+            return default
+        if entry[2] is _INVALID:
+            raise ValueError(f'Setting {key} has an invalid {entry[1]} value')
+        return entry[2]
+
+    def all(self):
+        """Return every setting decoded, raising ValueError if any cannot be decoded."""
+        return {key: self.get(key) for key in self.entries()}
+
+
+def get_settings_cache():
+    return current_app.extensions.setdefault('settings_cache', SettingsCache())
+
+
+def invalidate_settings_cache():
+    get_settings_cache().invalidate()
@@ -0,0 +1,114 @@
+"""
+In-memory static asset serving for the frontend.
+
+Files up to ``STATIC_MAX_CACHED_SIZE`` bytes are read once and kept in
+memory with precomputed gzip (and brotli, when available) variants. An
+entry is reloaded when the file's mtime or size changes. Responses carry
+an ETag per encoding, ``Last-Modified`` and ``Cache-Control``, and answer
+``If-None-Match``/``If-Modified-Since`` with ``304`` and ``Range`` with
+``206``. Larger files go through :func:`flask.send_file`, which streams
+them with the server's file wrapper.
+"""
+import hashlib
+import mimetypes
+import os
+import threading
+from datetime import datetime, timezone
+
+from flask import Response, request, send_file
+from werkzeug.security import safe_join
+
+from backend.compression import available_encodings, choose_encoding, compress
+
+DEFAULT_MAX_CACHED_SIZE = 1024 * 1024
+# Only worth compressing text; images and fonts are already compressed.
+COMPRESSIBLE_PREFIXES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 512
+PRECOMPRESS_LEVELS = {'gzip': 9, 'br': 11}
+
+
+class StaticAsset:
+    """A file's bytes, encoded variants and validators."""
+
+    def __init__(self, path, mtime, size, data, mimetype):
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        self.mimetype = mimetype
+        self.last_modified = datetime.fromtimestamp(mtime, timezone.utc)
+        self.etag = hashlib.sha1(data).hexdigest()[:20]
+        self.variants = {None: data}
+        if mimetype.startswith(COMPRESSIBLE_PREFIXES) and size >= MIN_COMPRESS_SIZE:
+            for encoding in available_encodings():
+                compressed = compress(data, encoding, PRECOMPRESS_LEVELS[encoding])
+                if len(compressed) < size:
+                    self.variants[encoding] = compressed
+
+
+class StaticAssetCache:
+    """Serve files below ``root`` from memory, reloading them when they change on disk."""
+
+    def __init__(self, root, max_cached_size=DEFAULT_MAX_CACHED_SIZE, max_age=0):
+        self.root = root
+        self.max_cached_size = max_cached_size
+        self.max_age = max_age
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def _load(self, path, stat):
+        cached = self._assets.get(path)
+        if cached and cached.mtime == stat.st_mtime and cached.size == stat.st_size:
+            return cached
+        with open(path, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        asset = StaticAsset(path, stat.st_mtime, len(data), data, mimetype)
+        with self._lock:
+            self._assets[path] = asset
+        return asset
+
+    def _cache_control(self, response):
+        if self.max_age:
+            response.cache_control.public = True
+            response.cache_control.max_age = self.max_age
+        else:
+            response.cache_control.no_cache = True
+
+    def serve(self, *parts):
+        """Return a response for the file at ``parts`` below the root.
+
+        Each part is checked separately, so ``serve('css', name)`` cannot
+        escape the ``css`` directory.
+        """
+        path = safe_join(self.root, *parts)
+        if path is None:
+            return 'Forbidden', 403
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return 'Not Found', 404
+        if not os.path.isfile(path):
+            return 'Not Found', 404
+
+        if stat.st_size > self.max_cached_size:
+            response = send_file(path, conditional=True, etag=True, max_age=self.max_age or None)
+            self._cache_control(response)
+            return response
+
+        asset = self._load(path, stat)
+        encoding = None
+        if 'Range' not in request.headers:
+            encoding = choose_encoding(request.accept_encodings, [e for e in asset.variants if e])
+
+        response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+        response.headers['Vary'] = 'Accept-Encoding'
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+            response.set_etag(f'{asset.etag}-{encoding}')
+        else:
+            response.set_etag(asset.etag)
+        response.last_modified = asset.last_modified
+        self._cache_control(response)
+        if encoding:
+            return response.make_conditional(request)
+        return response.make_conditional(request, accept_ranges=True, complete_length=asset.size)
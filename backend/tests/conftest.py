@@ -7,7 +7,7 @@ from datetime import date, datetime
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from flask import Flask
-from backend.extensions import db
+from backend.extensions import db, init_sqlite_pragmas
 from backend.models import (
     Vehicle, Maintenance, Mod, Cost, Note, VCDSFault, Guide,
     VehiclePhoto, FuelEntry, Reminder, Setting, Receipt, ServiceDocument
@@ -15,15 +15,23 @@ from backend.models import (
 
 
 @pytest.fixture(scope='function')
-def app():
-    """Create and configure a fresh Flask application for each test."""
+def app(tmp_path):
+    """Create and configure a fresh Flask application for each test.
+
+    The database is a file so it runs with the production PRAGMAs,
+    WAL and foreign keys included.
+    """
     test_app = Flask(__name__)
     test_app.config['TESTING'] = True
-    test_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    test_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "test.db"}'
     test_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     test_app.config['WTF_CSRF_ENABLED'] = False
+    test_app.config['SETTINGS_BACKUP_PATH'] = str(tmp_path / 'instance' / 'settings.json')
+    test_app.config['JOBS_DIR'] = str(tmp_path / 'instance' / 'jobs')
+    test_app.config['JOBS_RUN_INLINE'] = True
     
     db.init_app(test_app)
+    init_sqlite_pragmas(test_app)
     
     with test_app.app_context():
         db.create_all()
@@ -33,9 +41,13 @@ def app():
     
     yield test_app
     
+    writer = test_app.extensions.get('settings_backup')
+    if writer is not None:
+        writer.shutdown(flush=False)
     with test_app.app_context():
         db.session.remove()
         db.drop_all()
+        db.engine.dispose()
 
 
 @pytest.fixture(scope='function')
@@ -0,0 +1,189 @@
+"""
+Tests for the /batch endpoint.
+
+Covers dispatching, per-request results and single-transaction batches.
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.tests.helpers import assert_response_success, assert_response_bad_request
+
+
+def post_batch(client, requests, **kwargs):
+    response = client.post('/api/batch', json={'requests': requests, **kwargs})
+    assert_response_success(response)
+    return response.get_json()['responses']
+
+
+class TestBatch:
+    """Tests for multiplexed sub-requests."""
+
+    def test_dashboard_loaders_in_one_call(self, client, test_vehicle, sample_maintenance, sample_mod):
+        """Test the dashboard's five loads come back in request order."""
+        responses = post_batch(client, [
+            {'id': 'dashboard', 'path': f'/dashboard?vehicle_id={test_vehicle}'},
+            {'id': 'analytics', 'path': f'/analytics?vehicle_id={test_vehicle}'},
+            {'id': 'vehicles', 'path': '/vehicles'},
+            {'id': 'maintenance', 'path': f'/maintenance?vehicle_id={test_vehicle}'},
+            {'id': 'mods', 'path': f'/mods?vehicle_id={test_vehicle}'},
+        ])
+        assert [r['id'] for r in responses] == ['dashboard', 'analytics', 'vehicles', 'maintenance', 'mods']
+        assert all(r['status'] == 200 for r in responses)
+        assert responses[0]['body']['maintenance_cost'] == 50.0
+        assert responses[2]['body'][0]['id'] == test_vehicle
+        assert len(responses[3]['body']) == 1
+        assert 'ETag' in responses[3]['headers']
+
+    def test_results_match_direct_calls(self, client, test_vehicle, sample_cost):
+        """Test a batched GET returns the same body as calling it directly."""
+        direct = client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json()
+        responses = post_batch(client, [{'path': f'/costs?vehicle_id={test_vehicle}'}])
+        assert responses[0]['body'] == direct
+        assert responses[0]['id'] == 0
+
+    def test_sub_requests_not_compressed(self, app, client, test_vehicle, sample_cost):
+        """Test an Accept-Encoding sub-request header doesn't garble the batched body."""
+        app.config['COMPRESS_MIN_SIZE'] = 1
+        direct = client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json()
+        responses = post_batch(client, [
+            {'path': f'/costs?vehicle_id={test_vehicle}', 'headers': {'Accept-Encoding': 'gzip'}}
+        ])
+        assert responses[0]['status'] == 200
+        assert responses[0]['body'] == direct
+
+    def test_writes_and_reads_in_order(self, client, test_vehicle):
+        """Test later sub-requests see the writes of earlier ones."""
+        responses = post_batch(client, [
+            {'method': 'POST', 'path': '/costs', 'body': {'vehicle_id': test_vehicle, 'amount': 12.0}},
+            {'path': f'/costs?vehicle_id={test_vehicle}'},
+        ])
+        assert responses[0]['status'] == 201
+        assert len(responses[1]['body']) == 1
+
+    def test_conditional_sub_request(self, client, test_vehicle):
+        """Test If-None-Match is honoured per sub-request."""
+        etag = client.get('/api/vehicles').headers['ETag']
+        responses = post_batch(client, [{'path': '/vehicles', 'headers': {'If-None-Match': etag}}])
+        assert responses[0]['status'] == 304
+
+    def test_errors_are_per_request(self, client, test_vehicle):
+        """Test a failing sub-request does not affect the others."""
+        responses = post_batch(client, [
+            {'path': '/vehicles/99999'},
+            {'path': '/does-not-exist'},
+            {'path': '/vehicles'},
+        ])
+        assert [r['status'] for r in responses] == [404, 404, 200]
+
+    def test_only_api_routes(self, client):
+        """Test the batch endpoint cannot call itself or leave the API."""
+        responses = post_batch(client, [
+            {'method': 'POST', 'path': '/batch', 'body': {'requests': []}},
+            {'path': '/../css/app.css'},
+        ])
+        assert responses[0]['status'] == 400
+        assert responses[1]['status'] in (400, 404)
+
+    def test_downloads_rejected(self, client, test_vehicle):
+        """Test file exports are refused inside a batch."""
+        responses = post_batch(client, [{'path': '/settings/export'}])
+        assert responses[0]['status'] == 400
+
+    @pytest.mark.parametrize('body', [
+        None,
+        {'requests': []},
+        {'requests': 'nope'},
+        {'requests': [{'path': 'no-slash'}]},
+        {'requests': [{'method': 'TRACE', 'path': '/vehicles'}]},
+    ])
+    def test_invalid_batches(self, client, body):
+        """Test malformed batches return 400."""
+        assert_response_bad_request(client.post('/api/batch', json=body))
+
+    def test_batch_size_limit(self, app, client):
+        """Test batches above BATCH_MAX_REQUESTS are rejected."""
+        app.config['BATCH_MAX_REQUESTS'] = 2
+        response = client.post('/api/batch', json={'requests': [{'path': '/vehicles'}] * 3})
+        assert_response_bad_request(response)
+
+
+class TestBatchTransaction:
+    """Tests for batches run in a single transaction."""
+
+    def test_commits_when_all_succeed(self, client, test_vehicle):
+        """Test all writes are kept when every sub-request succeeds."""
+        responses = post_batch(client, [
+            {'method': 'POST', 'path': '/costs', 'body': {'vehicle_id': test_vehicle, 'amount': 10.0}},
+            {'method': 'POST', 'path': '/costs', 'body': {'vehicle_id': test_vehicle, 'amount': 20.0}},
+        ], transaction=True)
+        assert [r['status'] for r in responses] == [201, 201]
+        costs = client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json()
+        assert sorted(c['amount'] for c in costs) == [10.0, 20.0]
+        dashboard = client.get(f'/api/dashboard?vehicle_id={test_vehicle}').get_json()
+        assert dashboard['other_costs'] == 30.0
+
+    def test_rolls_back_on_failure(self, client, test_vehicle):
+        """Test a failing sub-request undoes the earlier writes and skips the rest."""
+        responses = post_batch(client, [
+            {'method': 'POST', 'path': '/costs', 'body': {'vehicle_id': test_vehicle, 'amount': 10.0}},
+            {'method': 'PUT', 'path': '/vehicles/99999', 'body': {'name': 'Ghost'}},
+            {'method': 'POST', 'path': '/costs', 'body': {'vehicle_id': test_vehicle, 'amount': 30.0}},
+        ], transaction=True)
+        assert [r['status'] for r in responses] == [201, 404, 424]
+        assert client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json() == []
+
+    def test_sub_request_rollback_is_its_own(self, app, client, test_vehicle):
+        """Test a sub-request that rolls back and recovers keeps the earlier writes."""
+        from flask import jsonify
+        from backend.extensions import db
+
+        def recovering_view():
+            db.session.rollback()
+            return jsonify([])
+
+        app.view_functions['routes.get_vehicles'] = recovering_view
+        responses = post_batch(client, [
+            {'method': 'POST', 'path': '/costs', 'body': {'vehicle_id': test_vehicle, 'amount': 10.0}},
+            {'path': '/vehicles'},
+        ], transaction=True)
+        assert [r['status'] for r in responses] == [201, 200]
+        assert len(client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json()) == 1
+
+    def test_conflict_rolls_back_cleanly(self, client, test_vehicle):
+        """Test a sub-request that rolls back on a conflict fails the batch without SQLAlchemy warnings."""
+        import warnings
+        from sqlalchemy.exc import SAWarning
+
+        fault = {'vehicle_id': test_vehicle, 'address': '01', 'fault_code': '16706'}
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', SAWarning)
+            responses = post_batch(client, [
+                {'method': 'POST', 'path': '/costs', 'body': {'vehicle_id': test_vehicle, 'amount': 10.0}},
+                {'method': 'POST', 'path': '/vcds', 'body': fault},
+                {'method': 'POST', 'path': '/vcds', 'body': fault},
+            ], transaction=True)
+        assert [r['status'] for r in responses] == [201, 201, 409]
+        assert client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json() == []
+        assert client.get(f'/api/vcds?vehicle_id={test_vehicle}').get_json() == []
+
+    @pytest.mark.parametrize('path', ['/jobs/export', '/export?async=1'])
+    def test_jobs_rejected(self, client, test_vehicle, path):
+        """Test jobs can't be started inside a transaction."""
+        responses = post_batch(client, [
+            {'method': 'POST', 'path': '/costs', 'body': {'vehicle_id': test_vehicle, 'amount': 10.0}},
+            {'method': 'POST', 'path': path},
+        ], transaction=True)
+        assert [r['status'] for r in responses] == [201, 400]
+        assert client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json() == []
+
+    def test_without_transaction_keeps_earlier_writes(self, client, test_vehicle):
+        """Test the default mode commits each sub-request on its own."""
+        responses = post_batch(client, [
+            {'method': 'POST', 'path': '/costs', 'body': {'vehicle_id': test_vehicle, 'amount': 10.0}},
+            {'method': 'PUT', 'path': '/vehicles/99999', 'body': {'name': 'Ghost'}},
+        ])
+        assert [r['status'] for r in responses] == [201, 404]
+        assert len(client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json()) == 1
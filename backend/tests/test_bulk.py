@@ -0,0 +1,228 @@
+"""
+Tests for the bulk create/update/delete endpoints.
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.tests.helpers import (
+    assert_response_success, assert_response_created, assert_response_bad_request, assert_response_not_found
+)
+
+
+class TestBulkCreate:
+    """Tests for POST /<entity>/bulk."""
+
+    def test_create_fuel_entries(self, client, test_vehicle):
+        """Test many rows are created and their ids returned in order."""
+        records = [{'vehicle_id': test_vehicle, 'date': f'2024-03-{day:02d}', 'gallons': 10.0, 'total_cost': 60.0}
+                   for day in range(1, 11)]
+        response = client.post('/api/fuel/bulk', json={'records': records})
+        assert_response_created(response)
+        data = response.get_json()
+        assert data['written'] == 10
+        assert data['failed'] == 0
+        ids = [r['id'] for r in data['results']]
+        assert [r['index'] for r in data['results']] == list(range(10))
+
+        entries = client.get(f'/api/fuel?vehicle_id={test_vehicle}').get_json()
+        assert sorted(e['id'] for e in entries) == sorted(ids)
+        by_id = {e['id']: e for e in entries}
+        assert by_id[ids[0]]['date'] == '2024-03-01'
+
+    def test_single_executemany(self, app, client, test_vehicle):
+        """Test the rows are written with one INSERT statement."""
+        from backend.extensions import db
+
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO costs'):
+                statements.append(statement)
+
+        records = [{'vehicle_id': test_vehicle, 'amount': float(i)} for i in range(50)]
+        with app.app_context():
+            db.event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                response = client.post('/api/costs/bulk', json={'records': records})
+            finally:
+                db.event.remove(db.engine, 'before_cursor_execute', record)
+        assert_response_created(response)
+        assert len(statements) == 1
+
+    def test_ids_match_rows_across_chunks_and_writers(self, app, client, test_vehicle, monkeypatch):
+        """Test each row gets its own id when chunked and when other rows are inserted in between."""
+        from backend import bulk
+        from backend.extensions import db
+
+        monkeypatch.setattr(bulk, 'INSERT_CHUNK_SIZE', 7)
+
+        def interloper(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO costs'):
+                cursor.connection.execute('INSERT INTO costs (vehicle_id, amount) VALUES (?, -1)', (test_vehicle,))
+
+        records = [{'vehicle_id': test_vehicle, 'amount': float(i)} for i in range(20)]
+        with app.app_context():
+            db.event.listen(db.engine, 'before_cursor_execute', interloper)
+            try:
+                response = client.post('/api/costs/bulk', json={'records': records})
+            finally:
+                db.event.remove(db.engine, 'before_cursor_execute', interloper)
+        assert_response_created(response)
+
+        amounts = {c['id']: c['amount'] for c in client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json()}
+        assert [amounts[r['id']] for r in response.get_json()['results']] == [float(i) for i in range(20)]
+        assert list(amounts.values()).count(-1) == 3
+
+    def test_defaults_match_single_endpoints(self, client, test_vehicle):
+        """Test mods default to planned and parts are stored as JSON."""
+        response = client.post('/api/mods/bulk', json={'records': [
+            {'vehicle_id': test_vehicle, 'description': 'Intake', 'parts': ['filter', 'pipe']},
+        ]})
+        assert_response_created(response)
+        mod = client.get(f'/api/mods?vehicle_id={test_vehicle}').get_json()[0]
+        assert mod['status'] == 'planned'
+        assert mod['parts'] in (['filter', 'pipe'], '["filter", "pipe"]')
+
+    def test_invalid_row_writes_nothing(self, client, test_vehicle):
+        """Test one bad row rejects the whole request with per-row errors."""
+        response = client.post('/api/maintenance/bulk', json={'records': [
+            {'vehicle_id': test_vehicle, 'date': '2024-01-01', 'cost': 10.0},
+            {'vehicle_id': test_vehicle, 'cost': 20.0},
+            {'vehicle_id': test_vehicle, 'date': 'yesterday'},
+            {'vehicle_id': 99999, 'date': '2024-01-02'},
+        ]})
+        assert_response_bad_request(response)
+        data = response.get_json()
+        assert data['written'] == 0
+        assert data['failed'] == 3
+        results = data['results']
+        assert 'id' not in results[0] and 'error' not in results[0]
+        assert 'date' in results[1]['error']
+        assert 'date must be a date' in results[2]['error']
+        assert results[3]['error'] == 'Vehicle not found'
+        assert client.get(f'/api/maintenance?vehicle_id={test_vehicle}').get_json() == []
+
+    def test_partial_writes_valid_rows(self, client, test_vehicle):
+        """Test ?partial=1 keeps the valid rows and reports the rest."""
+        response = client.post('/api/notes/bulk?partial=1', json={'records': [
+            {'vehicle_id': test_vehicle, 'title': 'Kept'},
+            {'title': 'No vehicle'},
+        ]})
+        assert_response_created(response)
+        data = response.get_json()
+        assert data['written'] == 1
+        assert 'id' in data['results'][0]
+        assert 'error' in data['results'][1]
+
+    def test_repeated_active_faults_are_row_errors(self, client, test_vehicle):
+        """Test faults already active, or repeated in the batch, fail per row and the rest are written."""
+        client.post('/api/vcds', json={'vehicle_id': test_vehicle, 'address': '01', 'fault_code': '16706'})
+        fault = {'vehicle_id': test_vehicle, 'address': '08', 'fault_code': '00819'}
+        records = [
+            {'vehicle_id': test_vehicle, 'address': '01', 'fault_code': '16706'},
+            fault, fault, {**fault, 'status': 'cleared'},
+        ]
+        response = client.post('/api/vcds/bulk?partial=1', json={'records': records})
+        assert response.status_code == 201
+        data = response.get_json()
+        assert (data['written'], data['failed']) == (2, 2)
+        assert [('error' in r) for r in data['results']] == [True, False, True, False]
+
+        response = client.post('/api/vcds/bulk', json={'records': records})
+        assert_response_bad_request(response)
+        assert len(client.get(f'/api/vcds?vehicle_id={test_vehicle}').get_json()) == 3
+
+    def test_dashboard_totals_follow_bulk_create(self, client, test_vehicle):
+        """Test the spend rollup and ETags see bulk writes."""
+        etag = client.get(f'/api/costs?vehicle_id={test_vehicle}').headers['ETag']
+        client.post('/api/costs/bulk', json=[{'vehicle_id': test_vehicle, 'amount': 5.0}] * 3)
+        dashboard = client.get(f'/api/dashboard?vehicle_id={test_vehicle}').get_json()
+        assert dashboard['other_costs'] == 15.0
+        response = client.get(f'/api/costs?vehicle_id={test_vehicle}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+
+
+class TestBulkUpdate:
+    """Tests for PATCH /<entity>/bulk."""
+
+    def test_update_mods(self, client, test_vehicle, multiple_mods):
+        """Test rows with different fields are updated together."""
+        mods = client.get(f'/api/mods?vehicle_id={test_vehicle}').get_json()
+        response = client.patch('/api/mods/bulk', json={'records': [
+            {'id': mods[0]['id'], 'status': 'completed'},
+            {'id': mods[1]['id'], 'status': 'completed', 'cost': 42.0},
+        ]})
+        assert_response_success(response)
+        assert response.get_json()['written'] == 2
+
+        updated = {m['id']: m for m in client.get(f'/api/mods?vehicle_id={test_vehicle}').get_json()}
+        assert updated[mods[0]['id']]['status'] == 'completed'
+        assert updated[mods[1]['id']]['cost'] == 42.0
+        assert updated[mods[0]['id']]['description'] == mods[0]['description']
+
+    def test_update_refreshes_rollup(self, client, test_vehicle, sample_maintenance):
+        """Test changed costs show up in the dashboard totals."""
+        client.patch('/api/maintenance/bulk', json={'records': [{'id': sample_maintenance, 'cost': 80.0}]})
+        dashboard = client.get(f'/api/dashboard?vehicle_id={test_vehicle}').get_json()
+        assert dashboard['maintenance_cost'] == 80.0
+
+    def test_missing_record(self, client, sample_cost):
+        """Test unknown ids are reported and nothing changes."""
+        response = client.patch('/api/costs/bulk', json={'records': [
+            {'id': sample_cost, 'amount': 1.0},
+            {'id': 99999, 'amount': 2.0},
+            {'amount': 3.0},
+        ]})
+        assert_response_bad_request(response)
+        results = response.get_json()['results']
+        assert results[1]['error'] == 'Record not found'
+        assert results[2]['error'] == 'id must be an integer'
+
+
+class TestBulkDelete:
+    """Tests for DELETE /<entity>/bulk."""
+
+    def test_delete_costs(self, client, test_vehicle, multiple_costs):
+        """Test listed ids are deleted in one go."""
+        costs = client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json()
+        ids = [c['id'] for c in costs[:2]]
+        response = client.delete('/api/costs/bulk', json={'ids': ids})
+        assert_response_success(response)
+        assert response.get_json()['written'] == 2
+        remaining = client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json()
+        assert len(remaining) == len(costs) - 2
+
+    def test_delete_maintenance_unlinks_receipts(self, client, test_vehicle, sample_maintenance, sample_receipt):
+        """Test receipts of deleted services stay, unlinked."""
+        response = client.delete('/api/maintenance/bulk', json={'ids': [sample_maintenance]})
+        assert_response_success(response)
+        receipts = client.get(f'/api/receipts?vehicle_id={test_vehicle}').get_json()
+        assert receipts[0]['maintenance_id'] is None
+
+    def test_unknown_id_deletes_nothing(self, client, test_vehicle, sample_cost):
+        """Test a missing id rejects the request."""
+        response = client.delete('/api/costs/bulk', json={'ids': [sample_cost, 99999]})
+        assert_response_bad_request(response)
+        assert len(client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json()) == 1
+
+
+class TestBulkRequests:
+    """Tests for malformed bulk requests."""
+
+    def test_unknown_entity(self, client):
+        """Test entities without bulk support return 404."""
+        assert_response_not_found(client.post('/api/vehicles/bulk', json={'records': [{}]}))
+
+    @pytest.mark.parametrize('body', [None, {}, {'records': []}, {'records': 'x'}])
+    def test_bad_body(self, client, body):
+        """Test missing or empty row lists return 400."""
+        assert_response_bad_request(client.post('/api/costs/bulk', json=body))
+
+    def test_row_limit(self, app, client, test_vehicle):
+        """Test requests above BULK_MAX_ROWS are rejected."""
+        app.config['BULK_MAX_ROWS'] = 2
+        response = client.post('/api/costs/bulk', json={'records': [{'vehicle_id': test_vehicle}] * 3})
+        assert_response_bad_request(response)
@@ -0,0 +1,128 @@
+"""
+Tests for compression of API responses.
+
+Covers gzip negotiation, the size threshold, the configurable level,
+streamed bodies and responses that must be left alone.
+"""
+import pytest
+import sys
+import os
+import gzip
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from datetime import date
+from flask import Flask, Response
+from backend.extensions import db
+from backend.models import Maintenance
+from backend.compression import compress_response, compress_stream, brotli
+
+
+@pytest.fixture
+def long_history(app, test_vehicle):
+    """Enough maintenance records for the list to pass the size threshold."""
+    with app.app_context():
+        db.session.add_all([
+            Maintenance(vehicle_id=test_vehicle, date=date(2024, 1, 1 + i % 28), category='oil_change',
+                        description='Oil and filter change', cost=50.0, shop_name='Local Garage')
+            for i in range(40)
+        ])
+        db.session.commit()
+    return test_vehicle
+
+
+class TestApiCompression:
+    """Tests for compression on the routes blueprint."""
+
+    def test_large_json_is_gzipped(self, client, long_history):
+        """Test a list above the threshold is gzip-encoded when accepted."""
+        plain = client.get(f'/api/maintenance?vehicle_id={long_history}')
+        response = client.get(f'/api/maintenance?vehicle_id={long_history}', headers={'Accept-Encoding': 'gzip'})
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert gzip.decompress(response.data) == plain.data
+        assert len(response.data) < len(plain.data)
+
+    def test_not_compressed_without_accept_encoding(self, client, test_vehicle, multiple_maintenance_records):
+        """Test clients that do not ask for compression get plain JSON."""
+        response = client.get(f'/api/maintenance?vehicle_id={test_vehicle}')
+        assert 'Content-Encoding' not in response.headers
+        assert len(response.get_json()) == 5
+
+    def test_small_response_not_compressed(self, client):
+        """Test bodies under COMPRESS_MIN_SIZE are sent as is."""
+        response = client.get('/api/vehicles', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+
+    def test_threshold_and_level_are_configurable(self, app, client, test_vehicle):
+        """Test COMPRESS_MIN_SIZE and COMPRESS_LEVEL are read from the config."""
+        app.config['COMPRESS_MIN_SIZE'] = 1
+        app.config['COMPRESS_LEVEL'] = 1
+        response = client.get('/api/vehicles', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data).startswith(b'[')
+
+    def test_not_modified_untouched(self, client, long_history):
+        """Test 304 responses are not given a body or encoding."""
+        url = f'/api/maintenance?vehicle_id={long_history}'
+        etag = client.get(url, headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+        response = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        assert response.status_code == 304
+        assert 'Content-Encoding' not in response.headers
+
+    @pytest.mark.skipif(brotli is None, reason='brotli not installed')
+    def test_brotli_preferred(self, client, long_history):
+        """Test brotli is chosen when available and accepted."""
+        response = client.get(
+            f'/api/maintenance?vehicle_id={long_history}', headers={'Accept-Encoding': 'gzip, br'}
+        )
+        assert response.headers['Content-Encoding'] == 'br'
+
+
+class TestStreamingCompression:
+    """Tests for compressing streamed bodies."""
+
+    def test_streamed_body_compressed_per_chunk(self):
+        """Test a streamed response is compressed without buffering and decodes intact."""
+        app = Flask(__name__)
+        app.after_request(compress_response)
+        produced = []
+
+        @app.route('/stream')
+        def stream():
+            def generate():
+                for i in range(50):
+                    produced.append(i)
+                    yield f'line {i}\n' * 20
+            return Response(generate(), mimetype='text/csv')
+
+        with app.test_client() as client:
+            response = client.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert 'Content-Length' not in response.headers
+            chunks = response.response
+            first = next(iter(chunks))
+            assert first
+            assert len(produced) == 1
+            body = first + b''.join(chunks)
+            response.close()
+
+        assert zlib.decompress(body, 31).decode() == ''.join(f'line {i}\n' * 20 for i in range(50))
+
+    def test_compress_stream_closes_source(self):
+        """Test closing the compressed stream closes the underlying iterator."""
+        closed = []
+
+        def source():
+            try:
+                yield b'a' * 100
+                yield b'b' * 100
+            finally:
+                closed.append(True)
+
+        stream = compress_stream(source(), 'gzip')
+        next(stream)
+        stream.close()
+        assert closed == [True]
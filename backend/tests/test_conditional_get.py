@@ -0,0 +1,159 @@
+"""
+Tests for ETag / If-None-Match handling on list and detail endpoints.
+
+Covers 304 responses, counters bumped per vehicle and table by ORM writes,
+vehicle deletion, bulk deletes and skipping the main query on a match.
+"""
+import pytest
+import sys
+import os
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import event
+from backend.extensions import db
+from backend.models import Vehicle, Maintenance, Cost
+from backend.change_versions import get_change_version
+from backend.tests.helpers import assert_response_success
+
+
+def revalidate(client, url):
+    """GET a URL, then GET it again with the returned ETag; return the second response."""
+    first = client.get(url)
+    assert_response_success(first)
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')
+    return client.get(url, headers={'If-None-Match': etag})
+
+
+class TestConditionalGet:
+    """Tests for 304 Not Modified responses."""
+
+    def test_unchanged_list_returns_304(self, client, test_vehicle, sample_maintenance):
+        """Test a repeat request with the ETag gets an empty 304."""
+        response = revalidate(client, f'/api/maintenance?vehicle_id={test_vehicle}')
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+    def test_write_to_same_vehicle_changes_etag(self, client, test_vehicle, sample_maintenance):
+        """Test adding a record for the vehicle invalidates its list."""
+        url = f'/api/maintenance?vehicle_id={test_vehicle}'
+        etag = client.get(url).headers['ETag']
+        client.post('/api/maintenance', json={'vehicle_id': test_vehicle, 'date': '2024-05-01', 'cost': 10})
+
+        response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert len(response.get_json()) == 2
+
+    def test_write_to_other_vehicle_keeps_etag(self, client, app, test_vehicle, sample_maintenance):
+        """Test writes for another vehicle do not invalidate this vehicle's list."""
+        url = f'/api/maintenance?vehicle_id={test_vehicle}'
+        etag = client.get(url).headers['ETag']
+        with app.app_context():
+            other = Vehicle(name='Other')
+            db.session.add(other)
+            db.session.commit()
+            other_id = other.id
+        client.post('/api/maintenance', json={'vehicle_id': other_id, 'date': '2024-05-01'})
+
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+        assert client.get('/api/maintenance').status_code == 200
+
+    def test_write_to_other_table_keeps_etag(self, client, test_vehicle, sample_maintenance):
+        """Test writes to another table do not invalidate the list."""
+        url = f'/api/maintenance?vehicle_id={test_vehicle}'
+        etag = client.get(url).headers['ETag']
+        client.post('/api/costs', json={'vehicle_id': test_vehicle, 'amount': 5})
+
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    def test_query_string_is_part_of_etag(self, client, test_vehicle, sample_maintenance):
+        """Test different parameters on the same table get different ETags."""
+        full = client.get(f'/api/maintenance?vehicle_id={test_vehicle}').headers['ETag']
+        narrow = client.get(f'/api/maintenance?vehicle_id={test_vehicle}&fields=id').headers['ETag']
+        assert full != narrow
+
+    def test_update_moving_vehicle_bumps_both(self, app, test_vehicle, sample_maintenance):
+        """Test moving a record to another vehicle bumps both vehicles' counters."""
+        with app.app_context():
+            other = Vehicle(name='Other')
+            db.session.add(other)
+            db.session.commit()
+            before = get_change_version('maintenance', test_vehicle), get_change_version('maintenance', other.id)
+
+            db.session.get(Maintenance, sample_maintenance).vehicle_id = other.id
+            db.session.commit()
+
+            after = get_change_version('maintenance', test_vehicle), get_change_version('maintenance', other.id)
+            assert after[0] > before[0]
+            assert after[1] > before[1]
+
+    def test_moving_unloaded_record_bumps_old_vehicle(self, app, test_vehicle, test_vehicle_2, sample_maintenance):
+        """Test moving a record whose old vehicle_id isn't loaded still bumps the old vehicle."""
+        with app.app_context():
+            before = get_change_version('maintenance', test_vehicle)
+
+            record = db.session.get(Maintenance, sample_maintenance)
+            db.session.expire(record, ['vehicle_id'])
+            record.vehicle_id = test_vehicle_2
+            db.session.commit()
+
+            assert get_change_version('maintenance', test_vehicle) > before
+
+    def test_vehicle_detail_and_delete(self, client, test_vehicle, sample_cost):
+        """Test vehicle detail revalidation and that deleting a vehicle invalidates its lists."""
+        assert revalidate(client, f'/api/vehicles/{test_vehicle}').status_code == 304
+
+        url = f'/api/costs?vehicle_id={test_vehicle}'
+        etag = client.get(url).headers['ETag']
+        client.delete(f'/api/vehicles/{test_vehicle}')
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+    def test_settings_revalidate(self, client):
+        """Test settings are served with an ETag that changes on update."""
+        client.put('/api/settings', json={'key': 'theme', 'value': 'dark'})
+        etag = client.get('/api/settings').headers['ETag']
+        assert client.get('/api/settings', headers={'If-None-Match': etag}).status_code == 304
+
+        client.put('/api/settings', json={'key': 'theme', 'value': 'light'})
+        assert client.get('/api/settings', headers={'If-None-Match': etag}).status_code == 200
+
+    def test_bulk_delete_bumps_versions(self, client, app, test_vehicle, test_key):
+        """Test clearing test data invalidates lists even though it bypasses the ORM."""
+        with app.app_context():
+            db.session.add(Cost(vehicle_id=test_vehicle, date=date(2024, 1, 1), amount=1.0, test_key=test_key))
+            db.session.commit()
+        url = f'/api/costs?vehicle_id={test_vehicle}'
+        etag = client.get(url).headers['ETag']
+
+        client.delete('/api/settings/test-data')
+
+        response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.get_json() == []
+
+    def test_match_skips_main_query(self, client, app, test_vehicle, sample_maintenance):
+        """Test a 304 is answered without querying the maintenance table."""
+        url = f'/api/maintenance?vehicle_id={test_vehicle}'
+        etag = client.get(url).headers['ETag']
+
+        statements = []
+        with app.app_context():
+            engine = db.engine
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            response = client.get(url, headers={'If-None-Match': etag})
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+
+        assert response.status_code == 304
+        assert not any('FROM maintenance' in s for s in statements)
+
+    def test_not_found_has_no_etag(self, client):
+        """Test error responses are not given an ETag."""
+        response = client.get('/api/vehicles/99999')
+        assert response.status_code == 404
+        assert 'ETag' not in response.headers
@@ -0,0 +1,157 @@
+"""
+Tests for the offline fault-code dictionary.
+
+Covers seeding from the bundled file, learning from imports, lookup
+precedence, the LRU in front of the table and enrichment of /vcds and
+/vcds/parse.
+"""
+import pytest
+import sys
+import os
+import io
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import event
+from backend.extensions import db
+from backend.models import FaultCode, VCDSFault
+from backend.fault_codes import seed_fault_codes, get_fault_code_cache, FaultCodeCache
+from backend.tests.helpers import assert_response_success
+
+
+@pytest.fixture(scope='function')
+def seeded(app):
+    """Load the bundled dictionary."""
+    with app.app_context():
+        seed_fault_codes(db.session.connection())
+        db.session.commit()
+
+
+def fault_code_queries(app, action):
+    """Run ``action`` and return the fault_codes SELECTs it issued."""
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        action()
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    return [s for s in statements if 'FROM fault_codes' in s]
+
+
+class TestDictionary:
+    """Tests for seeding and lookups."""
+
+    def test_seed_is_idempotent(self, app, seeded):
+        """Test seeding twice changes nothing the second time."""
+        with app.app_context():
+            assert FaultCode.query.count() > 20
+            assert seed_fault_codes(db.session.connection()) == 0
+
+    def test_seed_keeps_learned_descriptions(self, app, seeded):
+        """Test a description learned from a scan survives a reseed."""
+        with app.app_context():
+            entry = FaultCode.query.filter_by(code='16706', address='').one()
+            entry.description = 'Engine Speed Sensor (G28)'
+            entry.source = 'import'
+            db.session.commit()
+            seed_fault_codes(db.session.connection())
+            db.session.commit()
+            assert FaultCode.query.filter_by(code='16706', address='').one().description == 'Engine Speed Sensor (G28)'
+
+    def test_address_specific_wins(self, app, seeded):
+        """Test a module-specific description is preferred over the generic one."""
+        with app.test_request_context():
+            db.session.add(FaultCode(code='00819', address='08', description='HVAC pressure sensor', source='import'))
+            db.session.commit()
+            cache = get_fault_code_cache()
+            assert cache.describe('00819', '08') == 'HVAC pressure sensor'
+            assert cache.describe('00819', '01') == 'High Pressure Sensor (G65)'
+            assert cache.describe('99999', '01') is None
+
+    def test_lru_serves_repeat_lookups(self, app, seeded):
+        """Test cached keys, hits and misses alike, are not queried again."""
+        keys = [('16706', '01'), ('99999', '01')]
+
+        def lookup():
+            with app.test_request_context():
+                get_fault_code_cache().describe_many(keys)
+
+        assert len(fault_code_queries(app, lookup)) == 2
+        # Only the once-per-request signature check remains.
+        assert len(fault_code_queries(app, lookup)) == 1
+
+    def test_lru_evicts_oldest(self, app, seeded):
+        """Test the cache holds at most maxsize entries."""
+        with app.test_request_context():
+            cache = FaultCodeCache(maxsize=2)
+            cache.describe_many([('16684', ''), ('16685', ''), ('16686', '')])
+            assert list(cache._entries) == [('16685', ''), ('16686', '')]
+
+
+class TestEnrichment:
+    """Tests for descriptions filled in from the dictionary."""
+
+    def test_import_teaches_other_vehicles(self, client, test_vehicle, test_vehicle_2):
+        """Test a description learned from one import fills another vehicle's empty fault."""
+        client.post('/api/vcds/import', json={'vehicle_id': test_vehicle, 'faults': [
+            {'address': '46', 'fault_code': '01331', 'description': 'Door Control Module; Driver Side (J386)'}
+        ]})
+        client.post('/api/vcds', json={'vehicle_id': test_vehicle_2, 'address': '09', 'fault_code': '01331'})
+
+        faults = client.get(f'/api/vcds?vehicle_id={test_vehicle_2}').get_json()
+        assert faults[0]['description'] == 'Door Control Module; Driver Side (J386)'
+
+    def test_learning_invalidates_cached_misses(self, client, test_vehicle):
+        """Test a code cached as unknown is described once it has been learned."""
+        client.post('/api/vcds', json={'vehicle_id': test_vehicle, 'address': '01', 'fault_code': '01331'})
+        assert client.get(f'/api/vcds?vehicle_id={test_vehicle}').get_json()[0]['description'] is None
+
+        client.post('/api/vcds', json={
+            'vehicle_id': test_vehicle, 'address': '46', 'fault_code': '01331', 'description': 'Door Control Module'
+        })
+        faults = client.get(f'/api/vcds?vehicle_id={test_vehicle}').get_json()
+        assert {f['description'] for f in faults} == {'Door Control Module'}
+
+    @pytest.mark.parametrize('write', ['bulk', 'edit', 'vehicle_import'])
+    def test_every_write_path_teaches(self, client, test_vehicle, test_vehicle_2, write):
+        """Test bulk writes, edits and vehicle imports add descriptions to the dictionary."""
+        fault = {'address': '46', 'fault_code': '01331', 'description': 'Door Control Module'}
+        if write == 'bulk':
+            client.post('/api/vcds/bulk', json={'records': [{'vehicle_id': test_vehicle, **fault}]})
+        elif write == 'edit':
+            fault_id = client.post('/api/vcds', json={
+                'vehicle_id': test_vehicle, 'address': '46', 'fault_code': '01331'
+            }).get_json()['id']
+            client.put(f'/api/vcds/{fault_id}', json={'description': fault['description']})
+        else:
+            client.post('/api/vehicles/import', json={'vehicle': {'name': 'Imported'}, 'vcds_faults': [fault]})
+        client.post('/api/vcds', json={'vehicle_id': test_vehicle_2, 'address': '09', 'fault_code': '01331'})
+
+        faults = client.get(f'/api/vcds?vehicle_id={test_vehicle_2}').get_json()
+        assert faults[0]['description'] == 'Door Control Module'
+
+    def test_stored_description_kept(self, client, test_vehicle, seeded):
+        """Test a fault's own description is never replaced."""
+        client.post('/api/vcds', json={
+            'vehicle_id': test_vehicle, 'address': '01', 'fault_code': '16706', 'description': 'From the scan'
+        })
+        assert client.get(f'/api/vcds?vehicle_id={test_vehicle}').get_json()[0]['description'] == 'From the scan'
+
+    def test_fieldset_without_description(self, client, test_vehicle, seeded):
+        """Test fields= without description doesn't gain one."""
+        client.post('/api/vcds', json={'vehicle_id': test_vehicle, 'address': '01', 'fault_code': '16706'})
+        faults = client.get(f'/api/vcds?vehicle_id={test_vehicle}&fields=fault_code').get_json()
+        assert faults == [{'fault_code': '16706'}]
+
+    def test_parse_fills_empty_descriptions(self, client, seeded):
+        """Test parsed faults without text are described, for JSON and uploads alike."""
+        scan = 'Address 01: Engine\n16706 - \n16684 - Misfire\n'
+        faults = client.post('/api/vcds/parse', json={'content': scan}).get_json()
+        assert [f['description'] for f in faults] == ['Engine Speed Sensor (G28): No Signal (P0322)', 'Misfire']
+
+        response = client.post('/api/vcds/parse', data={'file': (io.BytesIO(scan.encode()), 'scan.txt')})
+        assert_response_success(response)
+        assert response.get_json() == faults
@@ -0,0 +1,79 @@
+"""
+Tests for sparse fieldsets on list endpoints.
+
+Covers narrowing the response with fields=, the column-only SELECT behind
+it, combining it with pagination and rejecting unknown field names.
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import event
+from backend.extensions import db
+from backend.tests.helpers import assert_response_success, assert_response_bad_request
+
+
+def capture_selects(app, client, url):
+    """Return the response and the SELECT statements run while serving it."""
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    return response, [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+
+
+class TestSparseFieldsets:
+    """Tests for the fields= query parameter."""
+
+    def test_only_requested_fields_returned(self, client, test_vehicle, multiple_maintenance_records):
+        """Test the response contains exactly the requested fields."""
+        response = client.get(f'/api/maintenance?vehicle_id={test_vehicle}&fields=id,date,cost')
+        assert_response_success(response)
+        data = response.get_json()
+        assert len(data) == 5
+        assert all(set(item) == {'id', 'date', 'cost'} for item in data)
+        assert data[0]['date'] == max(item['date'] for item in data)
+
+    def test_unrequested_columns_not_selected(self, app, client, test_vehicle, sample_note):
+        """Test large text columns are left out of the SQL."""
+        response, selects = capture_selects(app, client, f'/api/notes?vehicle_id={test_vehicle}&fields=id,title')
+        assert_response_success(response)
+        assert response.get_json()[0] == {'id': sample_note, 'title': 'Test Note'}
+        note_selects = [s for s in selects if 'FROM notes' in s]
+        assert len(note_selects) == 1
+        assert 'content' not in note_selects[0]
+        assert 'tags' not in note_selects[0]
+
+    def test_fields_with_pagination(self, client, test_vehicle, multiple_costs):
+        """Test cursors still work when the sort column is not requested."""
+        first = client.get(f'/api/costs?vehicle_id={test_vehicle}&fields=amount&limit=2').get_json()
+        assert all(set(item) == {'amount'} for item in first['items'])
+        assert first['next_cursor']
+
+        second = client.get(
+            f"/api/costs?vehicle_id={test_vehicle}&fields=amount&limit=2&cursor={first['next_cursor']}"
+        ).get_json()
+        assert len(second['items']) >= 1
+
+    def test_vehicles_fields(self, client, test_vehicle):
+        """Test fieldsets on the vehicle list."""
+        data = client.get('/api/vehicles?fields=id,name').get_json()
+        assert data == [{'id': test_vehicle, 'name': 'Test Vehicle'}]
+
+    def test_full_response_without_fields(self, client, test_vehicle, sample_cost):
+        """Test the default response still contains every field."""
+        item = client.get(f'/api/costs?vehicle_id={test_vehicle}').get_json()[0]
+        assert set(item) == {'id', 'vehicle_id', 'date', 'category', 'amount', 'description'}
+
+    @pytest.mark.parametrize('fields', ['id,password', '', 'test_key'])
+    def test_unknown_fields_rejected(self, client, test_vehicle, fields):
+        """Test unknown or empty field lists are rejected."""
+        response = client.get(f'/api/costs?vehicle_id={test_vehicle}&fields={fields}')
+        assert_response_bad_request(response)
@@ -123,3 +123,357 @@ class TestDataManagement:
         data = response.get_json()
         assert 'settings' in data
         assert 'version' in data
+
+
+class TestStreamingExport:
+    """Tests for the streamed CSV export."""
+
+    def test_export_is_streamed_in_chunks(self, app, client, test_vehicle, monkeypatch):
+        """Test the export arrives as several chunks with every row present."""
+        import csv
+        import io
+        from datetime import date
+        from backend.extensions import db
+        from backend.models import Cost
+        from backend import exports
+
+        with app.app_context():
+            db.session.add_all([
+                Cost(vehicle_id=test_vehicle, date=date(2024, 1, 1), amount=float(i), description='x' * 100)
+                for i in range(300)
+            ])
+            db.session.commit()
+
+        monkeypatch.setattr(exports, 'EXPORT_CHUNK_SIZE', 4096)
+        response = client.get('/api/settings/export', buffered=False)
+        try:
+            assert response.is_streamed
+            assert 'attachment' in response.headers['Content-Disposition']
+            chunks = list(response.response)
+        finally:
+            response.close()
+
+        assert len(chunks) > 1
+        assert all(len(chunk) <= 2 * 4096 for chunk in chunks)
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode('utf-8'))))
+        start = rows.index(['=== COSTS ==='])
+        assert rows[start + 1] == ['id', 'vehicle_id', 'date', 'category', 'amount', 'description']
+        cost_rows = rows[start + 2:rows.index([], start)]
+        assert len(cost_rows) == 300
+        assert cost_rows[0][2] == '2024-01-01'
+
+    def test_export_sections_in_order(self, client, test_vehicle):
+        """Test every section header is present in the documented order."""
+        from backend.exports import CSV_EXPORT_SECTIONS
+
+        text = client.get('/api/settings/export').data.decode('utf-8')
+        positions = [text.index(f'=== {title} ===') for title, _, _ in CSV_EXPORT_SECTIONS]
+        assert positions == sorted(positions)
+        assert text.startswith('MuttLogbook Export,')
+
+    def test_rows_read_in_batches(self, app, test_vehicle):
+        """Test tables are fetched in yield_per batches rather than all at once."""
+        from datetime import date
+        from backend.extensions import db
+        from backend.models import Cost
+        from backend.exports import iter_rows
+
+        with app.app_context():
+            db.session.add_all([Cost(vehicle_id=test_vehicle, date=date(2024, 1, 1), amount=1.0) for _ in range(25)])
+            db.session.commit()
+
+            rows = iter_rows(Cost, ['id', 'amount'], batch_size=10)
+            first = next(rows)
+            assert first[1] == 1.0
+            assert len(list(rows)) == 24
+
+
+@pytest.fixture
+def vehicle_guide(app, test_vehicle):
+    """Create a guide attached to the test vehicle."""
+    from backend.extensions import db
+    from backend.models import Guide
+
+    with app.app_context():
+        guide = Guide(vehicle_id=test_vehicle, title='Timing Belt', category='engine', interval_miles=60000)
+        db.session.add(guide)
+        db.session.commit()
+        return guide.id
+
+
+class TestNdjsonVehicleExport:
+    """Tests for the NDJSON vehicle export."""
+
+    def test_ndjson_lines_are_typed_records(self, client, test_vehicle, sample_maintenance, sample_cost,
+                                            sample_receipt, vehicle_guide):
+        """Test every line is a typed record, starting with the vehicle."""
+        import json
+
+        response = client.get(f'/api/vehicles/{test_vehicle}/export?format=ndjson')
+        assert_response_success(response)
+        assert response.mimetype == 'application/x-ndjson'
+
+        lines = [json.loads(line) for line in response.data.decode('utf-8').splitlines()]
+        assert lines[0]['type'] == 'vehicle'
+        assert lines[0]['record']['id'] == test_vehicle
+        types = {line['type'] for line in lines}
+        assert {'maintenance', 'costs', 'receipts', 'guides'} <= types
+        maintenance = next(line['record'] for line in lines if line['type'] == 'maintenance')
+        assert maintenance['date'] == '2024-01-15'
+
+    def test_ndjson_streamed_in_chunks(self, app, client, test_vehicle, monkeypatch):
+        """Test a long history is sent as several chunks."""
+        from datetime import date
+        from backend.extensions import db
+        from backend.models import FuelEntry
+        from backend import exports
+
+        with app.app_context():
+            db.session.add_all([
+                FuelEntry(vehicle_id=test_vehicle, date=date(2024, 1, 1), gallons=10.0, total_cost=60.0)
+                for _ in range(200)
+            ])
+            db.session.commit()
+
+        monkeypatch.setattr(exports, 'EXPORT_CHUNK_SIZE', 2048)
+        response = client.get(f'/api/vehicles/{test_vehicle}/export?format=ndjson', buffered=False)
+        try:
+            assert response.is_streamed
+            chunks = list(response.response)
+        finally:
+            response.close()
+
+        assert len(chunks) > 1
+        lines = b''.join(chunks).decode('utf-8').splitlines()
+        assert sum('"fuel_entries"' in line for line in lines) == 200
+
+    def test_json_export_includes_new_sections(self, client, test_vehicle, sample_receipt, vehicle_guide):
+        """Test the JSON export now carries receipts, documents and guides."""
+        data = client.get(f'/api/vehicles/{test_vehicle}/export').get_json()
+        assert data['vehicle']['id'] == test_vehicle
+        assert len(data['receipts']) == 1
+        assert data['documents'] == []
+        assert len(data['guides']) == 1
+
+    def test_unknown_format_rejected(self, client, test_vehicle):
+        """Test an unsupported format returns 400."""
+        response = client.get(f'/api/vehicles/{test_vehicle}/export?format=xml')
+        assert_response_bad_request(response)
+
+    def test_missing_vehicle(self, client):
+        """Test exporting a missing vehicle returns 404."""
+        assert client.get('/api/vehicles/99999/export?format=ndjson').status_code == 404
+
+
+class TestBulkVehicleImport:
+    """Tests for the chunked vehicle import."""
+
+    def test_round_trip_json_export(self, client, test_vehicle, sample_maintenance, sample_cost, sample_note,
+                                    sample_receipt, vehicle_guide):
+        """Test a JSON export imports into a new vehicle with every section."""
+        exported = client.get(f'/api/vehicles/{test_vehicle}/export').get_json()
+        exported['vehicle']['vin'] = None
+        response = client.post('/api/vehicles/import', json=exported)
+        assert_response_created(response)
+        data = response.get_json()
+        assert data['id'] != test_vehicle
+
+        sections = data['imported']['sections']
+        assert sections['vehicle']['count'] == 1
+        for name in ('maintenance', 'costs', 'notes', 'receipts', 'guides'):
+            assert sections[name]['count'] == len(exported[name])
+            assert sections[name]['seconds'] >= 0
+
+        vehicle = client.get(f'/api/vehicles/{data["id"]}').get_json()
+        assert vehicle['name'] == exported['vehicle']['name']
+        reimported = client.get(f'/api/vehicles/{data["id"]}/export').get_json()
+        assert reimported['maintenance'][0]['date'] == '2024-01-15'
+        assert reimported['notes'][0]['title'] == 'Test Note'
+        assert reimported['receipts'][0]['maintenance_id'] == reimported['maintenance'][0]['id']
+
+    def test_round_trip_ndjson_export(self, client, test_vehicle, sample_maintenance, sample_cost):
+        """Test an NDJSON export can be posted back as a stream."""
+        exported = client.get(f'/api/vehicles/{test_vehicle}/export?format=ndjson').data
+        exported = exported.replace(b'WVWZZZ1FZ7V033393', b'WVWZZZ1FZ7V000001')
+        response = client.post('/api/vehicles/import', data=exported, content_type='application/x-ndjson')
+        assert_response_created(response)
+        sections = response.get_json()['imported']['sections']
+        assert sections['maintenance']['count'] == 1
+        assert sections['costs']['count'] == 1
+
+    def test_inserts_in_chunks(self, app, client, monkeypatch):
+        """Test records are written in executemany chunks of chunk_size."""
+        from backend.extensions import db
+
+        statements = []
+
+        def count_inserts(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO fuel_entries'):
+                statements.append(len(parameters) if executemany else 1)
+
+        import_data = {
+            'vehicle': {'name': 'Chunked'},
+            'fuel_entries': [{'date': '2024-02-01', 'gallons': 10.0, 'total_cost': 60.0} for _ in range(25)],
+        }
+        with app.app_context():
+            db.event.listen(db.engine, 'before_cursor_execute', count_inserts)
+            try:
+                response = client.post('/api/vehicles/import?chunk_size=10', json=import_data)
+            finally:
+                db.event.remove(db.engine, 'before_cursor_execute', count_inserts)
+
+        assert_response_created(response)
+        assert statements == [10, 10, 5]
+
+    def test_links_survive_other_writers(self, app, client, test_vehicle):
+        """Test receipts stay on their own maintenance when other rows are inserted meanwhile."""
+        from backend.extensions import db
+
+        def interloper(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO maintenance'):
+                cursor.connection.execute(
+                    "INSERT INTO maintenance (vehicle_id, date, description) VALUES (?, '2024-01-01', 'other')",
+                    (test_vehicle,)
+                )
+
+        import_data = {
+            'vehicle': {'name': 'Linked'},
+            'maintenance': [{'id': 100 + n, 'date': '2024-02-01', 'description': f'service {n}'} for n in range(5)],
+            'receipts': [{'maintenance_id': 100 + n, 'vendor': f'vendor {n}'} for n in range(5)],
+        }
+        with app.app_context():
+            db.event.listen(db.engine, 'before_cursor_execute', interloper)
+            try:
+                response = client.post('/api/vehicles/import?chunk_size=2', json=import_data)
+            finally:
+                db.event.remove(db.engine, 'before_cursor_execute', interloper)
+        assert_response_created(response)
+
+        exported = client.get(f"/api/vehicles/{response.get_json()['id']}/export").get_json()
+        descriptions = {m['id']: m['description'] for m in exported['maintenance']}
+        assert {r['vendor']: descriptions[r['maintenance_id']] for r in exported['receipts']} == {
+            f'vendor {n}': f'service {n}' for n in range(5)
+        }
+
+    def test_failed_import_changes_etags(self, app, client):
+        """Test lists read while a failed import was partly written don't stay cached."""
+        from backend.imports import VehicleImporter
+
+        with app.app_context():
+            importer = VehicleImporter(chunk_size=1)
+            importer.add('vehicle', {'name': 'Partial'})
+            importer.add('costs', {'date': '2024-01-01', 'amount': 5.0})
+            vehicle_id = importer.vehicle_id
+        url = f'/api/costs?vehicle_id={vehicle_id}'
+        listed = client.get(url)
+        assert len(listed.get_json()) == 1
+        everything = client.get('/api/costs')
+
+        with app.app_context():
+            importer.discard()
+        assert client.get(url, headers={'If-None-Match': listed.headers['ETag']}).status_code == 200
+        assert client.get('/api/costs', headers={'If-None-Match': everything.headers['ETag']}).status_code == 200
+        assert client.get(url).get_json() == []
+
+    def test_duplicate_active_faults_kept_once(self, client):
+        """Test an older export with repeated active faults imports the first of each."""
+        import_data = {
+            'vehicle': {'name': 'Old export'},
+            'vcds_faults': [
+                {'address': '01', 'fault_code': '16706', 'status': 'active', 'notes': 'first'},
+                {'address': '01', 'fault_code': '16706', 'status': 'active', 'notes': 'second'},
+                {'address': '01', 'fault_code': '16706', 'status': 'cleared'},
+                {'address': '08', 'fault_code': '16706'},
+            ],
+        }
+        response = client.post('/api/vehicles/import?chunk_size=1', json=import_data)
+        assert_response_created(response)
+        data = response.get_json()
+        assert data['imported']['skipped'] == 1
+        assert data['imported']['sections']['vcds_faults']['count'] == 3
+
+        faults = client.get(f"/api/vcds?vehicle_id={data['id']}").get_json()
+        assert sorted((f['address'], f['status'], f['notes']) for f in faults) == [
+            ('01', 'active', 'first'), ('01', 'cleared', None), ('08', 'active', None)
+        ]
+
+    def test_dates_parsed_from_iso(self, app, client):
+        """Test ISO dates and datetimes are stored as real dates."""
+        from datetime import date, datetime
+        from backend.models import Receipt, VCDSFault
+
+        import_data = {
+            'vehicle': {'name': 'Dates'},
+            'receipts': [{'date': '2024-03-05', 'amount': 12.5, 'uploaded_at': '2024-03-05T10:30:00'}],
+            'vcds_faults': [{'address': '01', 'fault_code': '00123', 'detected_date': '2024-03-04T08:00:00',
+                             'status': 'active'}],
+        }
+        response = client.post('/api/vehicles/import', json=import_data)
+        assert_response_created(response)
+        vehicle_id = response.get_json()['id']
+
+        with app.app_context():
+            receipt = Receipt.query.filter_by(vehicle_id=vehicle_id).one()
+            assert receipt.date == date(2024, 3, 5)
+            assert receipt.uploaded_at == datetime(2024, 3, 5, 10, 30)
+            fault = VCDSFault.query.filter_by(vehicle_id=vehicle_id).one()
+            assert fault.detected_date == date(2024, 3, 4)
+
+    def test_flat_body_keeps_legacy_defaults(self, client):
+        """Test top-level vehicle fields and the completed mod status still work."""
+        import_data = {'name': 'Flat', 'mods': [{'description': 'Intake', 'cost': 100.0}]}
+        response = client.post('/api/vehicles/import', json=import_data)
+        assert_response_created(response)
+        vehicle_id = response.get_json()['id']
+
+        mods = client.get(f'/api/mods?vehicle_id={vehicle_id}').get_json()
+        assert mods[0]['status'] == 'completed'
+        assert client.get(f'/api/vehicles/{vehicle_id}').get_json()['mileage'] == 0
+
+    def test_dashboard_totals_after_import(self, client):
+        """Test the spend rollup is rebuilt for the imported vehicle."""
+        import_data = {
+            'vehicle': {'name': 'Totals'},
+            'maintenance': [{'date': '2024-01-01', 'cost': 100.0}, {'date': '2024-02-01', 'cost': 50.0}],
+            'costs': [{'date': '2024-01-10', 'amount': 25.0}],
+        }
+        vehicle_id = client.post('/api/vehicles/import', json=import_data).get_json()['id']
+        dashboard = client.get(f'/api/dashboard?vehicle_id={vehicle_id}').get_json()
+        assert dashboard['maintenance_cost'] == 150.0
+        assert dashboard['other_costs'] == 25.0
+
+    def test_import_invalidates_list_etags(self, client):
+        """Test cached list responses change after an import."""
+        first = client.get('/api/vehicles')
+        client.post('/api/vehicles/import', json={'vehicle': {'name': 'Fresh'}})
+        response = client.get('/api/vehicles', headers={'If-None-Match': first.headers['ETag']})
+        assert response.status_code == 200
+
+    def test_bad_ndjson_rolls_back(self, app, client):
+        """Test a malformed line removes the partly imported vehicle."""
+        from backend.models import Vehicle
+
+        body = '{"type":"vehicle","record":{"name":"Broken"}}\n{"type":"costs","record":{"amount":1}}\nnot json\n'
+        response = client.post('/api/vehicles/import', data=body, content_type='application/x-ndjson')
+        assert_response_bad_request(response)
+        assert 'Line 3' in response.get_json()['error']
+        with app.app_context():
+            assert Vehicle.query.filter_by(name='Broken').count() == 0
+
+    def test_duplicate_vin_rejected(self, client, test_vehicle):
+        """Test importing a vehicle whose VIN exists returns 400."""
+        exported = client.get(f'/api/vehicles/{test_vehicle}/export').get_json()
+        response = client.post('/api/vehicles/import', json=exported)
+        assert_response_bad_request(response)
+        assert 'VIN' in response.get_json()['error']
+
+    def test_vehicle_must_come_first(self, client):
+        """Test NDJSON without a leading vehicle record is rejected."""
+        body = '{"type":"costs","record":{"amount":1}}\n'
+        response = client.post('/api/vehicles/import', data=body, content_type='application/x-ndjson')
+        assert_response_bad_request(response)
+
+    def test_invalid_chunk_size(self, client):
+        """Test an out-of-range chunk_size returns 400."""
+        response = client.post('/api/vehicles/import?chunk_size=0', json={'name': 'X'})
+        assert_response_bad_request(response)
@@ -0,0 +1,319 @@
+"""
+Tests for background jobs.
+
+Jobs run inline in tests (``JOBS_RUN_INLINE``), so each POST returns once
+the job has finished.
+"""
+import json
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.tests.helpers import assert_response_success, assert_response_bad_request, assert_response_not_found
+
+
+def assert_accepted(response):
+    assert response.status_code == 202, f"Expected 202, got {response.status_code}: {response.get_json()}"
+    assert response.headers['Location'] == f"/api/jobs/{response.get_json()['id']}"
+    return response.get_json()
+
+
+class TestJobEndpoints:
+    """Tests for /jobs."""
+
+    def test_export_job_writes_result_file(self, client, test_vehicle, sample_maintenance):
+        """Test a CSV export job finishes with a downloadable result."""
+        job = assert_accepted(client.post('/api/jobs/export_csv'))
+        assert job['status'] == 'succeeded'
+        assert job['kind'] == 'export_csv'
+        assert job['progress'] == 1.0
+        assert job['result']['rows'] == job['total'] == 2
+        assert job['result_url'] == f"/api/jobs/{job['id']}/result"
+
+        response = client.get(job['result_url'])
+        assert_response_success(response)
+        assert response.mimetype == 'text/csv'
+        assert 'attachment' in response.headers['Content-Disposition']
+        assert b'Test Vehicle' in response.data
+        response.close()
+
+    def test_get_job(self, client):
+        """Test a job can be polled by id."""
+        job = assert_accepted(client.post('/api/jobs/export_csv'))
+        response = client.get(f"/api/jobs/{job['id']}")
+        assert_response_success(response)
+        data = response.get_json()
+        assert data['status'] == 'succeeded'
+        assert data['started_at'] and data['finished_at']
+
+    def test_list_jobs(self, client):
+        """Test recent jobs are listed newest first and filter by status."""
+        first = assert_accepted(client.post('/api/jobs/export_csv'))
+        second = assert_accepted(client.post('/api/jobs/purge_test_data'))
+        jobs = client.get('/api/jobs').get_json()
+        assert [job['id'] for job in jobs] == [second['id'], first['id']]
+        assert client.get('/api/jobs?status=failed').get_json() == []
+
+    def test_unknown_kind(self, client):
+        """Test an unknown job kind returns 404."""
+        assert_response_not_found(client.post('/api/jobs/reticulate'))
+
+    def test_missing_job(self, client):
+        """Test a missing job returns 404."""
+        assert_response_not_found(client.get('/api/jobs/99999'))
+        assert_response_not_found(client.get('/api/jobs/99999/result'))
+
+    def test_bad_input_creates_no_job(self, app, client):
+        """Test a rejected request leaves no job behind."""
+        from backend.models import Job
+
+        response = client.post('/api/jobs/import?chunk_size=0', json={'name': 'X'})
+        assert_response_bad_request(response)
+        with app.app_context():
+            assert Job.query.count() == 0
+
+
+class TestAsyncRoutes:
+    """Tests for heavy routes enqueuing themselves with ?async=1."""
+
+    def test_async_import(self, client):
+        """Test an async JSON import creates the vehicle and reports where."""
+        import_data = {
+            'vehicle': {'name': 'Queued'},
+            'costs': [{'date': '2024-01-01', 'amount': 10.0}, {'date': '2024-02-01', 'amount': 20.0}],
+        }
+        job = assert_accepted(client.post('/api/vehicles/import?async=1', json=import_data))
+        assert job['status'] == 'succeeded'
+        assert job['total'] == job['processed'] == 3
+        vehicle_id = job['result']['vehicle_id']
+        assert job['result']['location'] == f'/api/vehicles/{vehicle_id}'
+        assert job['result']['imported']['sections']['costs']['count'] == 2
+        assert client.get(f'/api/vehicles/{vehicle_id}').get_json()['name'] == 'Queued'
+
+    def test_async_ndjson_import(self, client):
+        """Test an NDJSON body is stored and imported by the job."""
+        body = '{"type":"vehicle","record":{"name":"Streamed"}}\n{"type":"notes","record":{"title":"Hi"}}\n'
+        job = assert_accepted(client.post('/api/jobs/import', data=body, content_type='application/x-ndjson'))
+        assert job['status'] == 'succeeded'
+        assert job['result']['imported']['sections']['notes']['count'] == 1
+
+    def test_failed_import(self, app, client):
+        """Test a bad import marks the job failed and keeps nothing."""
+        from backend.models import Vehicle
+
+        body = '{"type":"vehicle","record":{"name":"Broken"}}\nnot json\n'
+        job = assert_accepted(client.post('/api/vehicles/import?async=1', data=body,
+                                          content_type='application/x-ndjson'))
+        assert job['status'] == 'failed'
+        assert 'Line 2' in job['error']
+        with app.app_context():
+            assert Vehicle.query.filter_by(name='Broken').count() == 0
+
+    def test_async_export(self, client, test_vehicle):
+        """Test /settings/export?async=1 enqueues a CSV export."""
+        job = assert_accepted(client.get('/api/settings/export?async=1'))
+        assert job['kind'] == 'export_csv'
+        assert job['result']['filename'].startswith('muttlogbook_export_')
+
+    def test_async_purge(self, client, test_key):
+        """Test DELETE /settings/test-data?async=1 reports the deleted counts."""
+        client.post('/api/vehicles', json={'name': 'Throwaway'})
+        job = assert_accepted(client.delete('/api/settings/test-data?async=1'))
+        assert job['status'] == 'succeeded'
+        assert 'total' in job['result']['deleted']
+
+
+@pytest.fixture
+def slow_job(monkeypatch):
+    """Register a job kind that reports progress over ten steps."""
+    from backend import jobs
+
+    calls = []
+
+    def handler(ctx, params):
+        for step in range(10):
+            calls.append(step)
+            if params.get('cancel_at') == step:
+                from backend.extensions import db
+                from backend.models import Job
+                with db.engine.begin() as conn:
+                    conn.execute(Job.__table__.update().values(cancel_requested=True))
+            ctx.progress(step, 10, force=True)
+        return {'steps': len(calls)}
+
+    def prepare(request, workdir):
+        return (request.get_json(silent=True) if request else None) or {}
+
+    monkeypatch.setitem(jobs.JOB_KINDS, 'slow', (handler, prepare))
+    return calls
+
+
+class TestJobLifecycle:
+    """Tests for cancellation, restarts and the thread pool."""
+
+    def test_progress_and_eta(self, app):
+        """Test progress and ETA are derived from processed/total."""
+        from datetime import datetime, timedelta
+        from backend.jobs import serialize_job
+        from backend.models import Job
+
+        started = datetime(2024, 1, 1, 12, 0, 0)
+        job = Job(id=1, kind='slow', status='running', processed=25, total=100, cancel_requested=False,
+                  started_at=started, updated_at=started + timedelta(seconds=10))
+        data = serialize_job(job)
+        assert data['progress'] == 0.25
+        assert data['eta_seconds'] == 30.0
+
+    def test_cancel_running_job(self, client, slow_job):
+        """Test a running job stops at its next progress report."""
+        job = assert_accepted(client.post('/api/jobs/slow', json={'cancel_at': 3}))
+        assert job['status'] == 'cancelled'
+        assert slow_job == [0, 1, 2, 3]
+
+    def test_cancel_queued_job(self, app, client):
+        """Test a queued job is cancelled at once and never runs."""
+        from backend.extensions import db
+        from backend.models import Job
+
+        with app.app_context():
+            job = Job(kind='export_csv', status='queued')
+            db.session.add(job)
+            db.session.commit()
+            job_id = job.id
+
+        response = client.post(f'/api/jobs/{job_id}/cancel')
+        assert_response_success(response)
+        assert response.get_json()['status'] == 'cancelled'
+        assert_response_bad_request(client.post(f'/api/jobs/{job_id}/cancel'))
+
+    def test_recover_after_restart(self, app, slow_job):
+        """Test running jobs are failed and queued ones resubmitted on startup."""
+        from backend.extensions import db
+        from backend.jobs import get_job_runner
+        from backend.models import Job
+
+        with app.app_context():
+            db.session.add_all([
+                Job(kind='slow', status='running', params='{}'),
+                Job(kind='slow', status='queued', params='{}'),
+            ])
+            db.session.commit()
+
+            assert get_job_runner().recover() == (1, 1)
+            interrupted, requeued = Job.query.order_by(Job.id).all()
+            assert interrupted.status == 'failed'
+            assert interrupted.error == 'Interrupted by a restart'
+            assert requeued.status == 'succeeded'
+            assert json.loads(requeued.result) == {'steps': 10}
+
+    def test_recover_leaves_live_jobs(self, app, slow_job):
+        """Test a running job that another process still reports on is not failed."""
+        from datetime import timedelta
+        from backend.extensions import db
+        from backend.jobs import get_job_runner
+        from backend.models import Job, utc_now
+
+        with app.app_context():
+            db.session.add_all([
+                Job(kind='slow', status='running', params='{}', owner='other:1:live', heartbeat_at=utc_now()),
+                Job(kind='slow', status='running', params='{}', owner='other:2:gone',
+                    heartbeat_at=utc_now() - timedelta(hours=1)),
+            ])
+            db.session.commit()
+
+            assert get_job_runner().recover() == (1, 0)
+            assert [job.status for job in Job.query.order_by(Job.id)] == ['running', 'failed']
+
+    def test_recover_counts_only_submitted(self, app, slow_job):
+        """Test resubmission stops at the pending limit and reports what was submitted."""
+        from backend.extensions import db
+        from backend.jobs import get_job_runner
+        from backend.models import Job
+
+        with app.app_context():
+            db.session.add_all([Job(kind='slow', status='queued', params='{}') for _ in range(3)])
+            db.session.commit()
+            runner = get_job_runner()
+            runner.max_pending = 1
+            runner._pending = 1
+            assert runner.recover() == (0, 0)
+            runner._pending = 0
+            assert runner.recover() == (0, 3)
+
+    def test_job_row_created_with_params(self, app, monkeypatch):
+        """Test no job row exists while its input is prepared, and a failed prepare leaves nothing behind."""
+        from backend import jobs
+        from backend.models import Job
+
+        seen = []
+
+        def prepare(request, workdir):
+            seen.append(Job.query.count())
+            with open(os.path.join(workdir, 'input.txt'), 'w') as f:
+                f.write('data')
+            if request == 'bad':
+                raise ValueError('bad input')
+            return {'file': 'input.txt'}
+
+        def handler(ctx, params):
+            with open(os.path.join(ctx.workdir, params['file'])) as f:
+                return {'read': f.read()}
+
+        monkeypatch.setitem(jobs.JOB_KINDS, 'staged', (handler, prepare))
+        with app.app_context():
+            job = jobs.get_job_runner().enqueue('staged')
+            assert seen == [0]
+            assert json.loads(job.params) == {'file': 'input.txt'}
+            assert json.loads(job.result) == {'read': 'data'}
+
+            with pytest.raises(ValueError):
+                jobs.get_job_runner().enqueue('staged', 'bad')
+            assert Job.query.count() == 1
+            assert os.listdir(app.config['JOBS_DIR']) == [str(job.id)]
+
+    def test_expired_job_files_removed(self, app, client, test_vehicle):
+        """Test job directories go once the retention period has passed."""
+        from datetime import timedelta
+        from backend.extensions import db
+        from backend.jobs import get_job_runner
+        from backend.models import Job, utc_now
+
+        old = assert_accepted(client.post('/api/jobs/export_csv'))['id']
+        recent = assert_accepted(client.post('/api/jobs/export_csv'))['id']
+        with app.app_context():
+            db.session.get(Job, old).finished_at = utc_now() - timedelta(days=30)
+            db.session.commit()
+            assert get_job_runner().purge_expired() == 1
+            assert db.session.get(Job, old).result_path is None
+        assert sorted(os.listdir(app.config['JOBS_DIR'])) == [str(recent)]
+        assert_response_not_found(client.get(f'/api/jobs/{old}/result'))
+        assert_response_success(client.get(f'/api/jobs/{recent}/result'))
+
+    def test_pending_limit(self, app, client, slow_job):
+        """Test the runner refuses work beyond JOBS_MAX_PENDING."""
+        from backend.jobs import get_job_runner
+
+        with app.app_context():
+            runner = get_job_runner()
+            runner.max_pending = 1
+            runner._pending = 1
+        response = client.post('/api/jobs/slow', json={})
+        assert response.status_code == 503
+
+    def test_thread_pool_runs_job(self, app, slow_job):
+        """Test jobs run on a worker thread when not inline."""
+        from backend.jobs import JobRunner
+        from backend.models import Job
+
+        with app.app_context():
+            runner = JobRunner(app, app.config['JOBS_DIR'], max_workers=1)
+            job = runner.enqueue('slow')
+            assert job.status == 'queued'
+            runner.shutdown(wait=True)
+
+            from backend.extensions import db
+            db.session.expire_all()
+            assert db.session.get(Job, job.id).status == 'succeeded'
+            assert runner._pending == 0
@@ -0,0 +1,173 @@
+"""
+Tests for the schema migration runner.
+
+Covers version tracking, index creation on existing databases, idempotent
+re-runs and the batched column backfill helper.
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, text
+from backend.extensions import db
+from backend.search import drop_search_index
+from backend.migrations import (
+    MigrationContext, run_migrations, current_version, pending_migrations, discover_migrations
+)
+
+
+@pytest.fixture(scope='function')
+def legacy_engine(tmp_path):
+    """Create a file database with the current tables but none of the added indexes."""
+    engine = create_engine(f'sqlite:///{tmp_path / "legacy.db"}')
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        names = [row[0] for row in conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_%' "
+            "AND name NOT LIKE '%test_key'"
+        ))]
+        for name in names:
+            conn.execute(text(f'DROP INDEX "{name}"'))
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine):
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+
+
+class TestMigrationRunner:
+    """Tests for applying migrations."""
+
+    def test_migrations_are_numbered_in_order(self):
+        """Test that discovered migrations have unique ascending versions."""
+        versions = [version for version, _, _ in discover_migrations()]
+        assert versions == sorted(set(versions))
+        assert versions[0] == 1
+
+    def test_new_database_starts_at_version_zero(self, legacy_engine):
+        """Test that an unmigrated database reports version 0."""
+        assert current_version(legacy_engine) == 0
+        assert len(pending_migrations(legacy_engine)) == len(discover_migrations())
+
+    def test_run_creates_indexes_and_records_version(self, legacy_engine):
+        """Test that running migrations builds missing indexes on existing tables."""
+        assert 'ix_maintenance_vehicle_date' not in index_names(legacy_engine)
+
+        applied = run_migrations(legacy_engine)
+
+        assert applied == [version for version, _, _ in discover_migrations()]
+        assert current_version(legacy_engine) == applied[-1]
+        indexes = index_names(legacy_engine)
+        assert 'ix_maintenance_vehicle_date' in indexes
+        assert 'ix_mods_vehicle_date_unplanned' in indexes
+        assert 'ix_vcds_faults_vehicle_active' in indexes
+
+    def test_run_is_idempotent(self, legacy_engine):
+        """Test that a second run applies nothing."""
+        run_migrations(legacy_engine)
+        assert run_migrations(legacy_engine) == []
+        assert pending_migrations(legacy_engine) == []
+
+    def test_target_stops_early(self, legacy_engine):
+        """Test that target limits which migrations are applied."""
+        assert run_migrations(legacy_engine, target=0) == []
+        assert current_version(legacy_engine) == 0
+
+
+class TestMigrationContext:
+    """Tests for the online schema change helpers."""
+
+    def test_create_index_skips_existing(self, legacy_engine):
+        """Test create_index only builds an index once."""
+        ctx = MigrationContext(legacy_engine)
+        assert ctx.create_index('ix_notes_vehicle_date', 'notes', ['vehicle_id', 'date']) is True
+        assert ctx.create_index('ix_notes_vehicle_date', 'notes', ['vehicle_id', 'date']) is False
+
+    def test_add_column_and_backfill_in_batches(self, legacy_engine):
+        """Test a derived column is added and filled across several batches."""
+        with legacy_engine.begin() as conn:
+            conn.execute(text("INSERT INTO vehicles (id, name) VALUES (1, 'Batch')"))
+            for day in range(1, 26):
+                conn.execute(
+                    text("INSERT INTO costs (vehicle_id, date, amount) VALUES (1, :date, 10)"),
+                    {'date': f'2024-01-{day:02d}'}
+                )
+
+        ctx = MigrationContext(legacy_engine, batch_size=10)
+        assert ctx.add_column('costs', 'year_month', 'VARCHAR(7)') is True
+        assert ctx.add_column('costs', 'year_month', 'VARCHAR(7)') is False
+
+        updated = ctx.backfill('costs', "year_month = substr(date, 1, 7)", where='year_month IS NULL')
+
+        assert updated == 25
+        with legacy_engine.connect() as conn:
+            months = conn.execute(text('SELECT DISTINCT year_month FROM costs')).fetchall()
+        assert months == [('2024-01',)]
+
+    def test_replace_index_rebuilds_changed_columns(self, legacy_engine):
+        """Test replace_index rebuilds an index with an outdated column list only once."""
+        ctx = MigrationContext(legacy_engine)
+        ctx.create_index('ix_costs_vehicle_date', 'costs', ['vehicle_id', 'date', 'amount'])
+
+        assert ctx.replace_index('ix_costs_vehicle_date', 'costs', ['vehicle_id', 'date', 'id', 'amount']) is True
+        assert ctx.index_columns('ix_costs_vehicle_date') == ['vehicle_id', 'date', 'id', 'amount']
+        assert ctx.replace_index('ix_costs_vehicle_date', 'costs', ['vehicle_id', 'date', 'id', 'amount']) is False
+
+    def test_vcds_duplicates_removed_before_unique_index(self, legacy_engine):
+        """Test duplicate active faults are collapsed to the first row."""
+        with legacy_engine.begin() as conn:
+            conn.execute(text("INSERT INTO vehicles (id, name) VALUES (1, 'Dupes')"))
+            for status in ('active', 'active', 'active', 'cleared'):
+                conn.execute(text(
+                    "INSERT INTO vcds_faults (vehicle_id, address, fault_code, status) "
+                    "VALUES (1, '01', '16706', :status)"
+                ), {'status': status})
+            conn.execute(text("INSERT INTO vcds_faults (vehicle_id, status) VALUES (1, 'active'), (1, 'active')"))
+
+        run_migrations(legacy_engine)
+
+        with legacy_engine.connect() as conn:
+            rows = conn.execute(text('SELECT id, status FROM vcds_faults ORDER BY id')).fetchall()
+        assert rows == [(1, 'active'), (4, 'cleared'), (5, 'active'), (6, 'active')]
+        assert 'ix_vcds_faults_active_key' in index_names(legacy_engine)
+
+    def test_fault_code_dictionary_seeded_and_backfilled(self, legacy_engine):
+        """Test the dictionary gets the bundled codes and those of existing faults."""
+        with legacy_engine.begin() as conn:
+            conn.execute(text("INSERT INTO vehicles (id, name) VALUES (1, 'Scan')"))
+            conn.execute(text(
+                "INSERT INTO vcds_faults (vehicle_id, address, fault_code, description, status) "
+                "VALUES (1, '46', '01331', 'Door Control Module', 'cleared')"
+            ))
+
+        run_migrations(legacy_engine)
+
+        with legacy_engine.connect() as conn:
+            rows = dict(conn.execute(text(
+                "SELECT code || '/' || address, description FROM fault_codes WHERE code IN ('01331', '16706')"
+            )).fetchall())
+        assert rows == {
+            '01331/46': 'Door Control Module',
+            '01331/': 'Door Control Module',
+            '16706/': 'Engine Speed Sensor (G28): No Signal (P0322)',
+        }
+
+    def test_search_index_built_for_existing_rows(self, legacy_engine):
+        """Test the search index and its triggers are added and filled for existing records."""
+        with legacy_engine.begin() as conn:
+            drop_search_index(conn)
+            conn.execute(text("INSERT INTO vehicles (id, name) VALUES (1, 'Search')"))
+            conn.execute(text("INSERT INTO notes (vehicle_id, title, content) VALUES (1, 'Chain', 'Timing chain rattle')"))
+
+        run_migrations(legacy_engine)
+
+        with legacy_engine.begin() as conn:
+            conn.execute(text("INSERT INTO notes (vehicle_id, title, content) VALUES (1, 'Later', 'New timing chain')"))
+            rows = conn.execute(text(
+                "SELECT entity, title FROM search_index WHERE search_index MATCH 'timing' ORDER BY rowid"
+            )).fetchall()
+        assert rows == [('note', 'Chain'), ('note', 'Later')]
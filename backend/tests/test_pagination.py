@@ -0,0 +1,123 @@
+"""
+Tests for keyset pagination on list endpoints.
+
+Covers walking pages with next_cursor, tie-breaking on equal dates,
+undated records, bad limits and cursors, and the unpaged legacy response.
+"""
+import pytest
+import sys
+import os
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.extensions import db
+from backend.models import Vehicle, Maintenance, Cost, ServiceDocument
+from backend.pagination import MAX_PAGE_SIZE, encode_cursor, decode_cursor
+from backend.tests.helpers import assert_response_success, assert_response_bad_request
+
+
+def walk(client, url, limit):
+    """Follow next_cursor until exhausted, returning every item and the page count."""
+    items, pages, cursor = [], 0, None
+    while True:
+        page_url = f'{url}&limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(page_url)
+        assert_response_success(response)
+        data = response.get_json()
+        items.extend(data['items'])
+        pages += 1
+        cursor = data['next_cursor']
+        if not cursor:
+            return items, pages
+
+
+@pytest.fixture
+def many_costs(app, test_vehicle):
+    """Twelve costs, several sharing a date and two without one."""
+    with app.app_context():
+        dates = [date(2024, 1, d) for d in (1, 1, 1, 2, 3, 3, 4, 5, 6, 7)] + [None, None]
+        db.session.add_all([
+            Cost(vehicle_id=test_vehicle, date=d, amount=float(i)) for i, d in enumerate(dates)
+        ])
+        db.session.commit()
+    return test_vehicle
+
+
+class TestKeysetPagination:
+    """Tests for limit/cursor paging."""
+
+    def test_pages_cover_every_row_once_in_order(self, client, many_costs):
+        """Test that walking pages yields the same rows as the unpaged list."""
+        items, pages = walk(client, f'/api/costs?vehicle_id={many_costs}', 5)
+
+        assert pages == 3
+        ids = [item['id'] for item in items]
+        assert len(ids) == len(set(ids)) == 12
+        keys = [(item['date'] or '', item['id']) for item in items]
+        assert [k for k in keys if k[0]] == sorted([k for k in keys if k[0]], reverse=True)
+        assert [item['date'] for item in items[-2:]] == [None, None]
+
+    def test_last_page_has_no_cursor(self, client, many_costs):
+        """Test next_cursor is null when everything fits in one page."""
+        data = client.get(f'/api/costs?vehicle_id={many_costs}&limit=50').get_json()
+        assert len(data['items']) == 12
+        assert data['next_cursor'] is None
+
+    def test_unpaged_request_returns_list(self, client, many_costs):
+        """Test that requests without limit or cursor keep the plain list response."""
+        data = client.get(f'/api/costs?vehicle_id={many_costs}').get_json()
+        assert isinstance(data, list)
+        assert len(data) == 12
+
+    def test_vehicles_page_by_id(self, client, app):
+        """Test vehicles without a date column page in id order."""
+        with app.app_context():
+            db.session.add_all([Vehicle(name=f'Car {i}') for i in range(7)])
+            db.session.commit()
+
+        items, pages = walk(client, '/api/vehicles?', 3)
+        ids = [item['id'] for item in items]
+        assert ids == sorted(ids)
+        assert len(ids) == 7
+        assert pages == 3
+
+    def test_datetime_sort_column(self, client, app, test_vehicle):
+        """Test paging documents ordered by their upload timestamp."""
+        from datetime import datetime
+        with app.app_context():
+            db.session.add_all([
+                ServiceDocument(vehicle_id=test_vehicle, title=f'Doc {i}', filename=f'{i}.pdf',
+                                uploaded_at=datetime(2024, 1, 1, 12, i))
+                for i in range(5)
+            ])
+            db.session.commit()
+
+        items, _ = walk(client, f'/api/documents?vehicle_id={test_vehicle}', 2)
+        assert [item['title'] for item in items] == [f'Doc {i}' for i in range(4, -1, -1)]
+
+    def test_maintenance_paging(self, client, test_vehicle, multiple_maintenance_records):
+        """Test paging another resource with the shared helper."""
+        unpaged = client.get(f'/api/maintenance?vehicle_id={test_vehicle}').get_json()
+        items, _ = walk(client, f'/api/maintenance?vehicle_id={test_vehicle}', 2)
+        assert sorted(i['id'] for i in items) == sorted(i['id'] for i in unpaged)
+
+    @pytest.mark.parametrize('limit', ['0', '-1', 'abc', str(MAX_PAGE_SIZE + 1)])
+    def test_invalid_limit(self, client, test_vehicle, limit):
+        """Test out-of-range and non-numeric limits are rejected."""
+        response = client.get(f'/api/costs?vehicle_id={test_vehicle}&limit={limit}')
+        assert_response_bad_request(response)
+
+    def test_invalid_cursor(self, client, test_vehicle):
+        """Test a malformed cursor is rejected."""
+        response = client.get(f'/api/costs?vehicle_id={test_vehicle}&cursor=not-a-cursor')
+        assert_response_bad_request(response)
+
+    def test_cursor_round_trip(self):
+        """Test cursors decode back to the typed sort value and id."""
+        cursor = encode_cursor(date(2024, 3, 1), 42)
+        assert decode_cursor(cursor, Maintenance.date) == (date(2024, 3, 1), 42)
+        assert decode_cursor(encode_cursor(None, 7), Maintenance.date) == (None, 7)
+        assert decode_cursor(encode_cursor(-1.5, 9)) == (-1.5, 9)
+        with pytest.raises(ValueError):
+            decode_cursor(encode_cursor(-1.5, 9), Maintenance.date)
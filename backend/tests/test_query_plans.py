@@ -0,0 +1,135 @@
+"""
+Tests for query plans of hot queries.
+
+Runs EXPLAIN QUERY PLAN against the per-vehicle list, timeline and dashboard
+queries and checks they are served from an index instead of a table scan.
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.extensions import db
+from backend.models import (
+    Maintenance, Mod, Cost, Note, VCDSFault, FuelEntry, Reminder, Receipt, ServiceDocument
+)
+
+
+def explain(query):
+    """Return the EXPLAIN QUERY PLAN detail lines for an ORM query."""
+    compiled = query.statement.compile(db.engine)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params)
+    return [row[3] for row in rows]
+
+
+def assert_index_search(plan, index_name, covering=False):
+    """Assert the plan searches the given index without scanning or sorting."""
+    detail = ' | '.join(plan)
+    assert not any(line.startswith('SCAN') for line in plan), detail
+    assert 'TEMP B-TREE' not in detail, detail
+    expected = f"USING COVERING INDEX {index_name}" if covering else f"INDEX {index_name}"
+    assert expected in detail, detail
+
+
+class TestListQueryPlans:
+    """Per-vehicle list endpoints must search an index and avoid sorting."""
+
+    @pytest.mark.parametrize('model,order_column,index_name', [
+        (Maintenance, 'date', 'ix_maintenance_vehicle_date'),
+        (Mod, 'date', 'ix_mods_vehicle_date'),
+        (Cost, 'date', 'ix_costs_vehicle_date'),
+        (Note, 'date', 'ix_notes_vehicle_date'),
+        (VCDSFault, 'detected_date', 'ix_vcds_faults_vehicle_detected'),
+        (FuelEntry, 'date', 'ix_fuel_entries_vehicle_date'),
+        (Receipt, 'date', 'ix_receipts_vehicle_date'),
+        (ServiceDocument, 'uploaded_at', 'ix_service_documents_vehicle_uploaded'),
+    ])
+    def test_list_by_vehicle_uses_index(self, app, model, order_column, index_name):
+        """Test list queries filter and order through the per-vehicle index."""
+        with app.app_context():
+            query = model.query.filter_by(vehicle_id=1).order_by(getattr(model, order_column).desc())
+            assert_index_search(explain(query), index_name)
+
+    @pytest.mark.parametrize('model,index_name', [
+        (Maintenance, 'ix_maintenance_vehicle_date'),
+        (Cost, 'ix_costs_vehicle_date'),
+        (FuelEntry, 'ix_fuel_entries_vehicle_date'),
+        (Note, 'ix_notes_vehicle_date'),
+    ])
+    def test_keyset_page_uses_index(self, app, model, index_name):
+        """Test a cursor page is read in (date, id) order from the index without a sort."""
+        from datetime import date
+        from backend.pagination import encode_cursor, keyset_query
+        with app.app_context():
+            query = keyset_query(
+                model.query.filter_by(vehicle_id=1), model.id,
+                encode_cursor(date(2024, 1, 1), 10), sort_column=model.date
+            ).limit(51)
+            assert_index_search(explain(query), index_name)
+
+    def test_reminders_by_vehicle_uses_index(self, app):
+        """Test reminders lookup uses the vehicle index."""
+        with app.app_context():
+            assert_index_search(explain(Reminder.query.filter_by(vehicle_id=1)), 'ix_reminders_vehicle')
+
+    def test_receipts_by_maintenance_uses_index(self, app):
+        """Test receipts lookup by maintenance record uses its index."""
+        with app.app_context():
+            query = Receipt.query.filter_by(maintenance_id=1)
+            assert_index_search(explain(query), 'ix_receipts_maintenance')
+
+
+class TestTimelineQueryPlans:
+    """Timeline lookups must use the category index."""
+
+    def test_last_service_by_category_uses_index(self, app):
+        """Test the last-service lookup searches by vehicle and category."""
+        with app.app_context():
+            query = Maintenance.query.filter_by(
+                vehicle_id=1, category='oil_change'
+            ).order_by(Maintenance.date.desc()).limit(1)
+            assert_index_search(explain(query), 'ix_maintenance_vehicle_category_date')
+
+    def test_costs_by_category_uses_index(self, app):
+        """Test cost lookups by category search the category index."""
+        with app.app_context():
+            query = Cost.query.filter_by(vehicle_id=1, category='insurance').order_by(Cost.date.desc())
+            assert_index_search(explain(query), 'ix_costs_vehicle_category_date')
+
+
+class TestDashboardQueryPlans:
+    """Dashboard aggregates must be answered from covering indexes."""
+
+    def test_maintenance_total_is_covered(self, app):
+        """Test the maintenance SUM reads only the index."""
+        with app.app_context():
+            query = db.session.query(db.func.sum(Maintenance.cost)).filter(Maintenance.vehicle_id == 1)
+            assert_index_search(explain(query), 'ix_maintenance_vehicle_date', covering=True)
+
+    def test_mods_total_uses_partial_index(self, app):
+        """Test the mods SUM excluding planned mods reads the partial index."""
+        with app.app_context():
+            query = db.session.query(db.func.sum(Mod.cost)).filter(
+                Mod.vehicle_id == 1, Mod.status != 'planned'
+            )
+            assert_index_search(explain(query), 'ix_mods_vehicle_date_unplanned', covering=True)
+
+    def test_costs_total_is_covered(self, app):
+        """Test the costs SUM reads only the index."""
+        with app.app_context():
+            query = db.session.query(db.func.sum(Cost.amount)).filter(Cost.vehicle_id == 1)
+            assert_index_search(explain(query), 'ix_costs_vehicle_date', covering=True)
+
+    def test_fuel_total_is_covered(self, app):
+        """Test the fuel SUM reads only the index."""
+        with app.app_context():
+            query = db.session.query(db.func.sum(FuelEntry.total_cost)).filter(FuelEntry.vehicle_id == 1)
+            assert_index_search(explain(query), 'ix_fuel_entries_vehicle_date', covering=True)
+
+    def test_active_faults_count_uses_partial_index(self, app):
+        """Test the active fault count reads the partial index."""
+        with app.app_context():
+            query = VCDSFault.query.filter_by(vehicle_id=1, status='active').with_entities(db.func.count())
+            assert_index_search(explain(query), 'ix_vcds_faults_vehicle_active', covering=True)
@@ -355,6 +355,20 @@ class TestDashboard:
         assert data['other_costs'] == 50.0
         assert data['total_spent'] == 350.0
 
+    def test_dashboard_includes_fuel_when_enabled(self, client, test_vehicle, sample_fuel_entry):
+        """Test dashboard sums fuel total_cost when fuel spend is enabled."""
+        client.put('/api/settings', json={
+            'key': 'total_spend_include_fuel',
+            'value': 'true',
+            'value_type': 'boolean'
+        })
+
+        response = client.get(f'/api/dashboard?vehicle_id={test_vehicle}')
+        assert_response_success(response)
+        data = response.get_json()
+        assert data['fuel_cost'] == 43.75
+        assert data['total_spent'] == 43.75
+
 
 class TestAnalytics:
     """Tests for Analytics endpoint."""
@@ -405,6 +419,47 @@ class TestAnalytics:
         data = response.get_json()
         assert data['total_spent'] == 100.0
 
+    def test_analytics_date_filter_with_category(self, client, test_vehicle, multiple_maintenance_records, multiple_mods):
+        """Test date range and category filters are combined."""
+        response = client.get(
+            f'/api/analytics?vehicle_id={test_vehicle}&start_date=2023-06-01&end_date=2024-12-31&category=oil_change'
+        )
+        assert_response_success(response)
+        data = response.get_json()
+        assert data['monthly_spending'] == {'2023-07': 55.0, '2024-01': 60.0}
+        assert data['category_spending'] == {'oil_change': 115.0}
+
+    def test_analytics_date_filter_excludes_planned_mods(self, client, test_vehicle, multiple_mods):
+        """Test planned mods are left out of date-ranged totals."""
+        response = client.get(
+            f'/api/analytics?vehicle_id={test_vehicle}&start_date=2024-01-01&end_date=2024-12-31'
+        )
+        data = response.get_json()
+        assert data['total_spent'] == 800.0
+        assert data['category_spending'] == {}
+
+    def test_analytics_date_filter_includes_fuel(self, client, test_vehicle, sample_fuel_entry, sample_cost):
+        """Test fuel is bucketed when enabled and dropped by other categories."""
+        client.put('/api/settings', json={
+            'key': 'total_spend_include_fuel', 'value': 'true', 'value_type': 'boolean'
+        })
+        url = f'/api/analytics?vehicle_id={test_vehicle}&start_date=2024-01-01&end_date=2024-01-31'
+
+        data = client.get(url).get_json()
+        assert data['category_spending'] == {'fuel': 43.75, 'insurance': 500.0}
+
+        data = client.get(f'{url}&category=insurance').get_json()
+        assert data['category_spending'] == {'insurance': 500.0}
+
+    def test_analytics_full_range_matches_unfiltered(self, client, test_vehicle, multiple_maintenance_records, multiple_costs):
+        """Test the grouped range query agrees with the unfiltered result."""
+        unfiltered = client.get(f'/api/analytics?vehicle_id={test_vehicle}').get_json()
+        ranged = client.get(
+            f'/api/analytics?vehicle_id={test_vehicle}&start_date=2000-01-01&end_date=2099-12-31'
+        ).get_json()
+        assert ranged['monthly_spending'] == unfiltered['monthly_spending']
+        assert ranged['category_spending'] == unfiltered['category_spending']
+
 
 class TestFuelEntries:
     """Tests for Fuel entry endpoints."""
@@ -511,7 +566,32 @@ class TestValidation:
             'vehicle_id': 99999,
             'date': '2024-01-01'
         })
-        assert response.status_code == 201
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize('path, body', [
+        ('/api/mods', {}),
+        ('/api/costs', {'amount': 10.0}),
+        ('/api/notes', {'title': 'Note'}),
+        ('/api/vcds', {'address': '01', 'fault_code': '16706'}),
+        ('/api/guides', {'title': 'Guide'}),
+        ('/api/vehicle-photos', {'filename': 'photo.jpg'}),
+        ('/api/fuel', {'gallons': 10}),
+        ('/api/reminders', {'type': 'oil_change'}),
+        ('/api/receipts', {'vendor': 'Garage'}),
+    ])
+    def test_unknown_vehicle_on_create(self, client, path, body):
+        """Test every vehicle-scoped create answers 404 for a vehicle that doesn't exist."""
+        response = client.post(path, json={'vehicle_id': 99999, **body})
+        assert_response_not_found(response)
+
+    def test_unknown_parent_on_update(self, client, test_vehicle, sample_receipt):
+        """Test moving a guide or receipt to a missing vehicle or service record answers 404."""
+        guide = client.post('/api/guides', json={'title': 'Guide', 'vehicle_id': test_vehicle}).get_json()['id']
+        assert_response_not_found(client.put(f'/api/guides/{guide}', json={'vehicle_id': 99999}))
+        assert_response_not_found(client.put(f'/api/receipts/{sample_receipt}', json={'maintenance_id': 99999}))
+        assert_response_not_found(client.post('/api/receipts', json={
+            'vehicle_id': test_vehicle, 'maintenance_id': 99999
+        }))
 
     def test_invalid_date_format(self, client, test_vehicle):
         """Test that invalid date format is handled."""
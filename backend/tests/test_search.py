@@ -0,0 +1,149 @@
+"""
+Tests for full-text search.
+
+Covers ranking and highlighting across entity types, vehicle and type
+filters, keeping the index in step with writes, paging and rebuilding.
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import text
+from backend.extensions import db
+from backend.models import ServiceDocument
+from backend.pagination import encode_cursor
+from backend.search import rebuild_search_index
+from backend.tests.helpers import (
+    assert_response_success, assert_response_bad_request, create_test_note, create_test_mod
+)
+
+
+def search(client, query, **params):
+    response = client.get('/api/search', query_string={'q': query, **params})
+    assert_response_success(response)
+    return response.get_json()
+
+
+def hits(client, query, **params):
+    return [(item['entity'], item['id']) for item in search(client, query, **params)['items']]
+
+
+class TestSearch:
+    """Tests for /search."""
+
+    def test_matches_across_entities(self, client, app, test_vehicle):
+        """Test notes, maintenance, mods, guides and documents are all searched."""
+        note = create_test_note(client, test_vehicle, title='Cold start', content='Timing chain rattle for two seconds')
+        maintenance = client.post('/api/maintenance', json={
+            'vehicle_id': test_vehicle, 'date': '2024-03-01', 'category': 'engine',
+            'description': 'Replaced timing chain and tensioner'
+        }).get_json()['id']
+        mod = create_test_mod(client, test_vehicle, description='Uprated timing chain tensioner')
+        guide = client.post('/api/guides', json={'title': 'Timing chain check', 'content': 'Listen at idle'}).get_json()['id']
+        with app.app_context():
+            document = ServiceDocument(vehicle_id=test_vehicle, title='Timing chain invoice')
+            db.session.add(document)
+            db.session.commit()
+            document = document.id
+
+        found = hits(client, 'timing chain')
+        assert set(found) == {
+            ('note', note), ('maintenance', maintenance), ('mod', mod), ('guide', guide), ('document', document)
+        }
+        # Title matches rank above body matches.
+        assert set(found[:2]) == {('guide', guide), ('document', document)}
+
+    def test_highlighted_and_escaped(self, client, test_vehicle):
+        """Test matched terms are marked and stored markup is escaped."""
+        create_test_note(client, test_vehicle, title='Chains', content='<b>Timing</b> chains replaced')
+        item = search(client, 'chain')['items'][0]
+        assert item['title'] == '<mark>Chains</mark>'
+        assert item['snippet'] == '&lt;b&gt;Timing&lt;/b&gt; <mark>chains</mark> replaced'
+        assert item['vehicle_id'] == test_vehicle
+
+    def test_vehicle_and_type_filters(self, client, test_vehicle, test_vehicle_2):
+        """Test vehicle_id keeps shared guides, and type narrows the entities."""
+        mine = create_test_note(client, test_vehicle, content='coolant leak')
+        create_test_note(client, test_vehicle_2, content='coolant leak')
+        shared = client.post('/api/guides', json={'title': 'Coolant', 'content': 'Check for a leak'}).get_json()['id']
+
+        assert set(hits(client, 'coolant leak', vehicle_id=test_vehicle)) == {('note', mine), ('guide', shared)}
+        assert hits(client, 'coolant leak', vehicle_id=test_vehicle, type='note') == [('note', mine)]
+
+    def test_query_syntax(self, client, test_vehicle):
+        """Test phrases, prefixes and stemming, with FTS operators treated as text."""
+        first = create_test_note(client, test_vehicle, content='oil pressure warning light')
+        second = create_test_note(client, test_vehicle, content='warning about oil')
+
+        assert set(hits(client, 'oil warnings')) == {('note', first), ('note', second)}
+        assert hits(client, '"oil pressure"') == [('note', first)]
+        assert hits(client, 'press*') == [('note', first)]
+        assert set(hits(client, 'oil: (warning -')) == {('note', first), ('note', second)}
+
+    def test_invalid_requests(self, client):
+        """Test missing or wordless queries, unknown types and bad cursors are rejected."""
+        assert_response_bad_request(client.get('/api/search'))
+        assert_response_bad_request(client.get('/api/search?q=%22*-'))
+        assert_response_bad_request(client.get('/api/search?q=oil&type=fuel'))
+        assert_response_bad_request(client.get('/api/search?q=oil&cursor=nope'))
+        for score in (None, 'high', True):
+            cursor = encode_cursor(score, 1)
+            assert_response_bad_request(client.get(f'/api/search?q=oil&cursor={cursor}'))
+        assert_response_bad_request(client.get('/api/search?q=oil&limit=0'))
+        assert_response_bad_request(client.get('/api/search?q=oil&vehicle_id=abc'))
+
+
+class TestSearchIndex:
+    """Tests for keeping the index current."""
+
+    def test_follows_updates_and_deletes(self, client, test_vehicle):
+        """Test records edited in bulk are reindexed and deleted ones dropped."""
+        note = create_test_note(client, test_vehicle, content='brake squeal')
+        client.patch('/api/notes/bulk', json={'records': [{'id': note, 'content': 'clutch judder'}]})
+        assert hits(client, 'brake') == []
+        assert hits(client, 'clutch') == [('note', note)]
+
+        client.delete(f'/api/notes/{note}')
+        assert hits(client, 'clutch') == []
+
+    def test_bulk_writes_and_vehicle_delete(self, client, test_vehicle):
+        """Test bulk inserts are indexed and a deleted vehicle's records leave the index."""
+        client.post('/api/notes/bulk', json={'records': [
+            {'vehicle_id': test_vehicle, 'title': f'Trip {n}', 'content': 'wheel bearing hum'} for n in range(3)
+        ]})
+        assert len(hits(client, 'bearing')) == 3
+
+        client.delete(f'/api/vehicles/{test_vehicle}')
+        assert hits(client, 'bearing') == []
+
+    def test_pages_through_ranked_hits(self, client, test_vehicle):
+        """Test the cursor walks every hit exactly once, best first."""
+        for n in range(7):
+            create_test_note(client, test_vehicle, title=f'Note {n}', content='turbo ' * (n + 1))
+        everything = hits(client, 'turbo', limit=50)
+
+        paged, cursor = [], None
+        while True:
+            page = search(client, 'turbo', limit=3, **({'cursor': cursor} if cursor else {}))
+            paged += [(item['entity'], item['id']) for item in page['items']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        assert paged == everything
+        assert len(paged) == 7
+
+    def test_rebuild(self, client, app, test_vehicle):
+        """Test rebuilding restores an emptied index."""
+        note = create_test_note(client, test_vehicle, content='sunroof drain')
+        with app.app_context():
+            db.session.execute(text('DELETE FROM search_index'))
+            db.session.commit()
+        assert hits(client, 'sunroof') == []
+
+        with app.app_context():
+            counts = rebuild_search_index(db.session.connection())
+            db.session.commit()
+        assert counts['note'] == 1
+        assert hits(client, 'sunroof') == [('note', note)]
@@ -205,3 +205,194 @@ class TestTestMode:
             'value_type': 'boolean'
         })
         assert_response_success(response)
+
+
+class TestSettingsCache:
+    """Tests for the in-process settings cache."""
+
+    def test_values_decoded_by_type(self, client):
+        """Test cached values are decoded according to value_type."""
+        from backend.settings_cache import get_settings_cache
+
+        client.put('/api/settings', json={'key': 'interval', 'value': 5000, 'value_type': 'number'})
+        client.put('/api/settings', json={'key': 'flag', 'value': 'true', 'value_type': 'boolean'})
+        client.put('/api/settings', json={'key': 'layout', 'value': {'a': 1}, 'value_type': 'json'})
+
+        with client.application.test_request_context():
+            cache = get_settings_cache()
+            assert cache.get('interval') == 5000.0
+            assert cache.get('flag') is True
+            assert cache.get('layout') == {'a': 1}
+            assert cache.get('missing', 'default') == 'default'
+
+    def test_rolled_back_batch_not_cached(self, client, app):
+        """Test settings written and read in a batch that rolls back never reach the shared cache."""
+        client.put('/api/settings', json={'key': 'theme', 'value': 'light'})
+        assert client.get('/api/settings').get_json()['theme'] == 'light'
+
+        response = client.post('/api/batch', json={'transaction': True, 'requests': [
+            {'method': 'PUT', 'path': '/settings', 'body': {'key': 'theme', 'value': 'dark'}},
+            {'path': '/settings'},
+            {'method': 'PUT', 'path': '/vehicles/99999', 'body': {'name': 'Ghost'}},
+        ]})
+        responses = response.get_json()['responses']
+        assert [r['status'] for r in responses] == [200, 200, 404]
+        assert responses[1]['body']['theme'] == 'dark'
+
+        entries = app.extensions['settings_cache']._entries
+        assert entries is None or entries['theme'][0] == 'light'
+        assert client.get('/api/settings').get_json()['theme'] == 'light'
+
+    def test_reads_within_request_do_not_requery(self, client, app):
+        """Test the settings table is queried once per request once warm."""
+        from sqlalchemy import event
+        from backend.extensions import db
+
+        client.put('/api/settings', json={'key': 'total_spend_include_fuel', 'value': 'true', 'value_type': 'boolean'})
+        client.get('/api/settings')
+
+        statements = []
+        with app.app_context():
+            engine = db.engine
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            response = client.get('/api/settings/test-mode')
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+
+        assert_response_success(response)
+        settings_queries = [s for s in statements if 'settings' in s]
+        assert len(settings_queries) == 1
+        assert 'COUNT(*)' in settings_queries[0]
+
+    def test_update_invalidates(self, client):
+        """Test writes through the API are visible on the next read."""
+        client.put('/api/settings', json={'key': 'theme', 'value': 'dark'})
+        assert client.get('/api/settings').get_json()['theme'] == 'dark'
+
+        client.put('/api/settings/theme', json={'value': 'light'})
+        assert client.get('/api/settings').get_json()['theme'] == 'light'
+
+        client.delete('/api/settings/theme')
+        assert 'theme' not in client.get('/api/settings').get_json()
+
+    def test_test_mode_invalidates(self, client):
+        """Test the test mode endpoints refresh cached flags."""
+        client.put('/api/settings/test-mode', json={'enabled': True, 'include_test_data': True})
+        data = client.get('/api/settings/test-mode').get_json()
+        assert data['enabled'] is True
+        assert data['include_test_data'] is True
+
+        key = client.post('/api/settings/test-key').get_json()['test_key']
+        assert client.get('/api/settings/test-mode').get_json()['test_key'] == key
+
+    def test_external_write_detected(self, client, app):
+        """Test a change made outside this process reloads the cache."""
+        from backend.extensions import db
+        from backend.settings_cache import get_settings_cache
+
+        client.put('/api/settings', json={'key': 'theme', 'value': 'dark'})
+        client.get('/api/settings')
+        version = app.extensions['settings_cache'].version
+
+        with app.app_context():
+            db.session.execute(db.text(
+                "UPDATE settings SET value = 'light', updated_at = '2099-01-01 00:00:00' WHERE key = 'theme'"
+            ))
+            db.session.commit()
+
+        assert client.get('/api/settings').get_json()['theme'] == 'light'
+        assert app.extensions['settings_cache'].version > version
+
+    def test_invalid_json_setting_falls_back(self, client, app, db_session):
+        """Test a malformed service_intervals value falls back to the defaults."""
+        from backend.models import Setting
+        from backend.routes import get_service_intervals, SERVICE_INTERVALS
+
+        with app.app_context():
+            db_session.add(Setting(key='service_intervals', value='{not json', value_type='json'))
+            db_session.commit()
+
+        with app.test_request_context():
+            assert get_service_intervals() == SERVICE_INTERVALS
+
+
+class TestSettingsBackup:
+    """Tests for the debounced settings backup writer."""
+
+    def test_burst_is_coalesced(self, client, app):
+        """Test several updates inside the delay produce a single write of the latest values."""
+        import json
+        from unittest import mock
+        from backend.settings_backup import get_settings_backup_writer, write_json_atomic
+
+        app.config['SETTINGS_BACKUP_DELAY'] = 60
+        with app.app_context():
+            writer = get_settings_backup_writer()
+
+        with mock.patch('backend.settings_backup.write_json_atomic', wraps=write_json_atomic) as write:
+            for value in ('one', 'two', 'three'):
+                client.put('/api/settings', json={'key': 'theme', 'value': value})
+
+            assert writer.pending
+            assert not os.path.exists(writer.path)
+            assert writer.flush() is True
+            assert writer.flush() is False
+
+        assert write.call_count == 1
+        with open(writer.path) as f:
+            assert json.load(f)['settings']['theme'] == 'three'
+        assert os.listdir(os.path.dirname(writer.path)) == ['settings.json']
+
+    def test_written_after_delay(self, client, app):
+        """Test the pending snapshot is written by the timer thread."""
+        import time
+        from backend.settings_backup import get_settings_backup_writer
+
+        app.config['SETTINGS_BACKUP_DELAY'] = 0.05
+        client.put('/api/settings', json={'key': 'theme', 'value': 'dark'})
+
+        with app.app_context():
+            writer = get_settings_backup_writer()
+        deadline = time.time() + 5
+        while writer.pending and time.time() < deadline:
+            time.sleep(0.02)
+
+        assert not writer.pending
+        assert os.path.exists(writer.path)
+
+    def test_shutdown_cancels_timer(self, client, app):
+        """Test a shut-down writer writes nothing once its timer would have fired."""
+        import time
+        from backend.settings_backup import get_settings_backup_writer, _writers
+
+        app.config['SETTINGS_BACKUP_DELAY'] = 0.05
+        client.put('/api/settings', json={'key': 'theme', 'value': 'dark'})
+        with app.app_context():
+            writer = get_settings_backup_writer()
+        assert writer in _writers
+
+        writer.shutdown(flush=False)
+        time.sleep(0.2)
+        assert not writer.pending
+        assert not os.path.exists(writer.path)
+        assert writer not in _writers
+
+    def test_status_reports_last_flush(self, client, app):
+        """Test the status endpoint exposes the last flush time."""
+        from backend.settings_backup import get_settings_backup_writer
+
+        app.config['SETTINGS_BACKUP_DELAY'] = 60
+        data = client.get('/api/settings/backup/status').get_json()
+        assert data['last_flushed_at'] is None
+        assert data['pending'] is False
+
+        client.put('/api/settings', json={'key': 'theme', 'value': 'dark'})
+        assert client.get('/api/settings/backup/status').get_json()['pending'] is True
+
+        with app.app_context():
+            get_settings_backup_writer().flush()
+        data = client.get('/api/settings/backup/status').get_json()
+        assert data['pending'] is False
+        assert data['last_flushed_at'] is not None
@@ -0,0 +1,183 @@
+"""
+Tests for the incrementally maintained spend rollup.
+
+Covers inserts, updates and deletes through the ORM, mod status changes,
+vehicle deletion, full rebuilds and the endpoints that read the rollup.
+"""
+import pytest
+import sys
+import os
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.extensions import db
+from backend.models import Vehicle, Maintenance, Mod, Cost, FuelEntry, SpendRollup
+from backend.rollups import rebuild_spend_rollup
+from backend.tests.helpers import assert_response_success
+
+
+def rollup_rows(vehicle_id):
+    rows = SpendRollup.query.filter_by(vehicle_id=vehicle_id).all()
+    return {(r.year_month, r.source, r.category): (r.total, r.record_count) for r in rows}
+
+
+class TestRollupMaintenance:
+    """Tests for keeping the rollup in step with ORM writes."""
+
+    def test_insert_adds_to_month(self, app, test_vehicle):
+        """Test that new records are added to their month and category."""
+        with app.app_context():
+            db.session.add_all([
+                Maintenance(vehicle_id=test_vehicle, date=date(2024, 1, 5), category='oil_change', cost=50.0),
+                Maintenance(vehicle_id=test_vehicle, date=date(2024, 1, 20), category='oil_change', cost=25.0),
+                Cost(vehicle_id=test_vehicle, date=date(2024, 2, 1), amount=10.0),
+                FuelEntry(vehicle_id=test_vehicle, date=date(2024, 2, 3), total_cost=40.0),
+            ])
+            db.session.commit()
+
+            rows = rollup_rows(test_vehicle)
+            assert rows[('2024-01', 'maintenance', 'oil_change')] == (75.0, 2)
+            assert rows[('2024-02', 'costs', '')] == (10.0, 1)
+            assert rows[('2024-02', 'fuel', 'fuel')] == (40.0, 1)
+
+    def test_update_moves_amount_between_months(self, app, test_vehicle, sample_maintenance):
+        """Test that changing date and cost moves the amount."""
+        with app.app_context():
+            record = db.session.get(Maintenance, sample_maintenance)
+            record.date = date(2024, 3, 1)
+            record.cost = 80.0
+            db.session.commit()
+
+            rows = rollup_rows(test_vehicle)
+            assert ('2024-01', 'maintenance', 'oil_change') not in rows
+            assert rows[('2024-03', 'maintenance', 'oil_change')] == (80.0, 1)
+
+    def test_update_of_unloaded_record_rebuilds(self, app, test_vehicle, sample_maintenance):
+        """Test that an update without the old value loaded still ends up correct."""
+        with app.app_context():
+            record = db.session.get(Maintenance, sample_maintenance)
+            db.session.expire(record)
+            record.cost = 99.0
+            db.session.commit()
+
+            assert rollup_rows(test_vehicle)[('2024-01', 'maintenance', 'oil_change')] == (99.0, 1)
+
+    def test_delete_removes_amount(self, app, test_vehicle, sample_maintenance):
+        """Test that deleting the only record in a bucket removes the bucket."""
+        with app.app_context():
+            db.session.delete(db.session.get(Maintenance, sample_maintenance))
+            db.session.commit()
+
+            assert rollup_rows(test_vehicle) == {}
+
+    def test_delete_of_unloaded_record_rebuilds_its_vehicle(self, app, test_vehicle, test_vehicle_2,
+                                                           sample_maintenance):
+        """Test that deleting an edited, unloaded record rebuilds only its vehicle's rollup."""
+        from sqlalchemy import event
+        with app.app_context():
+            db.session.add(Cost(vehicle_id=test_vehicle_2, date=date(2024, 1, 1), amount=5.0))
+            db.session.commit()
+            statements = []
+            listener = lambda conn, cursor, statement, *args: statements.append(statement)
+            event.listen(db.engine, 'before_cursor_execute', listener)
+            try:
+                record = db.session.get(Maintenance, sample_maintenance)
+                db.session.expire(record, ['cost'])
+                record.cost = 99.0
+                db.session.delete(record)
+                db.session.commit()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', listener)
+
+            assert rollup_rows(test_vehicle) == {}
+            assert rollup_rows(test_vehicle_2) == {('2024-01', 'costs', ''): (5.0, 1)}
+            assert 'DELETE FROM spend_rollup' not in statements
+            assert f'DELETE FROM spend_rollup WHERE vehicle_id IN ({test_vehicle})' in statements
+
+    def test_planned_mod_counts_once_completed(self, app, test_vehicle):
+        """Test that mods only count after leaving the planned status."""
+        with app.app_context():
+            mod = Mod(vehicle_id=test_vehicle, date=date(2024, 4, 1), category='engine', cost=300.0, status='planned')
+            db.session.add(mod)
+            db.session.commit()
+            assert rollup_rows(test_vehicle) == {}
+
+            mod.status = 'completed'
+            db.session.commit()
+            assert rollup_rows(test_vehicle)[('2024-04', 'mods', 'engine')] == (300.0, 1)
+
+    def test_vehicle_delete_clears_rollup(self, app, test_vehicle, sample_maintenance, sample_cost):
+        """Test that deleting a vehicle drops its rollup rows."""
+        with app.app_context():
+            db.session.delete(db.session.get(Vehicle, test_vehicle))
+            db.session.commit()
+
+            assert SpendRollup.query.count() == 0
+
+    def test_rebuild_matches_incremental(self, app, test_vehicle, multiple_maintenance_records, multiple_mods, multiple_costs):
+        """Test that a full rebuild produces the same rows as incremental upkeep."""
+        with app.app_context():
+            incremental = rollup_rows(test_vehicle)
+            rebuild_spend_rollup(db.session.connection())
+            db.session.commit()
+
+            assert rollup_rows(test_vehicle) == incremental
+
+
+class TestRollupEndpoints:
+    """Tests for endpoints reading the rollup."""
+
+    def test_dashboard_reflects_update_and_delete(self, client, test_vehicle):
+        """Test dashboard totals after editing and deleting records."""
+        response = client.post('/api/maintenance', json={
+            'vehicle_id': test_vehicle, 'date': '2024-01-01', 'cost': 100.0
+        })
+        record_id = response.get_json()['id']
+        client.put(f'/api/maintenance/{record_id}', json={'cost': 150.0})
+        client.post('/api/costs', json={'vehicle_id': test_vehicle, 'date': '2024-01-02', 'amount': 20.0})
+
+        data = client.get(f'/api/dashboard?vehicle_id={test_vehicle}').get_json()
+        assert data['maintenance_cost'] == 150.0
+        assert data['total_spent'] == 170.0
+
+        client.delete(f'/api/maintenance/{record_id}')
+        data = client.get(f'/api/dashboard?vehicle_id={test_vehicle}').get_json()
+        assert data['maintenance_cost'] == 0
+        assert data['total_spent'] == 20.0
+
+    def test_dashboard_includes_undated_records(self, client, test_vehicle):
+        """Test that records without a date still count towards totals."""
+        client.post('/api/costs', json={'vehicle_id': test_vehicle, 'amount': 30.0})
+
+        data = client.get(f'/api/dashboard?vehicle_id={test_vehicle}').get_json()
+        assert data['other_costs'] == 30.0
+
+    def test_analytics_buckets(self, client, test_vehicle, multiple_maintenance_records, multiple_mods):
+        """Test analytics monthly, yearly and category buckets from the rollup."""
+        response = client.get(f'/api/analytics?vehicle_id={test_vehicle}')
+        assert_response_success(response)
+        data = response.get_json()
+
+        assert data['monthly_spending']['2024-01'] == 60.0 + 40.0 + 800.0
+        assert data['yearly_spending']['2023'] == 50.0 + 55.0 + 200.0 + 500.0 + 1200.0
+        assert data['category_spending']['oil_change'] == 165.0
+        assert 'engine' not in data['category_spending']
+        assert data['total_spent'] == sum(data['monthly_spending'].values())
+
+    def test_analytics_category_filter(self, client, test_vehicle, multiple_maintenance_records):
+        """Test the category filter narrows analytics to one category."""
+        data = client.get(f'/api/analytics?vehicle_id={test_vehicle}&category=brakes').get_json()
+        assert data['total_spent'] == 200.0
+        assert data['category_spending'] == {'brakes': 200.0}
+
+    def test_clear_test_data_rebuilds_rollup(self, client, app, test_vehicle, test_key):
+        """Test that bulk-deleting test data also removes it from the rollup."""
+        with app.app_context():
+            db.session.add(Cost(vehicle_id=test_vehicle, date=date(2024, 1, 1), amount=75.0, test_key=test_key))
+            db.session.commit()
+
+        client.delete('/api/settings/test-data')
+
+        data = client.get(f'/api/dashboard?vehicle_id={test_vehicle}').get_json()
+        assert data['other_costs'] == 0
@@ -0,0 +1,114 @@
+"""
+Tests for the SQLite tuning layer.
+
+Covers PRAGMA configuration from environment variables, the connection hook
+and the admin endpoint that reports the values in effect.
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from flask import Flask
+from backend.extensions import db, init_sqlite_pragmas, sqlite_pragmas_from_env, SQLITE_PRAGMA_DEFAULTS
+from backend.tests.helpers import assert_response_success
+
+
+@pytest.fixture(scope='function')
+def tuned_app(tmp_path):
+    """Create an app backed by a file database with the PRAGMA hook installed."""
+    test_app = Flask(__name__)
+    test_app.config['TESTING'] = True
+    test_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "tuned.db"}'
+    test_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    test_app.config['SQLITE_PRAGMAS'] = sqlite_pragmas_from_env({
+        'SQLITE_CACHE_SIZE': '-2048',
+        'SQLITE_BUSY_TIMEOUT': '1234',
+    })
+
+    db.init_app(test_app)
+    init_sqlite_pragmas(test_app)
+
+    with test_app.app_context():
+        db.create_all()
+
+    from backend.routes import routes
+    test_app.register_blueprint(routes, url_prefix='/api')
+
+    yield test_app
+
+    with test_app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+
+class TestPragmaConfig:
+    """Tests for reading PRAGMA settings from the environment."""
+
+    def test_defaults_without_env(self):
+        """Test that defaults apply when no variables are set."""
+        assert sqlite_pragmas_from_env({}) == SQLITE_PRAGMA_DEFAULTS
+
+    def test_env_overrides(self):
+        """Test that SQLITE_<NAME> variables override the defaults."""
+        pragmas = sqlite_pragmas_from_env({
+            'SQLITE_JOURNAL_MODE': 'delete',
+            'SQLITE_MMAP_SIZE': '0',
+            'SQLITE_BUSY_TIMEOUT': '250',
+        })
+        assert pragmas['journal_mode'] == 'DELETE'
+        assert pragmas['mmap_size'] == 0
+        assert pragmas['busy_timeout'] == 250
+
+    def test_invalid_choice_rejected(self):
+        """Test that an unknown journal mode is rejected."""
+        with pytest.raises(ValueError):
+            sqlite_pragmas_from_env({'SQLITE_JOURNAL_MODE': 'wal; DROP TABLE vehicles'})
+
+    def test_invalid_integer_rejected(self):
+        """Test that a non-numeric cache size is rejected."""
+        with pytest.raises(ValueError):
+            sqlite_pragmas_from_env({'SQLITE_CACHE_SIZE': 'lots'})
+
+
+class TestPragmaHook:
+    """Tests for PRAGMAs applied on connect."""
+
+    def test_pragmas_applied(self, tuned_app):
+        """Test that new connections run with the configured PRAGMAs."""
+        with tuned_app.app_context():
+            def pragma(name):
+                return db.session.execute(db.text(f'PRAGMA {name}')).scalar()
+
+            assert pragma('journal_mode') == 'wal'
+            assert pragma('synchronous') == 1
+            assert pragma('foreign_keys') == 1
+            assert pragma('temp_store') == 2
+            assert pragma('cache_size') == -2048
+            assert pragma('busy_timeout') == 1234
+
+    def test_suite_app_uses_pragmas(self, app):
+        """Test the shared test app runs in WAL mode and enforces foreign keys."""
+        from datetime import date
+        from sqlalchemy.exc import IntegrityError
+        from backend.models import Cost
+
+        with app.app_context():
+            assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+            db.session.add(Cost(vehicle_id=99999, date=date(2024, 1, 1), amount=1.0))
+            with pytest.raises(IntegrityError):
+                db.session.commit()
+            db.session.rollback()
+
+    def test_admin_endpoint_reports_values(self, tuned_app):
+        """Test the admin endpoint reports configured and effective values."""
+        with tuned_app.test_client() as client:
+            response = client.get('/api/admin/sqlite')
+            assert_response_success(response)
+            data = response.get_json()
+            assert data['configured']['journal_mode'] == 'WAL'
+            assert data['effective']['journal_mode'] == 'wal'
+            assert data['effective']['busy_timeout'] == 1234
+            assert 'sqlite_version' in data
@@ -0,0 +1,114 @@
+"""
+Tests for in-memory static asset serving.
+
+Covers compression negotiation, ETag and Last-Modified revalidation, Range
+requests, reloading changed files, large files and path traversal.
+"""
+import pytest
+import sys
+import os
+import gzip
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from flask import Flask
+from backend.static_assets import StaticAssetCache
+
+SCRIPT = ('function log(message) { console.log(message); }\n' * 200).encode('utf-8')
+
+
+@pytest.fixture
+def static_root(tmp_path):
+    """A frontend-like directory with a script, a stylesheet and a large file."""
+    (tmp_path / 'js').mkdir()
+    (tmp_path / 'css').mkdir()
+    (tmp_path / 'js' / 'app.js').write_bytes(SCRIPT)
+    (tmp_path / 'css' / 'style.css').write_text('body { margin: 0; }\n')
+    (tmp_path / 'js' / 'big.js').write_bytes(b'x' * 100000)
+    (tmp_path / 'secret.txt').write_text('secret')
+    return tmp_path
+
+
+@pytest.fixture
+def static_client(static_root):
+    """A client for an app serving static_root through StaticAssetCache."""
+    app = Flask(__name__)
+    assets = StaticAssetCache(str(static_root), max_cached_size=64 * 1024)
+
+    @app.route('/js/<path:filename>')
+    def serve_js(filename):
+        return assets.serve('js', filename)
+
+    @app.route('/css/<path:filename>')
+    def serve_css(filename):
+        return assets.serve('css', filename)
+
+    with app.test_client() as client:
+        yield client
+
+
+class TestStaticAssets:
+    """Tests for StaticAssetCache responses."""
+
+    def test_gzip_when_accepted(self, static_client):
+        """Test a compressible file is sent gzip-encoded to clients that accept it."""
+        response = static_client.get('/js/app.js', headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert gzip.decompress(response.data) == SCRIPT
+        assert len(response.data) < len(SCRIPT)
+
+    def test_identity_without_accept_encoding(self, static_client):
+        """Test clients without Accept-Encoding get the plain bytes."""
+        response = static_client.get('/js/app.js', headers={'Accept-Encoding': ''})
+        assert 'Content-Encoding' not in response.headers
+        assert response.data == SCRIPT
+        assert response.headers['Cache-Control'] == 'no-cache'
+        assert response.headers['Last-Modified']
+
+    def test_etag_revalidation(self, static_client):
+        """Test If-None-Match with the current ETag returns 304 per encoding."""
+        for encoding in ('gzip', ''):
+            first = static_client.get('/js/app.js', headers={'Accept-Encoding': encoding})
+            second = static_client.get('/js/app.js', headers={
+                'Accept-Encoding': encoding, 'If-None-Match': first.headers['ETag']
+            })
+            assert second.status_code == 304
+
+    def test_range_request(self, static_client):
+        """Test Range returns a partial identity response."""
+        response = static_client.get('/js/app.js', headers={'Range': 'bytes=0-9', 'Accept-Encoding': 'gzip'})
+        assert response.status_code == 206
+        assert response.data == SCRIPT[:10]
+        assert 'Content-Encoding' not in response.headers
+
+    def test_changed_file_is_reloaded(self, static_client, static_root):
+        """Test a file edited on disk is picked up with a new ETag."""
+        etag = static_client.get('/css/style.css').headers['ETag']
+        path = static_root / 'css' / 'style.css'
+        path.write_text('body { margin: 1px; }\n')
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+        response = static_client.get('/css/style.css', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert b'1px' in response.data
+
+    def test_large_file_uses_send_file(self, static_client):
+        """Test files above the cache limit are still served with validators."""
+        response = static_client.get('/js/big.js')
+        assert response.status_code == 200
+        assert response.data == b'x' * 100000
+        assert response.headers['ETag']
+        repeat = static_client.get('/js/big.js', headers={'If-None-Match': response.headers['ETag']})
+        assert repeat.status_code == 304
+
+    def test_missing_file(self, static_client):
+        """Test missing files return 404."""
+        assert static_client.get('/js/missing.js').status_code == 404
+
+    def test_traversal_forbidden(self, static_client):
+        """Test paths escaping the directory are refused."""
+        assert static_client.get('/js/../secret.txt').status_code in (403, 404)
+        assert static_client.get('/css/..%2Fsecret.txt').status_code == 403
@@ -149,3 +149,60 @@ class TestMaintenanceTimeline:
         
         oil_change = next((item for item in data if item['service_type'] == 'oil_change'), None)
         assert oil_change['status'] in ['upcoming', 'ok']
+
+
+class TestFleetTimeline:
+    """Tests for the batched fleet timeline."""
+
+    def test_fleet_timeline_returns_each_vehicle(self, client, test_vehicle, test_vehicle_2, multiple_maintenance_records):
+        """Test vehicle_ids returns one timeline per vehicle."""
+        response = client.get(f'/api/maintenance/timeline?vehicle_ids={test_vehicle},{test_vehicle_2}')
+        assert_response_success(response)
+        data = response.get_json()
+
+        assert set(data['timelines']) == {str(test_vehicle), str(test_vehicle_2)}
+        assert data['not_found'] == []
+        oil_change = next(i for i in data['timelines'][str(test_vehicle)] if i['service_type'] == 'oil_change')
+        assert oil_change['last_service_date'] == '2024-01-01'
+        assert oil_change['last_service_mileage'] == 50000
+        other = next(i for i in data['timelines'][str(test_vehicle_2)] if i['service_type'] == 'oil_change')
+        assert other['last_service_date'] is None
+
+    def test_fleet_timeline_matches_single(self, client, test_vehicle, multiple_maintenance_records):
+        """Test batch and single-vehicle timelines agree."""
+        single = client.get(f'/api/maintenance/timeline?vehicle_id={test_vehicle}').get_json()
+        batch = client.get(f'/api/maintenance/timeline?vehicle_ids={test_vehicle}').get_json()
+        assert batch['timelines'][str(test_vehicle)] == single
+
+    def test_fleet_timeline_reports_missing(self, client, test_vehicle):
+        """Test unknown vehicle ids are listed as not found."""
+        response = client.get(f'/api/maintenance/timeline?vehicle_ids={test_vehicle},99999')
+        assert_response_success(response)
+        assert response.get_json()['not_found'] == [99999]
+
+    def test_fleet_timeline_invalid_ids(self, client):
+        """Test non-numeric vehicle_ids are rejected."""
+        response = client.get('/api/maintenance/timeline?vehicle_ids=1,abc')
+        assert_response_bad_request(response)
+
+    def test_last_services_single_query(self, app, test_vehicle, test_vehicle_2, multiple_maintenance_records):
+        """Test the latest service per type is fetched with one statement."""
+        from sqlalchemy import event
+        from backend.extensions import db
+        from backend.routes import get_last_services, SERVICE_INTERVALS
+
+        statements = []
+        with app.app_context():
+            def count(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+
+            event.listen(db.engine, 'before_cursor_execute', count)
+            try:
+                last = get_last_services([test_vehicle, test_vehicle_2], SERVICE_INTERVALS.keys())
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', count)
+
+        assert len(statements) == 1
+        assert last[(test_vehicle, 'oil_change')][1] == 50000
+        assert last[(test_vehicle, 'brakes')][1] == 42000
+        assert (test_vehicle_2, 'oil_change') not in last
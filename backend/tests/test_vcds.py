@@ -0,0 +1,321 @@
+"""
+Tests for the VCDS scan parser.
+
+Covers both scan formats, block statuses, line-iterator input, streamed
+file uploads and the /vcds/parse error payload.
+"""
+import pytest
+import sys
+import os
+import io
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.vcds import VCDSParser, parse_vcds_scan, iter_upload_lines
+from backend.tests.helpers import assert_response_success, assert_response_bad_request
+
+
+AUTO_SCAN = """VCDS Version: Release 23.3.0
+Chassis Type: 5K0
+
+Address 01: Engine        Labels: 06F-907-115-AXX.lbl
+   Part No: 06F906056FH
+2 Faults Found:
+16706 - Engine Speed Sensor (G28)
+            P0322 - 000 - No Signal
+             Freeze Frame:
+                    Fault Status: 01100000
+00819 - High Pressure Sensor (G65)
+            008 - Implausible Signal
+
+Address 08: Auto HVAC        Labels: 5K0-907-044.clb
+   Part No: 5K0907044BT
+No fault code found.
+
+Address 15: Airbags
+Cannot be reached
+
+Address 17: Instruments
+   Part No: 5K0920870C
+"""
+
+
+def make_scan(modules):
+    blocks = []
+    for i in range(modules):
+        blocks.append(
+            f'Address {i % 100:02d}: Module {i}        Labels: None\n'
+            '   Part No: 06F906056FH\n'
+            '1 Fault Found:\n'
+            f'{i % 100000:05d} - Sensor {i}\n'
+            '            P0322 - 000 - No Signal\n'
+            '             Freeze Frame:\n'
+            '                    Fault Status: 01100000\n'
+            '                    Mileage: 116000 km\n'
+        )
+    return '\n'.join(blocks)
+
+
+class TestVCDSParser:
+    """Tests for the single-pass parser."""
+
+    def test_auto_scan_blocks(self):
+        """Test an auto-scan yields faults and block statuses in order."""
+        faults = parse_vcds_scan(AUTO_SCAN)
+        assert [(f['address'], f['status'], f['fault_code']) for f in faults] == [
+            ('01', 'Fault', '16706'),
+            ('01', 'Fault', '00819'),
+            ('08', 'OK', ''),
+            ('15', 'Unreachable', ''),
+            ('17', 'Unknown', ''),
+        ]
+        assert faults[0]['module'] == 'Engine'
+        assert faults[0]['description'] == 'Engine Speed Sensor (G28)'
+        assert faults[1]['description'] == 'High Pressure Sensor (G65)'
+        assert faults[0]['confidence'] == 'high'
+        assert 'confidence' not in faults[2]
+
+    def test_simple_format(self):
+        """Test the hand-written format pairs faults with the preceding module."""
+        faults = parse_vcds_scan('00123 Orphan\n08 Auto HVAC\n00819 High Pressure Sensor\n\n17 Instruments\n01314 Engine Control Module')
+        assert faults == [
+            {'address': '08', 'module': 'Auto HVAC', 'fault_code': '00819',
+             'description': 'High Pressure Sensor', 'status': 'Fault', 'confidence': 'high'},
+            {'address': '17', 'module': 'Instruments', 'fault_code': '01314',
+             'description': 'Engine Control Module', 'status': 'Fault', 'confidence': 'high'},
+        ]
+
+    def test_address_header_switches_format(self):
+        """Test simple-format lines before an Address header are dropped."""
+        faults = parse_vcds_scan('08 Auto HVAC\n00819 High Pressure Sensor\nAddress 15: Airbags\nCannot be reached')
+        assert [(f['address'], f['status']) for f in faults] == [('15', 'Unreachable')]
+
+    def test_line_iterator_input(self):
+        """Test a file of bytes lines parses the same as a string."""
+        expected = parse_vcds_scan(AUTO_SCAN)
+        stream = io.BytesIO(AUTO_SCAN.replace('\n', '\r\n').encode('utf-8'))
+        assert parse_vcds_scan(stream) == expected
+
+    def test_faults_yielded_per_block(self):
+        """Test a block's faults are yielded once the next block starts."""
+        parser = VCDSParser()
+        assert parser.feed('Address 01: Engine') == []
+        assert parser.feed('16706 - Engine Speed Sensor') == []
+        completed = parser.feed('Address 08: Auto HVAC')
+        assert [f['fault_code'] for f in completed] == ['16706']
+        assert [f['status'] for f in parser.close()] == ['Unknown']
+
+    def test_large_scan_is_linear(self):
+        """Test a multi-megabyte scan parses in well under a second."""
+        scan = make_scan(20000)
+        assert len(scan) > 4_000_000
+        started = time.perf_counter()
+        faults = parse_vcds_scan(scan)
+        elapsed = time.perf_counter() - started
+        assert len(faults) == 20000
+        assert elapsed < 2.0
+
+
+class TestParseEndpoint:
+    """Tests for POST /vcds/parse."""
+
+    def test_parse_auto_scan(self, client):
+        """Test the endpoint returns the parser's faults."""
+        response = client.post('/api/vcds/parse', json={'content': AUTO_SCAN})
+        assert_response_success(response)
+        assert len(response.get_json()) == 5
+
+    def test_unparseable_content(self, client):
+        """Test content without faults returns suggestions."""
+        response = client.post('/api/vcds/parse', json={'content': 'nothing to see here'})
+        assert_response_success(response)
+        data = response.get_json()
+        assert data['error'] is True
+        assert len(data['suggestions']) == 4
+
+    def test_empty_content(self, client):
+        """Test empty content returns an empty list."""
+        response = client.post('/api/vcds/parse', json={'content': '  \n '})
+        assert_response_success(response)
+        assert response.get_json() == []
+
+
+def multipart_body(parts, boundary='scanboundary'):
+    body = b''
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename:
+            disposition += f'; filename="{filename}"'
+        body += f'--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n'.encode() + content + b'\r\n'
+    return body + f'--{boundary}--\r\n'.encode()
+
+
+class CountingStream(io.BytesIO):
+    """A request body that records how much has been read."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class TestUploadLines:
+    """Tests for reading scan lines out of a multipart body."""
+
+    def test_lines_across_chunks(self):
+        """Test lines split over read chunks are rejoined."""
+        body = multipart_body([('note', None, b'ignored'), ('file', 'scan.txt', AUTO_SCAN.encode())])
+        lines = [line.decode() for line in iter_upload_lines(io.BytesIO(body), 'scanboundary', chunk_size=7)]
+        assert lines == AUTO_SCAN.split('\n')[:-1]
+
+    def test_reads_incrementally(self):
+        """Test the upload is read as lines are consumed, not up front."""
+        scan = make_scan(2000).encode()
+        stream = CountingStream(multipart_body([('file', 'scan.txt', scan)]))
+        lines = iter_upload_lines(stream, 'scanboundary', chunk_size=4096)
+        assert stream.bytes_read == 4096
+        next(lines)
+        assert stream.bytes_read < len(scan) // 10
+        assert sum(1 for _ in lines) > 0
+        assert stream.bytes_read > len(scan)
+
+    def test_missing_file_part(self):
+        """Test a body without the file part is rejected."""
+        body = multipart_body([('note', None, b'hello')])
+        with pytest.raises(ValueError):
+            iter_upload_lines(io.BytesIO(body), 'scanboundary')
+
+
+class TestParseUpload:
+    """Tests for POST /vcds/parse with a file upload."""
+
+    def test_upload_matches_json_body(self, client):
+        """Test an uploaded file parses the same as posted content."""
+        expected = client.post('/api/vcds/parse', json={'content': AUTO_SCAN}).get_json()
+        response = client.post('/api/vcds/parse', data={'file': (io.BytesIO(AUTO_SCAN.encode()), 'scan.txt')})
+        assert_response_success(response)
+        assert response.is_streamed
+        assert json.loads(response.get_data(as_text=True)) == expected
+
+    def test_upload_as_ndjson(self, client):
+        """Test format=ndjson returns one fault per line."""
+        response = client.post(
+            '/api/vcds/parse?format=ndjson', data={'file': (io.BytesIO(AUTO_SCAN.encode()), 'scan.txt')}
+        )
+        assert_response_success(response)
+        assert response.mimetype == 'application/x-ndjson'
+        faults = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [f['status'] for f in faults] == ['Fault', 'Fault', 'OK', 'Unreachable', 'Unknown']
+
+    def test_upload_without_faults(self, client):
+        """Test an unparseable upload returns the suggestions payload."""
+        response = client.post('/api/vcds/parse', data={'file': (io.BytesIO(b'hello\nworld\n'), 'scan.txt')})
+        assert_response_success(response)
+        assert response.get_json()['error'] is True
+
+    def test_upload_missing_file(self, client):
+        """Test a multipart body without a file part returns 400."""
+        response = client.post('/api/vcds/parse', data={'note': 'no file'}, content_type='multipart/form-data')
+        assert_response_bad_request(response)
+
+    def test_upload_bad_format(self, client):
+        """Test an unknown output format returns 400."""
+        response = client.post(
+            '/api/vcds/parse?format=xml', data={'file': (io.BytesIO(AUTO_SCAN.encode()), 'scan.txt')}
+        )
+        assert_response_bad_request(response)
+
+
+class TestVCDSImport:
+    """Tests for the idempotent /vcds/import."""
+
+    def import_faults(self, client, vehicle_id, faults, **kwargs):
+        response = client.post('/api/vcds/import', json={'vehicle_id': vehicle_id, 'faults': faults, **kwargs})
+        assert_response_success(response)
+        return response.get_json()
+
+    def active_faults(self, client, vehicle_id):
+        faults = client.get(f'/api/vcds?vehicle_id={vehicle_id}').get_json()
+        return sorted((f['address'], f['fault_code']) for f in faults if f['status'] == 'active')
+
+    def test_reimport_is_idempotent(self, client, test_vehicle):
+        """Test importing the same scan twice updates instead of duplicating."""
+        faults = parse_vcds_scan(AUTO_SCAN)
+        first = self.import_faults(client, test_vehicle, faults)
+        assert (first['inserted'], first['updated'], first['cleared'], first['skipped']) == (2, 0, 0, 3)
+        assert first['imported'] == 2
+
+        second = self.import_faults(client, test_vehicle, faults)
+        assert (second['inserted'], second['updated']) == (0, 2)
+        assert self.active_faults(client, test_vehicle) == [('01', '00819'), ('01', '16706')]
+
+    def test_counts_against_active_keys(self, client, test_vehicle):
+        """Test only keys without an active fault count as inserted."""
+        self.import_faults(client, test_vehicle, [{'address': '01', 'fault_code': '16706'}])
+        cleared = client.post('/api/vcds', json={
+            'vehicle_id': test_vehicle, 'address': '01', 'fault_code': '00819', 'status': 'cleared'
+        })
+        assert cleared.status_code == 201
+
+        result = self.import_faults(client, test_vehicle, [
+            {'address': '01', 'fault_code': '16706'}, {'address': '01', 'fault_code': '00819'},
+            {'address': '01', 'fault_code': '00819'}
+        ])
+        assert (result['inserted'], result['updated']) == (1, 1)
+
+    def test_refreshes_description_and_component(self, client, test_vehicle):
+        """Test an existing active fault takes the newer description."""
+        self.import_faults(client, test_vehicle, [{'address': '01', 'fault_code': '16706', 'description': 'Old'}])
+        self.import_faults(client, test_vehicle, [
+            {'address': '01', 'module': 'Engine', 'fault_code': '16706', 'description': 'New'}
+        ])
+        faults = client.get(f'/api/vcds?vehicle_id={test_vehicle}').get_json()
+        assert len(faults) == 1
+        assert (faults[0]['description'], faults[0]['component']) == ('New', 'Engine')
+
+    def test_cleared_fault_reappearing_is_new(self, client, test_vehicle):
+        """Test a fault that was cleared comes back as a new active row."""
+        fault = {'address': '01', 'fault_code': '16706', 'description': 'Speed sensor'}
+        fault_id = client.post('/api/vcds', json={'vehicle_id': test_vehicle, **fault}).get_json()['id']
+        client.put(f'/api/vcds/{fault_id}', json={'status': 'cleared'})
+        result = self.import_faults(client, test_vehicle, [fault])
+        assert result['inserted'] == 1
+        assert len(client.get(f'/api/vcds?vehicle_id={test_vehicle}').get_json()) == 2
+
+    def test_clear_missing(self, client, test_vehicle):
+        """Test a full scan clears faults it no longer reports, except at unreachable modules."""
+        self.import_faults(client, test_vehicle, [
+            {'address': '01', 'fault_code': '16706'},
+            {'address': '08', 'fault_code': '00819'},
+            {'address': '15', 'fault_code': '01578'},
+        ])
+        result = self.import_faults(client, test_vehicle, [
+            {'address': '01', 'fault_code': '16706'},
+            {'address': '08', 'fault_code': '', 'status': 'OK'},
+            {'address': '15', 'fault_code': '', 'status': 'Unreachable'},
+        ], clear_missing=True)
+        assert (result['inserted'], result['updated'], result['cleared']) == (0, 1, 1)
+        assert self.active_faults(client, test_vehicle) == [('01', '16706'), ('15', '01578')]
+
+    def test_import_unknown_vehicle(self, client):
+        """Test importing for a missing vehicle returns 404."""
+        response = client.post('/api/vcds/import', json={'vehicle_id': 99999, 'faults': []})
+        assert response.status_code == 404
+
+    def test_duplicate_active_fault_conflicts(self, client, test_vehicle):
+        """Test creating or reactivating a second active copy of a fault returns 409."""
+        fault = {'vehicle_id': test_vehicle, 'address': '01', 'fault_code': '16706'}
+        first_id = client.post('/api/vcds', json=fault).get_json()['id']
+        response = client.post('/api/vcds', json=fault)
+        assert response.status_code == 409
+        assert response.get_json()['id'] == first_id
+
+        second_id = client.post('/api/vcds', json={**fault, 'status': 'cleared'}).get_json()['id']
+        response = client.put(f'/api/vcds/{second_id}', json={'status': 'active'})
+        assert response.status_code == 409
@@ -0,0 +1,160 @@
+"""
+Tests for stored VCDS scans.
+
+Covers compressed storage, content-hash dedupe, uploads, importing a
+stored scan and per-module diffs between scans.
+"""
+import pytest
+import sys
+import os
+import io
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.models import VCDSScan
+from backend.tests.helpers import assert_response_success, assert_response_bad_request, assert_response_not_found
+
+
+FIRST_VISIT = """Address 01: Engine        Labels: 06F-907-115-AXX.lbl
+2 Faults Found:
+16706 - Engine Speed Sensor (G28)
+16684 - Random/Multiple Cylinder Misfire Detected
+
+Address 08: Auto HVAC
+1 Fault Found:
+00819 - High Pressure Sensor (G65)
+
+Address 15: Airbags
+1 Fault Found:
+00588 - Airbag Igniter; Driver Side (N95)
+
+Address 17: Instruments
+No fault code found.
+"""
+
+SECOND_VISIT = """Address 01: Engine        Labels: 06F-907-115-AXX.lbl
+2 Faults Found:
+16706 - Engine Speed Sensor (G28)
+16804 - Catalyst System Bank 1
+
+Address 08: Auto HVAC
+No fault code found.
+
+Address 15: Airbags
+Cannot be reached
+
+Address 17: Instruments
+No fault code found.
+"""
+
+
+def store(client, vehicle_id, content, **kwargs):
+    return client.post('/api/vcds/scans', json={'vehicle_id': vehicle_id, 'content': content, **kwargs})
+
+
+class TestScanStorage:
+    """Tests for storing scans."""
+
+    def test_stored_compressed(self, client, test_vehicle):
+        """Test a scan is kept compressed and reads back unchanged."""
+        content = FIRST_VISIT * 20
+        response = store(client, test_vehicle, content)
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data['raw_size'] == len(content.encode())
+        assert data['compressed_size'] < data['raw_size'] / 5
+        assert data['fault_count'] == 4
+
+        raw = client.get(f"/api/vcds/scans/{data['id']}/raw")
+        assert_response_success(raw)
+        assert raw.get_data(as_text=True) == content
+
+    def test_identical_scan_dedupes(self, client, test_vehicle, test_vehicle_2):
+        """Test the same scan, whatever its line endings, is stored once per vehicle."""
+        first = store(client, test_vehicle, FIRST_VISIT).get_json()
+        again = store(client, test_vehicle, FIRST_VISIT.replace('\n', '\r\n'))
+        assert again.status_code == 200
+        assert again.get_json()['id'] == first['id']
+        assert again.get_json()['duplicate'] is True
+
+        other = store(client, test_vehicle_2, FIRST_VISIT)
+        assert other.status_code == 201
+        assert len(client.get(f'/api/vcds/scans?vehicle_id={test_vehicle}').get_json()) == 1
+
+    def test_upload_with_import(self, client, test_vehicle):
+        """Test a multipart upload is stored and, with import=1, becomes the active faults."""
+        response = client.post(
+            f'/api/vcds/scans?vehicle_id={test_vehicle}&import=1',
+            data={'file': (io.BytesIO(FIRST_VISIT.encode()), 'scan.txt')}
+        )
+        assert response.status_code == 201
+        assert response.get_json()['imported']['inserted'] == 4
+
+        scan = client.get(f"/api/vcds/scans/{response.get_json()['id']}").get_json()
+        assert scan['modules']['08'] == {
+            'module': 'Auto HVAC', 'status': 'Fault', 'faults': {'00819': 'High Pressure Sensor (G65)'}
+        }
+        assert scan['modules']['17']['status'] == 'OK'
+
+    def test_invalid_requests(self, client, test_vehicle):
+        """Test missing vehicles, content and empty scans are rejected."""
+        assert_response_not_found(store(client, 99999, FIRST_VISIT))
+        assert_response_bad_request(client.post('/api/vcds/scans', json={'vehicle_id': test_vehicle}))
+        assert_response_bad_request(store(client, test_vehicle, '   \n'))
+        assert_response_bad_request(client.get('/api/vcds/scans?vehicle_id=abc'))
+
+    def test_list_paged_and_conditional(self, client, test_vehicle):
+        """Test the scan list pages newest first and answers If-None-Match until a scan is stored."""
+        ids = [store(client, test_vehicle, FIRST_VISIT + '\n' * n).get_json()['id'] for n in range(3)]
+
+        first = client.get(f'/api/vcds/scans?vehicle_id={test_vehicle}&limit=2')
+        assert_response_success(first)
+        page = first.get_json()
+        assert [scan['id'] for scan in page['items']] == ids[:0:-1]
+        rest = client.get(f"/api/vcds/scans?vehicle_id={test_vehicle}&limit=2&cursor={page['next_cursor']}")
+        assert [scan['id'] for scan in rest.get_json()['items']] == ids[:1]
+
+        listed = client.get(f'/api/vcds/scans?vehicle_id={test_vehicle}')
+        etag = listed.headers['ETag']
+        unchanged = client.get(f'/api/vcds/scans?vehicle_id={test_vehicle}', headers={'If-None-Match': etag})
+        assert unchanged.status_code == 304
+        store(client, test_vehicle, SECOND_VISIT)
+        changed = client.get(f'/api/vcds/scans?vehicle_id={test_vehicle}', headers={'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert len(changed.get_json()) == 4
+
+    def test_deleted_with_vehicle(self, client, app, test_vehicle):
+        """Test a vehicle's scans go with it."""
+        store(client, test_vehicle, FIRST_VISIT)
+        client.delete(f'/api/vehicles/{test_vehicle}')
+        with app.app_context():
+            assert VCDSScan.query.count() == 0
+
+
+class TestScanDiff:
+    """Tests for /vcds/scans/<a>/diff/<b>."""
+
+    def test_diff_between_visits(self, client, test_vehicle):
+        """Test new, persisting, resolved and unverified faults per module."""
+        a = store(client, test_vehicle, FIRST_VISIT).get_json()['id']
+        b = store(client, test_vehicle, SECOND_VISIT).get_json()['id']
+
+        response = client.get(f'/api/vcds/scans/{a}/diff/{b}')
+        assert_response_success(response)
+        diff = response.get_json()
+        assert diff['summary'] == {'new': 1, 'persisting': 1, 'resolved': 2, 'unverified': 1}
+        modules = {m['address']: m for m in diff['modules']}
+        assert set(modules) == {'01', '08', '15'}
+        assert [f['fault_code'] for f in modules['01']['new']] == ['16804']
+        assert [f['fault_code'] for f in modules['01']['persisting']] == ['16706']
+        assert [f['fault_code'] for f in modules['01']['resolved']] == ['16684']
+        assert (modules['08']['status_before'], modules['08']['status_after']) == ('Fault', 'OK')
+        assert [f['fault_code'] for f in modules['15']['unverified']] == ['00588']
+        assert modules['15']['resolved'] == []
+
+    def test_diff_needs_same_vehicle(self, client, test_vehicle, test_vehicle_2):
+        """Test scans of different vehicles can't be compared."""
+        a = store(client, test_vehicle, FIRST_VISIT).get_json()['id']
+        b = store(client, test_vehicle_2, SECOND_VISIT).get_json()['id']
+        assert_response_bad_request(client.get(f'/api/vcds/scans/{a}/diff/{b}'))
+        assert_response_not_found(client.get(f'/api/vcds/scans/{a}/diff/99999'))
@@ -0,0 +1,386 @@
+"""
+VCDS scan parsing.
+
+:class:`VCDSParser` reads a scan one line at a time in a single pass. The
+scan can be a string or any iterable of lines (``str`` or ``bytes``, such
+as an open file). Faults are yielded as soon as they are complete, and
+memory does not grow with the scan's size.
+
+Two formats are understood:
+
+* VCDS auto-scans, with ``Address 01: Engine ...`` blocks. A block yields
+  its ``NNNNN - description`` fault lines. If it has none, it yields one
+  entry with status ``Unreachable``, ``OK`` or ``Unknown``.
+* Hand-written lists, with an ``08 Auto HVAC`` line followed by
+  ``00819 High Pressure Sensor`` lines.
+
+The format is not known until an ``Address`` header appears, so entries
+from the simple format are held back until the end of the scan. They are
+dropped as soon as a header shows that the scan is an auto-scan.
+
+Uploaded scan files are read straight from the request body with
+:func:`iter_upload_lines`. The multipart body is decoded incrementally and
+never held in memory or spooled to disk. :func:`iter_faults_json` and
+:func:`iter_faults_ndjson` then stream the parsed faults back one address
+block at a time.
+
+:func:`import_vcds_faults` saves parsed faults for a vehicle. A vehicle has
+at most one active row per ``(address, fault_code)``, enforced by a unique
+partial index. Imports upsert against that index, so importing the same
+scan again refreshes the existing rows instead of adding copies. Their
+descriptions are added to the fault-code dictionary (backend.fault_codes).
+"""
+import json
+import re
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from werkzeug.sansio.multipart import MultipartDecoder, NEED_DATA, Data, Epilogue, Field, File
+
+from backend.extensions import db
+from backend.models import VCDSFault
+from backend.change_versions import bump_change_versions
+from backend.fault_codes import learn_fault_codes
+
+ADDRESS_HEADER = re.compile(r'Address\s+(\d+):\s*(.*)', re.IGNORECASE)
+LABELS_SUFFIX = re.compile(r'\s+Labels?[:\.].*$')
+FAULT_LINE = re.compile(r'(\d{5})\s*-\s*(.+)')
+BLOCK_STATUS = re.compile(r'(cannot be reached)|(no fault code found)', re.IGNORECASE)
+SIMPLE_ADDRESS = re.compile(r'(\d+)\s+(.+)')
+SIMPLE_FAULT = re.compile(r'(\d{5})\s+(.+)')
+
+# Rows per upsert statement, well under SQLite's bound parameter limit.
+UPSERT_CHUNK_SIZE = 500
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Longer lines are split rather than buffered without bound.
+MAX_LINE_LENGTH = 64 * 1024
+
+PARSE_SUGGESTIONS = [
+    'Ensure each fault code is on its own line',
+    'Format: "ADDRESS Module Name" followed by "CODE Description"',
+    'Example: "08 Auto HVAC" then "00819 High Pressure Sensor"',
+    'Use 5-digit fault codes (e.g., 00819, 03582)',
+]
+
+
+def _fault(address, module, fault_code='', description='', status='Fault'):
+    fault = {
+        'address': address,
+        'module': module,
+        'fault_code': fault_code,
+        'description': description,
+        'status': status,
+    }
+    if fault_code:
+        fault['confidence'] = 'high' if len(fault_code) == 5 else 'medium'
+    return fault
+
+
+def iter_lines(source):
+    """Yield text lines without line endings from a string or an iterable of lines."""
+    if isinstance(source, str):
+        yield from source.splitlines()
+        return
+    for line in source:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        yield line.rstrip('\r\n')
+
+
+class VCDSParser:
+    """Single-pass parser for VCDS scans."""
+
+    def __init__(self):
+        self.line_count = 0
+        self.has_content = False
+        self.address_mode = False
+        # Simple format state
+        self._pending = []
+        self._address = ''
+        self._module = ''
+        # Current address block
+        self._block = None
+        self._block_faults = []
+        self._unreachable = False
+        self._no_faults = False
+        self._first_body_line = True
+
+    def _end_block(self):
+        if self._block is None:
+            return []
+        address, module = self._block
+        if self._unreachable:
+            entries = [_fault(address, module, status='Unreachable')]
+        elif self._no_faults:
+            entries = [_fault(address, module, status='OK')]
+        elif self._block_faults:
+            entries = self._block_faults
+        else:
+            entries = [_fault(address, module, status='Unknown')]
+        self._block = None
+        self._block_faults = []
+        self._unreachable = self._no_faults = False
+        return entries
+
+    def _feed_block(self, line):
+        body_line = line
+        if self._first_body_line:
+            body_line = line.lstrip()
+            if not body_line:
+                return
+            self._first_body_line = False
+        if not self._unreachable:
+            status = BLOCK_STATUS.search(line)
+            if status:
+                if status.group(1):
+                    self._unreachable = True
+                else:
+                    self._no_faults = True
+        if body_line[:1].isdigit():
+            match = FAULT_LINE.match(body_line)
+            if match:
+                address, module = self._block
+                self._block_faults.append(_fault(address, module, match.group(1), match.group(2).strip()))
+
+    def _feed_simple(self, line):
+        line = line.strip()
+        if not line[:1].isdigit():
+            return
+        fault = SIMPLE_FAULT.match(line)
+        if fault is None:
+            address = SIMPLE_ADDRESS.match(line)
+            if address:
+                self._address = address.group(1)
+                self._module = address.group(2).strip()
+        elif self._address:
+            self._pending.append(_fault(self._address, self._module, fault.group(1), fault.group(2).strip()))
+
+    def feed(self, line):
+        """Consume one line and return the faults it completed."""
+        self.line_count += 1
+        if not self.has_content and line.strip():
+            self.has_content = True
+
+        if line[:1] in ('A', 'a'):
+            header = ADDRESS_HEADER.match(line)
+            if header:
+                completed = self._end_block()
+                self.address_mode = True
+                self._pending = []
+                module = LABELS_SUFFIX.sub('', header.group(2)).strip()
+                self._block = (header.group(1), module)
+                self._first_body_line = True
+                return completed
+
+        if self._block is not None:
+            self._feed_block(line)
+        elif not self.address_mode:
+            self._feed_simple(line)
+        return []
+
+    def close(self):
+        """Finish the scan and return the remaining faults."""
+        if self.address_mode:
+            return self._end_block()
+        pending, self._pending = self._pending, []
+        return pending
+
+    def parse(self, source):
+        """Yield every fault in ``source``."""
+        for line in iter_lines(source):
+            completed = self.feed(line)
+            if completed:
+                yield from completed
+        yield from self.close()
+
+
+def parse_vcds_scan(source):
+    """Return the list of faults in ``source``."""
+    return list(VCDSParser().parse(source))
+
+
+def no_faults_payload():
+    return {
+        'error': True,
+        'message': 'No faults could be parsed from the input',
+        'suggestions': PARSE_SUGGESTIONS,
+    }
+
+
+def _multipart_events(decoder, stream, chunk_size):
+    while True:
+        chunk = stream.read(chunk_size)
+        decoder.receive_data(chunk or None)
+        while True:
+            event = decoder.next_event()
+            if event is NEED_DATA:
+                break
+            yield event
+            if isinstance(event, Epilogue):
+                return
+        if not chunk:
+            return
+
+
+def _part_lines(events):
+    tail = b''
+    for event in events:
+        if not isinstance(event, Data):
+            break
+        lines = (tail + event.data).split(b'\n')
+        tail = lines.pop()
+        yield from lines
+        if len(tail) > MAX_LINE_LENGTH:
+            yield tail
+            tail = b''
+        if not event.more_data:
+            break
+    if tail:
+        yield tail
+
+
+def iter_upload_lines(stream, boundary, field='file', chunk_size=UPLOAD_CHUNK_SIZE):
+    """Return an iterator over the lines of the ``field`` part of a multipart body.
+
+    The body is only read up to the start of that part before this returns;
+    the rest is read as the iterator is consumed. Raises ValueError when the
+    body has no such part.
+    """
+    decoder = MultipartDecoder(boundary.encode('latin-1'))
+    events = _multipart_events(decoder, stream, chunk_size)
+    for event in events:
+        if isinstance(event, (File, Field)) and event.name == field:
+            return _part_lines(events)
+    raise ValueError(f'Upload has no {field} part')
+
+
+def _fault_groups(parser, source, enrich=None):
+    for line in iter_lines(source):
+        completed = parser.feed(line)
+        if completed:
+            yield enrich(completed) if enrich else completed
+    completed = parser.close()
+    if completed:
+        yield enrich(completed) if enrich else completed
+
+
+def iter_faults_ndjson(source, enrich=None):
+    """Yield the faults in ``source`` as NDJSON, one address block per chunk.
+
+    ``enrich`` is called with each block's faults before they are written.
+    A scan with content but no faults ends with the no-faults payload.
+    """
+    parser = VCDSParser()
+    found = False
+    for group in _fault_groups(parser, source, enrich):
+        found = True
+        yield ''.join(json.dumps(fault) + '\n' for fault in group)
+    if not found and parser.has_content:
+        yield json.dumps(no_faults_payload()) + '\n'
+
+
+def iter_faults_json(source, enrich=None):
+    """Yield the faults in ``source`` as a JSON array, one address block per chunk.
+
+    Matches the buffered ``/vcds/parse`` response, including the no-faults
+    payload, without holding the whole array.
+    """
+    parser = VCDSParser()
+    separator = '['
+    for group in _fault_groups(parser, source, enrich):
+        yield separator + ','.join(json.dumps(fault) for fault in group)
+        separator = ','
+    if separator == ',':
+        yield ']\n'
+    elif parser.has_content:
+        yield json.dumps(no_faults_payload()) + '\n'
+    else:
+        yield '[]\n'
+
+
+def _fault_rows(vehicle_id, faults, today):
+    """Return ``({(address, fault_code): row}, unreachable addresses, skipped)``.
+
+    Module status entries (no fault code) aren't stored. Unreachable ones
+    are remembered, so a full scan doesn't clear faults it couldn't read.
+    """
+    rows = {}
+    unreachable = set()
+    skipped = 0
+    for fault in faults:
+        if not isinstance(fault, dict):
+            skipped += 1
+            continue
+        address = str(fault.get('address') or '')
+        if not fault.get('fault_code'):
+            if fault.get('status') == 'Unreachable':
+                unreachable.add(address)
+            skipped += 1
+            continue
+        fault_code = str(fault['fault_code'])
+        rows[(address, fault_code)] = {
+            'vehicle_id': vehicle_id,
+            'address': address,
+            'fault_code': fault_code,
+            'component': fault.get('component') or fault.get('module'),
+            'description': fault.get('description'),
+            'status': 'active',
+            'detected_date': today,
+        }
+    return rows, unreachable, skipped
+
+
+def import_vcds_faults(vehicle_id, faults, clear_missing=False):
+    """Upsert parsed ``faults`` as the vehicle's active faults and commit.
+
+    Existing active rows with the same address and fault code get the new
+    description and component. Other faults are inserted. With
+    ``clear_missing`` the import is treated as a full scan. Active faults it
+    doesn't list are cleared, except those at unreachable addresses.
+
+    Returns ``{'inserted', 'updated', 'cleared', 'skipped'}``.
+    """
+    today = datetime.now(timezone.utc).date()
+    rows, unreachable, skipped = _fault_rows(vehicle_id, faults, today)
+    table = VCDSFault.__table__
+
+    if rows:
+        # The bump is the first write, so the transaction holds SQLite's write
+        # lock before the keys are read and no other writer can add any.
+        bump_change_versions(db.session.connection(), [table.name], vehicle_ids=[vehicle_id])
+    existing = set(db.session.execute(
+        db.select(table.c.address, table.c.fault_code).where(
+            table.c.vehicle_id == vehicle_id, table.c.status == 'active'
+        )
+    ).all())
+    inserted = sum(1 for key in rows if key not in existing)
+    rows = list(rows.values())
+    seen = []
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        statement = sqlite_insert(table).values(rows[start:start + UPSERT_CHUNK_SIZE])
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.vehicle_id, table.c.address, table.c.fault_code],
+            index_where=table.c.status == 'active',
+            set_={
+                'description': db.func.coalesce(statement.excluded.description, table.c.description),
+                'component': db.func.coalesce(statement.excluded.component, table.c.component),
+            },
+        ).returning(table.c.id)
+        seen.extend(db.session.execute(statement).scalars())
+
+    cleared = 0
+    if clear_missing:
+        condition = (table.c.vehicle_id == vehicle_id) & (table.c.status == 'active')
+        if seen:
+            condition &= table.c.id.notin_(seen)
+        if unreachable:
+            condition &= table.c.address.is_(None) | table.c.address.notin_(unreachable)
+        cleared = db.session.execute(
+            table.update().where(condition).values(status='cleared', cleared_date=today)
+        ).rowcount
+
+    if cleared and not rows:
+        bump_change_versions(db.session.connection(), [table.name], vehicle_ids=[vehicle_id])
+    learn_fault_codes(db.session.connection(), rows)
+    db.session.commit()
+    return {'inserted': inserted, 'updated': len(seen) - inserted, 'cleared': cleared, 'skipped': skipped}
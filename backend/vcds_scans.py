@@ -0,0 +1,138 @@
+"""
+Stored VCDS scans and scan-to-scan diffs.
+
+:func:`store_scan` reads a scan once. Each line is hashed, zlib-compressed
+and parsed as it passes, so an upload is never held uncompressed. Lines are
+joined with ``\\n`` before hashing, so the same scan saved with different
+line endings hashes the same. A vehicle keeps one copy of each distinct
+scan: storing an identical one returns the existing row.
+
+The parsed result is kept beside the blob as the scan's ``modules``.
+:func:`diff_scans` compares those per module with set operations on fault
+codes, so old scans are never decompressed or parsed again.
+"""
+import hashlib
+import json
+import zlib
+
+from sqlalchemy.exc import IntegrityError
+
+from backend.extensions import db
+from backend.models import VCDSScan
+from backend.vcds import VCDSParser, iter_lines
+
+ZLIB_LEVEL = 6
+RAW_CHUNK_SIZE = 64 * 1024
+
+SCAN_FIELDS = ('id', 'vehicle_id', 'content_hash', 'raw_size', 'compressed_size', 'fault_count', 'created_at')
+
+
+def scan_modules(faults):
+    """Group parsed faults into ``{address: {'module', 'status', 'faults': {code: description}}}``."""
+    modules = {}
+    for fault in faults:
+        module = modules.setdefault(fault['address'], {'module': fault['module'], 'status': fault['status'], 'faults': {}})
+        if fault['fault_code']:
+            module['faults'][fault['fault_code']] = fault['description']
+    return modules
+
+
+def serialize_scan(scan, include_modules=False):
+    result = {}
+    for name in SCAN_FIELDS:
+        value = getattr(scan, name)
+        result[name] = value.isoformat() if hasattr(value, 'isoformat') else value
+    if include_modules:
+        result['modules'] = json.loads(scan.modules)
+    return result
+
+
+def store_scan(vehicle_id, source):
+    """Store the scan in ``source`` (text or lines) for a vehicle.
+
+    Returns ``(scan, faults, created)``. ``created`` is False when the
+    vehicle already had an identical scan, which is returned instead.
+    Raises ValueError for an empty scan.
+    """
+    digest = hashlib.sha256()
+    compressor = zlib.compressobj(ZLIB_LEVEL)
+    chunks = []
+    size = 0
+
+    def tee():
+        nonlocal size
+        for line in iter_lines(source):
+            data = line.encode('utf-8') + b'\n'
+            digest.update(data)
+            size += len(data)
+            chunk = compressor.compress(data)
+            if chunk:
+                chunks.append(chunk)
+            yield line
+
+    parser = VCDSParser()
+    faults = list(parser.parse(tee()))
+    if not parser.has_content:
+        raise ValueError('Scan is empty')
+    chunks.append(compressor.flush())
+    content_hash = digest.hexdigest()
+
+    existing = VCDSScan.query.filter_by(vehicle_id=vehicle_id, content_hash=content_hash).first()
+    if existing:
+        return existing, faults, False
+    raw = b''.join(chunks)
+    modules = scan_modules(faults)
+    scan = VCDSScan(
+        vehicle_id=vehicle_id, content_hash=content_hash, raw=raw, raw_size=size, compressed_size=len(raw),
+        modules=json.dumps(modules), fault_count=sum(len(m['faults']) for m in modules.values())
+    )
+    db.session.add(scan)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Stored by a concurrent request in the meantime.
+        db.session.rollback()
+        return VCDSScan.query.filter_by(vehicle_id=vehicle_id, content_hash=content_hash).one(), faults, False
+    return scan, faults, True
+
+
+def iter_scan_text(raw):
+    """Yield the decompressed text of a stored scan blob in pieces."""
+    decompressor = zlib.decompressobj()
+    for start in range(0, len(raw), RAW_CHUNK_SIZE):
+        yield decompressor.decompress(raw[start:start + RAW_CHUNK_SIZE])
+    yield decompressor.flush()
+
+
+def diff_scans(old, new):
+    """Compare two scans module by module.
+
+    Each module that has faults in either scan, or whose status changed,
+    lists its ``new``, ``persisting`` and ``resolved`` faults. Faults of a
+    module the newer scan couldn't reach, or didn't list at all, are
+    ``unverified`` rather than resolved.
+    """
+    before, after = json.loads(old.modules), json.loads(new.modules)
+    modules = []
+    totals = {'new': 0, 'persisting': 0, 'resolved': 0, 'unverified': 0}
+    for address in sorted(before.keys() | after.keys()):
+        a = before.get(address) or {'module': None, 'status': None, 'faults': {}}
+        b = after.get(address) or {'module': None, 'status': None, 'faults': {}}
+        old_codes, new_codes = a['faults'].keys(), b['faults'].keys()
+        gone = sorted(old_codes - new_codes)
+        unreachable = b['status'] in (None, 'Unreachable')
+        entry = {
+            'address': address,
+            'module': b['module'] or a['module'],
+            'status_before': a['status'],
+            'status_after': b['status'],
+            'new': [{'fault_code': c, 'description': b['faults'][c]} for c in sorted(new_codes - old_codes)],
+            'persisting': [{'fault_code': c, 'description': b['faults'][c]} for c in sorted(new_codes & old_codes)],
+            'resolved': [] if unreachable else [{'fault_code': c, 'description': a['faults'][c]} for c in gone],
+            'unverified': [{'fault_code': c, 'description': a['faults'][c]} for c in gone] if unreachable else [],
+        }
+        if any(entry[key] for key in totals) or a['status'] != b['status']:
+            modules.append(entry)
+            for key in totals:
+                totals[key] += len(entry[key])
+    return {'from': old.id, 'to': new.id, 'summary': totals, 'modules': modules}
@@ -215,6 +215,24 @@ async function apiCall(endpoint, options = {}) {
     }
 }
 
+// Run several API calls in one round trip. Each entry is a GET path or a
+// {method, path, body} object; results come back in the same order.
+async function apiBatch(requests, options = {}) {
+    const result = await apiCall('/batch', {
+        method: 'POST',
+        body: JSON.stringify({
+            requests: requests.map(r => typeof r === 'string' ? { path: r } : r),
+            ...options
+        })
+    });
+    return result.responses.map(r => {
+        if (r.status >= 400) {
+            throw new Error(`HTTP ${r.status}: ${r.body?.error || r.body}`);
+        }
+        return r.body;
+    });
+}
+
 function showView(viewId) {
     document.querySelectorAll('.view').forEach(v => v.classList.remove('active'));
     document.querySelectorAll('.nav-btn').forEach(b => b.classList.remove('active'));
@@ -272,12 +290,14 @@ document.querySelectorAll('.doc-tab-btn').forEach(btn => {
 
 async function loadDashboard() {
     if (!currentVehicleId) return;
-    const data = await apiCall(`/dashboard?vehicle_id=${currentVehicleId}`);
-    const analytics = await apiCall(`/analytics?vehicle_id=${currentVehicleId}`);
-    const vehicles = await apiCall('/vehicles');
+    const [data, analytics, vehicles, maintenance, mods] = await apiBatch([
+        `/dashboard?vehicle_id=${currentVehicleId}`,
+        `/analytics?vehicle_id=${currentVehicleId}`,
+        '/vehicles',
+        `/maintenance?vehicle_id=${currentVehicleId}`,
+        `/mods?vehicle_id=${currentVehicleId}`
+    ]);
     const vehicle = vehicles.find(v => v.id === currentVehicleId);
-    const maintenance = await apiCall(`/maintenance?vehicle_id=${currentVehicleId}`);
-    const mods = await apiCall(`/mods?vehicle_id=${currentVehicleId}`);
     
     document.getElementById('total-spent').textContent = `£${(data.total_spent || 0).toFixed(2)}`;
     document.getElementById('maintenance-cost').textContent = `£${(data.maintenance_cost || 0).toFixed(2)}`;
@@ -327,7 +347,7 @@ async function loadDashboard() {
         }
     }
     
-    loadDashboardCharts();
+    loadDashboardCharts(analytics, maintenance);
 }
 
 let dashboardCharts = {};
@@ -363,9 +383,7 @@ const doughnutOptions = {
     }
 };
 
-async function loadDashboardCharts() {
-    const analytics = await apiCall(`/analytics?vehicle_id=${currentVehicleId}`);
-    
+async function loadDashboardCharts(analytics, maintenance) {
     if (dashboardCharts.category) dashboardCharts.category.destroy();
     if (dashboardCharts.trends) dashboardCharts.trends.destroy();
     if (dashboardCharts.timeline) dashboardCharts.timeline.destroy();
@@ -407,7 +425,6 @@ async function loadDashboardCharts() {
     
     const timelineCtx = document.getElementById('timeline-chart');
     if (timelineCtx) {
-        const maintenance = await apiCall(`/maintenance?vehicle_id=${currentVehicleId}`);
         const sorted = maintenance.slice(0, 20).reverse();
         dashboardCharts.timeline = new Chart(timelineCtx, {
             type: 'bar',
@@ -1236,10 +1253,10 @@ async function renderMaintenanceTimeline() {
     }
     
     try {
-        const [maintenance, settings, vehicles] = await Promise.all([
-            apiCall(`/maintenance?vehicle_id=${currentVehicleId}`),
-            apiCall('/settings'),
-            apiCall('/vehicles')
+        const [maintenance, settings, vehicles] = await apiBatch([
+            `/maintenance?vehicle_id=${currentVehicleId}`,
+            '/settings',
+            '/vehicles'
         ]);
         
         const vehicle = vehicles.find(v => v.id === currentVehicleId);
@@ -1449,8 +1466,7 @@ async function loadReminders() {
     
     const filter = document.getElementById('reminder-filter')?.value || '';
     let url = `/reminders?vehicle_id=${currentVehicleId}`;
-    const reminders = await apiCall(url);
-    const vehicles = await apiCall('/vehicles');
+    const [reminders, vehicles] = await apiBatch([url, '/vehicles']);
     const vehicle = vehicles.find(v => v.id === currentVehicleId);
     const currentMileage = vehicle?.mileage || 0;
     
@@ -2449,17 +2465,20 @@ async function parseVCDSFile() {
         return;
     }
     
-    const content = await file.text();
     const extension = file.name.split('.').pop().toLowerCase();
     
     let faults;
     if (extension === 'csv') {
-        faults = parseVCDSCSV(content);
+        faults = parseVCDSCSV(await file.text());
     } else {
-        faults = await apiCall('/api/vcds/parse', {
-            method: 'POST',
-            body: JSON.stringify({ content })
-        });
+        // Send the file itself; the server parses it as it streams in.
+        const formData = new FormData();
+        formData.append('file', file);
+        const response = await fetch(`${API_BASE}/vcds/parse`, { method: 'POST', body: formData });
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        faults = await response.json();
     }
     
     if (faults.error) {
@@ -2592,7 +2611,7 @@ async function importVCDS(faults) {
     
     closeModal();
     loadVCDS();
-    showNotification(`Imported ${result.imported || faults.length} faults`, 'success');
+    showNotification(`Imported ${result.inserted} new, ${result.updated} existing faults`, 'success');
 }
 
 async function clearFault(id) {